@@ -1,16 +1,18 @@
 class ActionAgent:
-    def __init__(self):
+    def __init__(self, config=None):
         self.action_policies = {
             "Low": ["no action", "allow content"],
             "Medium": ["flag for review", "notify moderator", "add content warning"],
             "High": ["remove content", "notify administrator", "temporary ban user", "report to authorities"]
         }
+        # Optional overrides, e.g. a candidate config being replayed
+        self.action_policies.update((config or {}).get('action_policies', {}))
     
     def determine_action(self, risk_assessment, classification, text):
         risk_level = risk_assessment["level"]
         
-        # Base actions on risk level
-        actions = self.action_policies.get(risk_level, ["review manually"])
+        # Base actions on risk level (copied so the policy lists are never mutated)
+        actions = list(self.action_policies.get(risk_level, ["review manually"]))
         
         # Customize actions based on specific classifications
         if classification.get("self-harm", 0) > 0.6:
@@ -1,45 +1,173 @@
+import copy
 import json
+import threading
 from datetime import datetime
-import hashlib
 import os
+from utils.fingerprint import content_fingerprint
+from utils.audit_segments import AuditSegmentStore, entry_category
 
 class AuditAgent:
-    def __init__(self, log_file="audit_log.json"):
-        self.log_file = log_file
-        self.audit_log = self._load_audit_log()
+    """
+    Audit log stored as segments shared by every worker process
+
+    Entries are appended to the hot segment under a file lock; full segments are
+    compressed with a sparse time/user/level index (see AuditSegmentStore). Stats
+    are running counters fed by sealed segment summaries and by tailing the hot
+    segment, so memory stays flat however long the history grows.
+    Fingerprint index offsets are segment addresses.
+    """
+    def __init__(self, log_dir="audit_segments", fingerprint_index=None,
+                 segment_max_bytes=64 * 1024 * 1024, legacy_log=None, snapshot_store=None):
+        self.log_dir = log_dir
+        self.fingerprint_index = fingerprint_index
+        self.store = AuditSegmentStore(log_dir, segment_max_bytes)
+        self._lock = threading.Lock()
+        self._counts = {'total': 0, 'High': 0, 'Medium': 0, 'categories': {}}
+        self._counted_segments = set()  # Sealed segments included in _counts
+        self._partials = {}  # Unsealed segment -> [tailed offset, counts so far]
+        self.snapshot_store = snapshot_store
+        if legacy_log:
+            self._migrate_legacy_log(legacy_log)
+        self._load_snapshot()
+        self._refresh()
     
-    def _load_audit_log(self):
-        """Load existing audit log from file"""
-        try:
-            if os.path.exists(self.log_file):
-                with open(self.log_file, 'r') as f:
-                    return json.load(f)
-            return []
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
+    def _load_snapshot(self):
+        """Restore the counters so boot only tails entries written after the snapshot"""
+        if self.snapshot_store is None:
+            return
+        _, meta = self.snapshot_store.load("audit_stats")
+        if meta is None or meta.get('log_dir') != os.path.abspath(self.log_dir):
+            return
+        self._counts = meta['counts']
+        self._counts.setdefault('categories', {})
+        self._counted_segments = set(meta['counted_segments'])
+        self._partials = {int(segment): partial for segment, partial in meta['partials'].items()}
     
-    def _save_audit_log(self):
-        """Save audit log to file"""
-        try:
-            with open(self.log_file, 'w') as f:
-                json.dump(self.audit_log, f, indent=2)
-        except Exception as e:
-            print(f"Error saving audit log: {e}")
+    def snapshot(self):
+        """Save the counters with the segment positions they cover"""
+        if self.snapshot_store is None:
+            return
+        self._refresh()
+        with self._lock:
+            meta = {
+                'log_dir': os.path.abspath(self.log_dir),
+                'counts': copy.deepcopy(self._counts),
+                'counted_segments': sorted(self._counted_segments),
+                'partials': {
+                    str(segment): [offset, copy.deepcopy(counts)] for segment, (offset, counts) in self._partials.items()
+                }
+            }
+        self.snapshot_store.save("audit_stats", {}, meta)
     
-    def log_decision(self, content, user_id, classification, risk_score, action, explanation):
-        """Log moderation decision for transparency"""
-        audit_entry = {
+    def _migrate_legacy_log(self, legacy_log):
+        """Move an audit_log.jsonl (or old audit_log.json array) in as segment 0"""
+        legacy_array = os.path.splitext(legacy_log)[0] + ".json"
+        if not os.path.exists(legacy_log) and not os.path.exists(legacy_array):
+            return
+        with self.store.file_lock.exclusive():
+            if self.store.segment_numbers():
+                return
+            if os.path.exists(legacy_log):
+                # Byte offsets are unchanged, so existing fingerprint index entries stay valid
+                os.replace(legacy_log, self.store.segment_path(0, "jsonl"))
+                print(f"Migrated {legacy_log} into {self.log_dir}")
+                return
+            try:
+                with open(legacy_array, 'r') as f:
+                    entries = json.load(f)
+            except json.JSONDecodeError:
+                return
+            with open(self.store.segment_path(0, "jsonl"), 'w') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+        print(f"Migrated {len(entries)} audit entries from {legacy_array}")
+    
+    def _refresh(self):
+        """Fold in entries written since the last refresh, by this or any other worker"""
+        with self._lock:
+            for segment in self.store.segment_numbers():
+                if segment in self._counted_segments:
+                    continue
+                if self.store.is_sealed(segment):
+                    # Sealed: its summary replaces whatever we had tailed of it
+                    _, partial = self._partials.pop(segment, (0, {}))
+                    summary = self.store.summary(segment)
+                    self._counts['total'] += summary['count'] - partial.get('total', 0)
+                    for level in ('High', 'Medium'):
+                        self._counts[level] += summary['levels'].get(level, 0) - partial.get(level, 0)
+                    if 'categories' in summary:  # Segments sealed before category rollups keep their tailed counts
+                        tailed = partial.get('categories', {})
+                        for category in set(summary['categories']) | set(tailed):
+                            self._counts['categories'][category] = (
+                                self._counts['categories'].get(category, 0)
+                                + summary['categories'].get(category, 0) - tailed.get(category, 0)
+                            )
+                    self._counted_segments.add(segment)
+                    continue
+                
+                offset, partial = self._partials.setdefault(segment, [0, {}])
+                for _, offset, entry in self.store.iter_hot(segment, offset):
+                    level = entry.get('risk_score', {}).get('level', '')
+                    for key in ('total', level):
+                        if key in self._counts:
+                            self._counts[key] += 1
+                            partial[key] = partial.get(key, 0) + 1
+                    category = entry_category(entry)
+                    self._counts['categories'][category] = self._counts['categories'].get(category, 0) + 1
+                    partial_categories = partial.setdefault('categories', {})
+                    partial_categories[category] = partial_categories.get(category, 0) + 1
+                self._partials[segment][0] = offset
+    
+    def build_entry(self, content, user_id, classification, risk_score, action, explanation,
+                    fingerprint=None):
+        """Build an audit entry without persisting it"""
+        return {
             "timestamp": datetime.now().isoformat(),
-            "content_hash": hashlib.sha256(content.encode()).hexdigest(),
+            "content_hash": fingerprint or content_fingerprint(content),
             "user_id": user_id,
             "classification": classification,
             "risk_score": risk_score,
             "action_taken": action,
             "explanation": explanation
         }
-        
-        self.audit_log.append(audit_entry)
-        self._save_audit_log()
+    
+    def log_entries(self, entries):
+        """Append a batch of audit entries to the log in one locked write"""
+        self.index_entries(entries, self.append_entries(entries))
+    
+    def append_entries(self, entries):
+        """Append a batch of audit entries without indexing them; returns their segment addresses"""
+        try:
+            return self.store.append(entries)
+        except Exception as e:
+            print(f"Error saving audit log: {e}")
+            raise
+    
+    def index_entries(self, entries, addresses):
+        """Record already-appended entries in the fingerprint index (safe to retry)"""
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.add("audit", [
+                (entry["content_hash"], address) for entry, address in zip(entries, addresses)
+            ])
+    
+    def get_entries(self, offsets):
+        """Audit entries at the given segment addresses"""
+        return self.store.read(offsets)
+    
+    def query(self, start=None, end=None, user_id=None, level=None, cursor=None, limit=100):
+        """
+        One page of audit entries matching the filters, oldest first
+        Returns (entries, next_cursor); next_cursor is None after the last page
+        """
+        return self.store.query(start, end, user_id, level, cursor, limit)
+    
+    def log_decision(self, content, user_id, classification, risk_score, action, explanation,
+                     fingerprint=None):
+        """Log moderation decision for transparency"""
+        audit_entry = self.build_entry(
+            content, user_id, classification, risk_score, action, explanation, fingerprint
+        )
+        self.log_entries([audit_entry])
         return audit_entry
     
     def generate_explanation(self, classification, risk_score):
@@ -64,25 +192,12 @@ class AuditAgent:
     
     def get_audit_stats(self):
         """Generate statistics for responsible AI reporting"""
-        if not self.audit_log:
-            return {
-                "total_decisions": 0, 
-                "high_risk_percentage": 0,
-                "medium_risk_percentage": 0,
-                "high_risk_count": 0,
-                "medium_risk_count": 0
-            }
-        
-        total = len(self.audit_log)
-        high_risk_count = 0
-        medium_risk_count = 0
-        
-        for entry in self.audit_log:
-            risk_level = entry.get('risk_score', {}).get('level', '')
-            if risk_level == 'High':
-                high_risk_count += 1
-            elif risk_level == 'Medium':
-                medium_risk_count += 1
+        self._refresh()
+        with self._lock:
+            total = self._counts['total']
+            high_risk_count = self._counts['High']
+            medium_risk_count = self._counts['Medium']
+            category_counts = {c: n for c, n in self._counts['categories'].items() if c and n}
         
         high_risk_percentage = (high_risk_count / total * 100) if total > 0 else 0
         medium_risk_percentage = (medium_risk_count / total * 100) if total > 0 else 0
@@ -92,7 +207,8 @@ class AuditAgent:
             "high_risk_percentage": round(high_risk_percentage, 1),
             "medium_risk_percentage": round(medium_risk_percentage, 1),
             "high_risk_count": high_risk_count,
-            "medium_risk_count": medium_risk_count
+            "medium_risk_count": medium_risk_count,
+            "category_counts": category_counts
         }
 
 # Test the audit agent
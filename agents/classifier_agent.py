@@ -1,21 +1,75 @@
 from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
 import torch
+import json
+import os
 import re
-from typing import Dict
+from typing import Dict, List, Optional
+
+DEFAULT_PROFILE_PATH = "inference_profile.json"
+
+def load_inference_profile(path=None) -> Dict:
+    """
+    Inference settings written by autotune.py, or {} when there is none
+    path defaults to INFERENCE_PROFILE; an empty string disables the profile
+    """
+    if path is None:
+        path = os.getenv('INFERENCE_PROFILE', DEFAULT_PROFILE_PATH)
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ Error loading inference profile {path}: {e}")
+        return {}
 
 class ClassifierAgent:
-    def __init__(self):
+    def __init__(self, fast_path=None, mode=None, profile_path=None, model_name=None, num_threads=None):
         self.categories = [
             "hate speech", "harassment", "violence", "self-harm",
             "sexual content", "spam", "misinformation"
         ]
+        # Keyword lists for rule-based classification; trending terms can be added at runtime
+        self.rule_keywords = {
+            "hate speech": ["hate", "stupid", "idiot", "retard", "kill all", "die"],
+            "violence": ["kill", "hurt", "violence", "attack", "fight", "punch"],
+            "sexual content": ["sex", "nude", "naked", "porn", "xxx", "adult"],
+            "spam": ["free", "offer", "win", "prize", "click", "buy now"]
+        }
+        self.rule_scores = {"hate speech": 0.7, "violence": 0.6, "sexual content": 0.5, "spam": 0.4}
+        self._rule_patterns = {}  # Category -> (keyword list, compiled whole-word pattern)
+        # Optional FastPathClassifier that answers confident items before the model
+        self.fast_path = fast_path
+        # "zero-shot" runs one NLI pass per category, "prototype" embeds the text once,
+        # "rules" loads no model (shard front-ends and local stand-in nodes)
+        self.mode = mode or os.getenv('CLASSIFIER_MODE', 'zero-shot')
+        # Model for the mode (e.g. a multilingual NLI model for other languages)
+        self.model_name = model_name
+        self.classifier = None
+        self.prototype_classifier = None
+        
+        # CPU inference settings tuned for this machine (see autotune.py)
+        self.profile = load_inference_profile(profile_path)
+        self.batch_size = self.profile.get('batch_size', 8)
+        self.length_buckets = self.profile.get('length_buckets')
+        # An explicit thread count (process pools that split the cores between
+        # workers) wins over the profile, which is tuned for a single process
+        self.num_threads = num_threads
+        self._apply_thread_settings()
+        
+        if self.mode == "prototype":
+            self._load_prototype_classifier()
+            return
+        if self.mode == "rules":
+            self.model_loaded = False
+            return
         
         try:
             # Try to use a model better suited for content moderation
             print("Loading classification model...")
             self.classifier = pipeline(
                 "zero-shot-classification",
-                model="facebook/bart-large-mnli",
+                model=self.model_name or os.getenv('CLASSIFIER_MODEL', 'facebook/bart-large-mnli'),
                 device=-1  # Use CPU
             )
             self.model_loaded = True
@@ -25,49 +79,201 @@ class ClassifierAgent:
             self.model_loaded = False
             self.classifier = None
     
-    def classify(self, text: str) -> Dict[str, float]:
+    def _apply_thread_settings(self):
+        """Set torch intra-op and inter-op thread counts from num_threads or the profile"""
+        if self.num_threads is not None:
+            torch.set_num_threads(self.num_threads)
+            return
+        if 'intra_op_threads' in self.profile:
+            torch.set_num_threads(self.profile['intra_op_threads'])
+        if 'inter_op_threads' in self.profile:
+            try:
+                torch.set_num_interop_threads(self.profile['inter_op_threads'])
+            except RuntimeError:
+                pass  # Already fixed once torch has started inter-op work in this process
+        if self.profile:
+            print(f"✅ Inference profile loaded: {torch.get_num_threads()} threads, "
+                  f"batch size {self.batch_size}, length buckets {self.length_buckets}")
+    
+    def _load_prototype_classifier(self):
+        try:
+            from agents.prototype_classifier import PrototypeClassifier
+            print("Loading prototype classification model...")
+            self.prototype_classifier = PrototypeClassifier(
+                self.model_name or os.getenv('PROTOTYPE_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+            )
+            self.categories = list(self.prototype_classifier.categories)
+            self.model_loaded = True
+            print("✅ Prototype classification model loaded successfully")
+        except Exception as e:
+            print(f"❌ Error loading prototype classification model: {e}")
+            self.model_loaded = False
+    
+    def add_category(self, category: str, descriptions: Optional[List[str]] = None):
+        """
+        Add a moderation category
+        In prototype mode this embeds only the new descriptions; zero-shot pays one more pass per text
+        """
+        if self.prototype_classifier is not None:
+            self.prototype_classifier.add_category(category, descriptions or [category])
+        if category not in self.categories:
+            self.categories.append(category)
+    
+    def add_rule_keywords(self, category: str, keywords: List[str]):
+        """Extend a category's rule-based keyword list (replaced, not mutated, so readers never see it change)"""
+        current = self.rule_keywords.get(category, [])
+        self.rule_keywords[category] = current + [k.lower() for k in keywords if k.lower() not in current]
+    
+    def classify(self, text: str, rules_only: bool = False) -> Dict[str, float]:
         """
         Classify text into content moderation categories
         Returns a dictionary of category: confidence_score
+        rules_only skips the model (degraded mode under overload)
         """
         # First, apply rule-based filters
-        if self._contains_url(text):
-            return self._create_classification_result({"spam": 0.8})
+        result = self._pre_classify(text)
+        if result is not None:
+            return result
         
-        if self._is_all_caps(text) and len(text) > 15:
-            return self._create_classification_result({"harassment": 0.6, "spam": 0.5})
+        result = self._fast_path_classification(text)
+        if result is not None:
+            return result
         
-        # If model failed to load or text is very short, use rule-based
-        if not self.model_loaded or len(text.strip()) < 5:
+        if rules_only:
             return self._rule_based_classification(text)
         
         try:
             # Use the model for classification
-            result = self.classifier(
-                text,
-                candidate_labels=self.categories,
-                multi_label=True,
-                hypothesis_template="This text contains {}."  # Better template for content moderation
-            )
-            
-            # Process the results
-            classification = {}
-            for label, score in zip(result['labels'], result['scores']):
-                classification[label] = float(score)
-            
-            # Apply minimum confidence threshold
-            classification = {k: v for k, v in classification.items() if v > 0.1}
-            
-            # If no categories detected above threshold, consider it normal
-            if not classification:
-                return self._create_classification_result({})
-            
-            return self._create_classification_result(classification)
+            classification = self._run_model([text])[0]
+            self._observe(text, classification)
+            return classification
             
         except Exception as e:
             print(f"❌ Classification error: {e}")
             return self._rule_based_classification(text)
     
+    def classify_batch(self, texts: List[str], batch_size: Optional[int] = None,
+                       rules_only: bool = False) -> List[Dict[str, float]]:
+        """
+        Classify several texts, sending the ones that need the model through it in batches
+        Returns one classification per input text, in order
+        """
+        batch_size = batch_size or self.batch_size
+        results: List[Optional[Dict[str, float]]] = [
+            self._pre_classify(text) or self._fast_path_classification(text) for text in texts
+        ]
+        pending = [i for i, result in enumerate(results) if result is None]
+        
+        if rules_only:
+            for i in pending:
+                results[i] = self._rule_based_classification(texts[i])
+            return results
+        
+        if pending:
+            try:
+                model_results = self._run_model_bucketed([texts[i] for i in pending], batch_size)
+                for i, classification in zip(pending, model_results):
+                    results[i] = classification
+                    self._observe(texts[i], classification)
+            except Exception as e:
+                print(f"❌ Batch classification error: {e}")
+                for i in pending:
+                    results[i] = self._rule_based_classification(texts[i])
+        
+        return results
+    
+    def _pre_classify(self, text: str) -> Optional[Dict[str, float]]:
+        """
+        Apply the rule-based short-circuits that skip the model
+        Returns None when the text should go through the model
+        """
+        if self._contains_url(text):
+            return self._create_classification_result({"spam": 0.8})
+        
+        if self._is_all_caps(text) and len(text) > 15:
+            return self._create_classification_result({"harassment": 0.6, "spam": 0.5})
+        
+        # If model failed to load or text is very short, use rule-based
+        if not self.model_loaded or len(text.strip()) < 5:
+            return self._rule_based_classification(text)
+        
+        return None
+    
+    def _fast_path_classification(self, text: str) -> Optional[Dict[str, float]]:
+        """Answer from the fast-path classifier when it is confident, else None"""
+        if self.fast_path is None:
+            return None
+        detected = self.fast_path.predict(text)
+        if detected is None:
+            return None
+        return self._create_classification_result(detected)
+    
+    def _observe(self, text: str, classification: Dict[str, float]):
+        """Feed model decisions to the fast-path classifier as training labels"""
+        if self.fast_path is not None:
+            self.fast_path.observe(text, classification)
+    
+    def _run_model_bucketed(self, texts: List[str], batch_size: int) -> List[Dict[str, float]]:
+        """
+        Run the model with texts grouped by length so batches carry little padding
+        Texts are sorted by length and no batch crosses a length_buckets boundary
+        """
+        if not self.length_buckets or len(texts) <= 1:
+            return self._run_model(texts, batch_size)
+        
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        results: List[Optional[Dict[str, float]]] = [None] * len(texts)
+        batch: List[int] = []
+        
+        def flush():
+            for i, classification in zip(batch, self._run_model([texts[i] for i in batch], batch_size)):
+                results[i] = classification
+            batch.clear()
+        
+        bucket = 0
+        for i in order:
+            while bucket < len(self.length_buckets) and len(texts[i]) > self.length_buckets[bucket]:
+                bucket += 1
+                if batch:
+                    flush()
+            batch.append(i)
+            if len(batch) == batch_size:
+                flush()
+        if batch:
+            flush()
+        return results
+    
+    def _run_model(self, texts: List[str], batch_size: int = 8) -> List[Dict[str, float]]:
+        """Run the configured model over texts and return one classification per text"""
+        if self.prototype_classifier is not None:
+            return [
+                self._process_scores(scores)
+                for scores in self.prototype_classifier.score_batch(texts, batch_size)
+            ]
+        
+        results = self.classifier(
+            texts,
+            candidate_labels=self.categories,
+            multi_label=True,
+            hypothesis_template="This text contains {}.",  # Better template for content moderation
+            batch_size=batch_size
+        )
+        return [
+            self._process_scores({label: float(score) for label, score in zip(result['labels'], result['scores'])})
+            for result in results
+        ]
+    
+    def _process_scores(self, classification: Dict[str, float]) -> Dict[str, float]:
+        """Turn raw per-category model scores into a classification"""
+        # Apply minimum confidence threshold
+        classification = {k: v for k, v in classification.items() if v > 0.1}
+        
+        # If no categories detected above threshold, consider it normal
+        if not classification:
+            return self._create_classification_result({})
+        
+        return self._create_classification_result(classification)
+    
     def _create_classification_result(self, detected_categories: Dict[str, float]) -> Dict[str, float]:
         """
         Create a proper classification result with normalized probabilities
@@ -98,28 +304,20 @@ class ClassifierAgent:
         text_lower = text.lower()
         detected_categories = {}
         
-        # Hate speech detection
-        hate_words = ["hate", "stupid", "idiot", "retard", "kill all", "die"]
-        if any(word in text_lower for word in hate_words):
-            detected_categories["hate speech"] = 0.7
-        
-        # Violence detection
-        violence_words = ["kill", "hurt", "violence", "attack", "fight", "punch"]
-        if any(word in text_lower for word in violence_words):
-            detected_categories["violence"] = 0.6
-        
-        # Sexual content detection
-        sexual_words = ["sex", "nude", "naked", "porn", "xxx", "adult"]
-        if any(word in text_lower for word in sexual_words):
-            detected_categories["sexual content"] = 0.5
-        
-        # Spam detection
-        spam_words = ["free", "offer", "win", "prize", "click", "buy now"]
-        if any(word in text_lower for word in spam_words):
-            detected_categories["spam"] = 0.4
+        for category, words in list(self.rule_keywords.items()):
+            if words and self._rule_pattern(category, words).search(text_lower):
+                detected_categories[category] = self.rule_scores.get(category, 0.5)
         
         return self._create_classification_result(detected_categories)
     
+    def _rule_pattern(self, category: str, words: List[str]):
+        """Whole-word pattern for a keyword list ("like" must not match "likely"), rebuilt when the list is replaced"""
+        cached = self._rule_patterns.get(category)
+        if cached is None or cached[0] is not words:
+            pattern = re.compile(r"\b(?:" + "|".join(re.escape(word) for word in words) + r")\b")
+            cached = self._rule_patterns[category] = (words, pattern)
+        return cached[1]
+    
     def _contains_url(self, text: str) -> bool:
         """Check if text contains URLs"""
         url_pattern = re.compile(r'https?://\S+|www\.\S+')
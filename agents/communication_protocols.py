@@ -1,10 +1,19 @@
 import json
+import os
+import pickle
+import socket
+import stat
+import struct
+import tempfile
 import threading
 import time
-from queue import Queue
+from queue import Queue, Empty
 from flask import Flask, request, jsonify
+from dotenv import load_dotenv
 import requests
 
+load_dotenv()
+
 class Message:
     """Standardized message format for agent communication"""
     def __init__(self, sender, recipient, message_type, data, priority=1):
@@ -42,38 +51,54 @@ class Message:
 
 class MessageBus:
     """Central message bus for agent communication (MCP - Message Control Protocol)"""
-    def __init__(self):
+    def __init__(self, transport=None):
         self.queues = {}  # Agent ID -> Queue
         self.subscriptions = {}  # Message type -> List of agent IDs
         self.handlers = {}  # Agent ID -> handler function
         self.running = False
+        # Optional UnixSocketTransport reaching agents registered in other processes
+        self.transport = transport
+        self._wakeup = threading.Event()
     
     def register_agent(self, agent_id, handler=None):
         """Register an agent with the message bus"""
         self.queues[agent_id] = Queue()
         self.handlers[agent_id] = handler
+        if self.transport is not None:
+            self.transport.listen(agent_id, self._deliver)
     
     def subscribe(self, agent_id, message_type):
         """Subscribe an agent to a specific message type"""
         if message_type not in self.subscriptions:
             self.subscriptions[message_type] = []
-        self.subscriptions[agent_id].append(message_type)
+        self.subscriptions[message_type].append(agent_id)
+        if self.transport is not None:
+            self.transport.subscribe(agent_id, message_type)
+    
+    def _deliver(self, message):
+        """Queue a message for a local agent and wake the processing thread"""
+        self.queues[message.recipient].put(message)
+        self._wakeup.set()
     
     def send_message(self, message):
         """Send a message to a specific agent"""
         if message.recipient in self.queues:
-            self.queues[message.recipient].put(message)
+            self._deliver(message)
             return True
+        if self.transport is not None:
+            return self.transport.send(message)
         return False
     
     def broadcast(self, message_type, data, sender="system", priority=1):
         """Broadcast a message to all subscribers of a message type"""
-        if message_type not in self.subscriptions:
+        subscribers = list(self.subscriptions.get(message_type, []))
+        if self.transport is not None:
+            subscribers += [a for a in self.transport.subscribers(message_type) if a not in subscribers]
+        if not subscribers:
             return False
         
-        for agent_id in self.subscriptions[message_type]:
-            message = Message(sender, agent_id, message_type, data, priority)
-            self.queues[agent_id].put(message)
+        for agent_id in subscribers:
+            self.send_message(Message(sender, agent_id, message_type, data, priority))
         
         return True
     
@@ -83,14 +108,19 @@ class MessageBus:
         
         def process_messages():
             while self.running:
-                for agent_id, queue in self.queues.items():
-                    try:
-                        message = queue.get_nowait()
-                        if self.handlers[agent_id]:
-                            self.handlers[agent_id](message)
-                    except:
-                        pass
-                time.sleep(0.1)  # Prevent CPU spinning
+                self._wakeup.clear()
+                for agent_id, queue in list(self.queues.items()):
+                    while True:
+                        try:
+                            message = queue.get_nowait()
+                        except Empty:
+                            break
+                        try:
+                            if self.handlers[agent_id]:
+                                self.handlers[agent_id](message)
+                        except Exception as e:
+                            print(f"❌ Error in {agent_id} handler: {e}")
+                self._wakeup.wait(0.1)  # Woken as soon as a message arrives
         
         self.thread = threading.Thread(target=process_messages)
         self.thread.daemon = True
@@ -99,6 +129,177 @@ class MessageBus:
     def stop_processing(self):
         """Stop message processing"""
         self.running = False
+        self._wakeup.set()
+
+class UnixSocketTransport:
+    """
+    MessageBus transport between processes on one host over Unix domain sockets
+    
+    Every process that registers an agent listens on <socket_dir>/<agent_id>.sock;
+    senders keep one persistent connection per recipient. Frames are a 4-byte
+    length followed by the pickled Message, written with a single sendmsg() and
+    unpickled straight from the receive buffer. Subscriptions are marker files
+    under <socket_dir>/subscriptions/<message_type>/ so broadcasts reach agents in
+    every process; they are removed when the transport closes, or when a message
+    to the agent finds its socket gone. The directory must be private (0700 and
+    owned by this user): only processes of the same user can connect, which is
+    what makes unpickling the frames safe. It defaults to $XDG_RUNTIME_DIR.
+    """
+    HEADER = struct.Struct("!I")
+    
+    def __init__(self, socket_dir=None):
+        self.socket_dir = socket_dir or self._default_socket_dir()
+        os.makedirs(self.socket_dir, mode=0o700, exist_ok=True)
+        self._check_private(self.socket_dir)
+        self._listeners = {}  # Agent ID -> listening socket
+        self._subscriptions = set()  # (agent ID, message type) marker files created here
+        self._connections = {}  # Agent ID -> (socket, lock) for sending
+        self._lock = threading.Lock()
+        self._running = True
+    
+    @staticmethod
+    def _default_socket_dir():
+        runtime_dir = os.getenv('XDG_RUNTIME_DIR')
+        if runtime_dir:
+            return os.path.join(runtime_dir, "moderation-bus")
+        return os.path.join(tempfile.gettempdir(), f"moderation-bus-{os.getuid()}")
+    
+    @staticmethod
+    def _check_private(directory):
+        """Refuse a socket directory another user could have created or can write to"""
+        info = os.lstat(directory)
+        if not stat.S_ISDIR(info.st_mode):
+            raise PermissionError(f"Message bus socket dir {directory} is not a directory")
+        if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) != 0o700:
+            raise PermissionError(
+                f"Message bus socket dir {directory} must be owned by uid {os.getuid()} with mode 0700 "
+                f"(found uid {info.st_uid}, mode {stat.S_IMODE(info.st_mode):o})"
+            )
+    
+    def _socket_path(self, agent_id):
+        return os.path.join(self.socket_dir, f"{agent_id}.sock")
+    
+    def _subscription_dir(self, message_type):
+        return os.path.join(self.socket_dir, "subscriptions", message_type.replace(os.sep, "_"))
+    
+    def listen(self, agent_id, deliver):
+        """Accept messages for agent_id from other processes and pass them to deliver(message)"""
+        path = self._socket_path(agent_id)
+        if os.path.exists(path):
+            os.unlink(path)  # Left behind by a process that did not shut down cleanly
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(64)
+        self._listeners[agent_id] = server
+        
+        def accept_loop():
+            while self._running:
+                try:
+                    conn, _ = server.accept()
+                except OSError:
+                    return
+                reader = threading.Thread(target=self._read_loop, args=(conn, deliver), daemon=True)
+                reader.start()
+        
+        threading.Thread(target=accept_loop, name=f"bus-accept-{agent_id}", daemon=True).start()
+    
+    def _read_loop(self, conn, deliver):
+        buffer = bytearray(64 * 1024)
+        header = bytearray(self.HEADER.size)
+        with conn:
+            while self._running:
+                if not self._recv_exactly(conn, memoryview(header)):
+                    return
+                size, = self.HEADER.unpack(header)
+                if size > len(buffer):
+                    buffer = bytearray(size)
+                view = memoryview(buffer)[:size]
+                if not self._recv_exactly(conn, view):
+                    return
+                try:
+                    deliver(pickle.loads(view))
+                except Exception as e:
+                    print(f"❌ Error delivering bus message: {e}")
+    
+    def _recv_exactly(self, conn, view):
+        received = 0
+        while received < len(view):
+            count = conn.recv_into(view[received:])
+            if count == 0:
+                return False
+            received += count
+        return True
+    
+    def _connection(self, agent_id):
+        with self._lock:
+            entry = self._connections.get(agent_id)
+            if entry is None:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self._socket_path(agent_id))
+                entry = self._connections[agent_id] = (sock, threading.Lock())
+            return entry
+    
+    def _drop_connection(self, agent_id):
+        with self._lock:
+            entry = self._connections.pop(agent_id, None)
+        if entry is not None:
+            entry[0].close()
+    
+    def send(self, message):
+        """Send a message to an agent in another process; False when it is not listening"""
+        payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        header = self.HEADER.pack(len(payload))
+        for _ in range(2):  # Reconnect once if the receiving process restarted
+            try:
+                sock, lock = self._connection(message.recipient)
+                with lock:
+                    sent = sock.sendmsg([header, payload])
+                    if sent < len(header) + len(payload):
+                        sock.sendall(memoryview(header + payload)[sent:])
+                return True
+            except (FileNotFoundError, ConnectionRefusedError):
+                # Nobody listens for this agent any more: stop broadcasting to it
+                self._drop_connection(message.recipient)
+                self._remove_marker(message.recipient, message.message_type)
+                return False
+            except OSError:
+                self._drop_connection(message.recipient)
+        return False
+    
+    def subscribe(self, agent_id, message_type):
+        directory = self._subscription_dir(message_type)
+        os.makedirs(directory, exist_ok=True)
+        open(os.path.join(directory, agent_id), 'a').close()
+        self._subscriptions.add((agent_id, message_type))
+    
+    def _remove_marker(self, agent_id, message_type):
+        try:
+            os.unlink(os.path.join(self._subscription_dir(message_type), agent_id))
+        except FileNotFoundError:
+            pass
+    
+    def subscribers(self, message_type):
+        """Agent IDs subscribed to message_type in any process"""
+        try:
+            return os.listdir(self._subscription_dir(message_type))
+        except FileNotFoundError:
+            return []
+    
+    def close(self):
+        self._running = False
+        for agent_id, server in self._listeners.items():
+            server.close()
+            try:
+                os.unlink(self._socket_path(agent_id))
+            except FileNotFoundError:
+                pass
+        for agent_id, message_type in self._subscriptions:
+            self._remove_marker(agent_id, message_type)
+        self._subscriptions.clear()
+        with self._lock:
+            for sock, _ in self._connections.values():
+                sock.close()
+            self._connections.clear()
 
 class HTTPCommunicator:
     """HTTP-based communication for distributed agents"""
@@ -126,5 +327,8 @@ class HTTPCommunicator:
         except:
             return False
 
-# Create global message bus instance
-message_bus = MessageBus()
\ No newline at end of file
+# Create global message bus instance; MESSAGE_BUS_TRANSPORT=unix reaches agents in other local processes
+message_bus = MessageBus(
+    UnixSocketTransport(os.getenv('MESSAGE_BUS_SOCKET_DIR'))
+    if os.getenv('MESSAGE_BUS_TRANSPORT', 'local') == 'unix' else None
+)
\ No newline at end of file
@@ -0,0 +1,270 @@
+import json
+import os
+import pickle
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
+from utils.file_store import FileLock
+
+
+class FastPathClassifier:
+    """
+    Hashed-feature linear classifier that learns online from the big model and from feedback.
+
+    Texts are hashed into character n-gram features (no vocabulary to keep in
+    memory) and scored by one logistic-regression model per category, trained
+    with partial_fit. Items where every category is confidently on or off are
+    answered here; the rest go to the zero-shot model, whose answers become
+    training data. Weights are saved as numbered versions under model_dir.
+    """
+    def __init__(self, categories, model_dir="models/fast_path", confidence=0.9,
+                 label_threshold=0.3, min_samples=500, max_pending=10000,
+                 feedback_weight=5.0, keep_versions=5):
+        self.categories = list(categories)
+        self.model_dir = model_dir
+        self.confidence = confidence
+        self.label_threshold = label_threshold
+        self.min_samples = min_samples
+        self.feedback_weight = feedback_weight
+        self.keep_versions = keep_versions
+
+        self.vectorizer = HashingVectorizer(
+            analyzer='char_wb', ngram_range=(2, 4), n_features=2 ** 18,
+            alternate_sign=False, norm='l2'
+        )
+        self.models = {
+            category: SGDClassifier(loss='log_loss', alpha=1e-5, random_state=0)
+            for category in self.categories
+        }
+        self.samples_seen = 0
+        self.version = 0
+        self._weights = None  # (features, categories) matrix used for scoring
+        self._intercepts = None
+
+        self._lock = threading.Lock()  # Guards the scoring weights
+        self._train_lock = threading.Lock()  # Serialises partial_fit and saving
+        self._pending = deque(maxlen=max_pending)  # (text, labels, weight), oldest dropped first
+        self._thread = None
+        self._running = False
+        self.stats = {"served": 0, "deferred": 0, "observed": 0, "feedback": 0}
+
+        os.makedirs(model_dir, exist_ok=True)
+        self._load_current()
+
+    @property
+    def is_ready(self):
+        return self._weights is not None and self.samples_seen >= self.min_samples
+
+    def predict(self, text):
+        """
+        Fast-path classification, or None when the model is not confident
+        Returns {category: probability} for the categories predicted present
+        """
+        if not self.is_ready:
+            return None
+
+        features = self.vectorizer.transform([text])
+        with self._lock:
+            logits = (features @ self._weights).ravel() + self._intercepts
+        probabilities = 1.0 / (1.0 + np.exp(-logits))
+
+        low = 1.0 - self.confidence
+        if np.any((probabilities > low) & (probabilities < self.confidence)):
+            self.stats["deferred"] += 1
+            return None
+
+        self.stats["served"] += 1
+        return {
+            category: float(p)
+            for category, p in zip(self.categories, probabilities)
+            if p >= self.confidence
+        }
+
+    def observe(self, text, classification, weight=1.0):
+        """Queue a model-labelled text for the next training round"""
+        labels = np.array([
+            1 if classification.get(category, 0) >= self.label_threshold else 0
+            for category in self.categories
+        ])
+        self._pending.append((text, labels, weight))
+        self.stats["observed"] += 1
+
+    def observe_feedback(self, text, accurate, decision_classification=None, expected_classification=None):
+        """
+        Turn moderator feedback into a weighted training example
+        Accurate feedback confirms the decision; corrections use the expected classification
+        """
+        if accurate and decision_classification:
+            self.observe(text, decision_classification, self.feedback_weight)
+        elif not accurate and expected_classification:
+            self.observe(text, expected_classification, self.feedback_weight)
+        else:
+            return
+        self.stats["feedback"] += 1
+
+    def warm_start(self, records, batch_size=1000):
+        """
+        Train from existing decisions before serving
+        records yields dicts with 'content' and 'classification' (a dict or JSON string)
+        """
+        for record in records:
+            content = record.get('content')
+            classification = record.get('classification')
+            if not isinstance(content, str) or classification is None:
+                continue
+            if isinstance(classification, str):
+                classification = json.loads(classification)
+            self.observe(content, classification)
+            if len(self._pending) >= batch_size:
+                self.train_pending()
+        self.train_pending()
+        self.save_version()
+
+    def train_pending(self):
+        """Run one partial_fit round over everything queued; returns the number of samples"""
+        with self._train_lock:
+            return self._train_batch()
+
+    def _train_batch(self):
+        batch = []
+        while self._pending:
+            batch.append(self._pending.popleft())
+        if not batch:
+            return 0
+
+        features = self.vectorizer.transform([text for text, _, _ in batch])
+        labels = np.vstack([labels for _, labels, _ in batch])
+        weights = np.array([weight for _, _, weight in batch])
+
+        # Train outside the lock; only swapping in the new weights blocks predict()
+        for column, category in enumerate(self.categories):
+            self.models[category].partial_fit(
+                features, labels[:, column], classes=[0, 1], sample_weight=weights
+            )
+        self.samples_seen += len(batch)
+        self._refresh_weights()
+        return len(batch)
+
+    def _refresh_weights(self):
+        weights = np.column_stack([self.models[c].coef_.ravel() for c in self.categories])
+        intercepts = np.array([self.models[c].intercept_[0] for c in self.categories])
+        with self._lock:
+            self._weights = weights
+            self._intercepts = intercepts
+
+    def start_background_training(self, interval=30.0, save_every=10):
+        """Train from queued examples every interval seconds, saving a version every save_every rounds"""
+        if self._running:
+            return
+        self._running = True
+
+        def train_loop():
+            rounds = 0
+            while self._running:
+                time.sleep(interval)
+                try:
+                    if self.train_pending():
+                        rounds += 1
+                        if rounds % save_every == 0:
+                            self.save_version()
+                except Exception as e:
+                    print(f"Fast-path training error: {e}")
+
+        self._thread = threading.Thread(target=train_loop, name="fast-path-trainer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop_background_training(self):
+        """Stop the trainer and save the latest weights"""
+        self._running = False
+        if self.samples_seen:
+            self.train_pending()
+            self.save_version()
+
+    def save_version(self):
+        """Write the weights as a new numbered version and point the manifest at it"""
+        # The manifest lock keeps workers sharing model_dir from claiming the same version
+        with self._train_lock, FileLock(self._manifest_path()).exclusive():
+            return self._save_version()
+
+    def _save_version(self):
+        if not self.samples_seen:
+            return None
+        manifest = self._read_manifest()
+        version = max([v['version'] for v in manifest['versions']], default=0) + 1
+        filename = f"fast_path-v{version:04d}.pkl"
+        with open(os.path.join(self.model_dir, filename), 'wb') as f:
+            pickle.dump({
+                'categories': self.categories,
+                'models': self.models,
+                'samples_seen': self.samples_seen
+            }, f)
+
+        manifest['versions'].append({
+            'version': version,
+            'file': filename,
+            'samples_seen': self.samples_seen,
+            'saved_at': datetime.now().isoformat()
+        })
+        # Prune old versions, keeping the newest keep_versions on disk
+        for old in manifest['versions'][:-self.keep_versions]:
+            old_path = os.path.join(self.model_dir, old['file'])
+            if os.path.exists(old_path):
+                os.remove(old_path)
+        manifest['versions'] = manifest['versions'][-self.keep_versions:]
+        manifest['current'] = version
+        self._write_manifest(manifest)
+        self.version = version
+        return version
+
+    def _manifest_path(self):
+        return os.path.join(self.model_dir, "manifest.json")
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path(), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'current': None, 'versions': []}
+
+    def _write_manifest(self, manifest):
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _load_current(self):
+        manifest = self._read_manifest()
+        current = next((v for v in manifest['versions'] if v['version'] == manifest['current']), None)
+        if current is None:
+            return
+        try:
+            with open(os.path.join(self.model_dir, current['file']), 'rb') as f:
+                state = pickle.load(f)
+            if state['categories'] != self.categories:
+                print("Fast-path model categories differ from the classifier's; starting fresh")
+                return
+            self.models = state['models']
+            self.samples_seen = state['samples_seen']
+            self.version = current['version']
+            self._refresh_weights()
+            print(f"✅ Fast-path classifier v{self.version} loaded ({self.samples_seen} samples)")
+        except Exception as e:
+            print(f"❌ Error loading fast-path classifier: {e}")
+
+    def get_stats(self):
+        decided = self.stats["served"] + self.stats["deferred"]
+        return {
+            **self.stats,
+            "serve_rate": round(self.stats["served"] / decided, 4) if decided else 0,
+            "ready": self.is_ready,
+            "version": self.version,
+            "samples_seen": self.samples_seen,
+            "pending": len(self._pending)
+        }
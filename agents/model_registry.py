@@ -0,0 +1,344 @@
+import gc
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from agents.classifier_agent import ClassifierAgent
+
+DEFAULT_REGISTRY_PATH = "model_registry.json"
+WILDCARD = "*"
+MAX_RESOLVED = 10000  # Cached (tenant, language) lookups before the cache is reset
+
+
+def load_registry_config(path=None):
+    """
+    Model routes from MODEL_REGISTRY_PATH, or {} when there is none
+    The file maps "tenant:language" (either may be *) to a backend, e.g.
+    {"routes": {"*:spanish": {"mode": "zero-shot", "model": "joeddav/xlm-roberta-large-xnli"},
+                "acme:*": {"mode": "prototype", "model": "...", "pinned": true}}}
+    A backend of "default" keeps the pipeline's own classifier for that route
+    """
+    if path is None:
+        path = os.getenv('MODEL_REGISTRY_PATH', DEFAULT_REGISTRY_PATH)
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ Error loading model registry {path}: {e}")
+        return {}
+
+
+def model_memory_mb(agent):
+    """Parameter and buffer memory of a ClassifierAgent's model in MiB, or None when it has none"""
+    if getattr(agent, 'prototype_classifier', None) is not None:
+        module = agent.prototype_classifier.encoder
+    elif getattr(agent, 'classifier', None) is not None:
+        module = agent.classifier.model
+    else:
+        return None
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors) / (1024 * 1024)
+
+
+class ModelRegistry:
+    """
+    ClassifierAgent interface that routes each text to a classifier by (tenant, language).
+
+    Routes are looked up most specific first: (tenant, language), (tenant, *),
+    (*, language), then the pipeline's own classifier. Backends load lazily on a
+    background thread the first time they are needed; until one is resident its
+    texts are served by the default classifier (after waiting up to load_wait
+    seconds), so a load never holds up requests for resident models.
+
+    Loaded models share a RAM budget measured from their parameters (or the
+    route's memory_mb estimate). Making room evicts the least recently used
+    model that is neither pinned nor hot, where hot means its request rate,
+    decayed with hot_half_life, is at least hot_threshold per half-life.
+    The default classifier is always resident and outside the budget.
+    """
+    tenant_aware = True
+
+    def __init__(self, routes, default_classifier, budget_mb=4096, detect_languages=None, load_wait=0.0,
+                 loader_threads=1, hot_half_life=300.0, hot_threshold=100.0, retry_after=300.0, loader=None):
+        self.default = default_classifier
+        self.categories = default_classifier.categories
+        self.batch_size = default_classifier.batch_size
+        self.budget_mb = budget_mb
+        # Callable texts -> language names (one batch call); only used when a route names a language
+        self.detect_languages = detect_languages
+        self.load_wait = load_wait
+        self.hot_half_life = hot_half_life
+        self.hot_threshold = hot_threshold
+        self.retry_after = retry_after
+        self._loader = loader or self._load_classifier
+
+        self.routes = {}
+        self.backends = {}  # Backend ID -> spec
+        self._pinned = set()
+        for key, spec in routes.items():
+            tenant, _, language = key.partition(':')
+            backend_id = self._add_backend(spec)
+            self.routes[(tenant or WILDCARD, language or WILDCARD)] = backend_id
+        self._by_language = any(language != WILDCARD for _, language in self.routes)
+
+        self._lock = threading.Lock()
+        self._resolved = {}
+        self._resident = OrderedDict()  # Backend ID -> entry, least recently used first
+        self._loading = {}  # Backend ID -> Future
+        self._failed = {}  # Backend ID -> (time, error)
+        self._executor = ThreadPoolExecutor(loader_threads, thread_name_prefix="model-loader")
+        self.stats = {"requests": 0, "texts": 0, "fallback_texts": 0, "loads": 0, "load_failures": 0,
+                      "evictions": 0, "load_seconds": 0.0}
+
+    def _add_backend(self, spec):
+        """Backend ID for a route spec (None for the default classifier)"""
+        if spec in (None, "default"):
+            return None
+        mode = spec.get("mode", "zero-shot")
+        backend_id = f"{mode}:{spec.get('model') or 'default'}"
+        self.backends.setdefault(backend_id, {"mode": mode, "model": spec.get("model"),
+                                              "memory_mb": spec.get("memory_mb")})
+        if spec.get("pinned"):
+            self._pinned.add(backend_id)
+        return backend_id
+
+    def _load_classifier(self, spec):
+        classifier = ClassifierAgent(mode=spec["mode"], model_name=spec["model"])
+        if spec["mode"] != "rules" and not classifier.model_loaded:
+            raise RuntimeError(f"model {spec['model']} did not load")
+        return classifier
+
+    def resolve(self, tenant=None, language=None):
+        """Backend ID serving a tenant and language, None for the default classifier"""
+        key = (tenant or WILDCARD, language or WILDCARD)
+        if key in self._resolved:
+            return self._resolved[key]
+        backend_id = None
+        for candidate in ((key[0], key[1]), (key[0], WILDCARD), (WILDCARD, key[1]), (WILDCARD, WILDCARD)):
+            if candidate in self.routes:
+                backend_id = self.routes[candidate]
+                break
+        if len(self._resolved) >= MAX_RESOLVED:
+            self._resolved = {}
+        self._resolved[key] = backend_id
+        return backend_id
+
+    def start(self):
+        """Load pinned backends in the background"""
+        for backend_id in self._pinned:
+            with self._lock:
+                self._schedule(backend_id)
+
+    def stop(self):
+        self._executor.shutdown(wait=False)
+
+    def pin(self, backend_id):
+        with self._lock:
+            self._pinned.add(backend_id)
+
+    def unpin(self, backend_id):
+        with self._lock:
+            self._pinned.discard(backend_id)
+
+    def classify(self, text, rules_only=False, tenant=None, backends=None, served=None):
+        return self.classify_batch([text], rules_only=rules_only, tenant=tenant,
+                                   backends=backends, served=served)[0]
+
+    def route_keys(self, texts, tenant=None):
+        """Backend ID each text routes to, None for the default classifier"""
+        return [self.resolve(tenant, language) for language in self._languages(texts)]
+
+    def classify_batch(self, texts, batch_size=None, rules_only=False, tenant=None, backends=None, served=None):
+        """
+        One classification per text, in order, each from its route's classifier
+        backends: route_keys() already computed for the texts; served: a list that is
+        filled with the backend that actually classified each text (None for the default)
+        """
+        if rules_only:
+            if served is not None:
+                served[:] = [None] * len(texts)
+            return self.default.classify_batch(texts, batch_size=batch_size, rules_only=True)
+
+        if backends is None:
+            backends = self.route_keys(texts, tenant)
+        groups = {}
+        for i, backend_id in enumerate(backends):
+            groups.setdefault(backend_id, []).append(i)
+
+        results = [None] * len(texts)
+        classified_by = [None] * len(texts)
+        for backend_id, indices in groups.items():
+            classifier = self._classifier(backend_id, len(indices)) if backend_id is not None else None
+            if classifier is None:
+                classifier, backend_id = self.default, None
+            classified = classifier.classify_batch([texts[i] for i in indices], batch_size=batch_size)
+            for i, classification in zip(indices, classified):
+                results[i] = classification
+                classified_by[i] = backend_id
+        if served is not None:
+            served[:] = classified_by
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["texts"] += len(texts)
+        return results
+
+    def _languages(self, texts):
+        if not self._by_language or self.detect_languages is None:
+            return [WILDCARD] * len(texts)
+        return self.detect_languages(texts)
+
+    def _classifier(self, backend_id, texts):
+        """The resident classifier for a backend, or None when it is still loading or failed"""
+        with self._lock:
+            entry = self._resident.get(backend_id)
+            if entry is not None:
+                self._resident.move_to_end(backend_id)
+                self._touch(entry, texts)
+                return entry["classifier"]
+            future = self._schedule(backend_id)
+
+        if future is not None and self.load_wait > 0:
+            try:
+                return future.result(timeout=self.load_wait)
+            except (TimeoutError, Exception):
+                pass
+        with self._lock:
+            self.stats["fallback_texts"] += texts
+        return None
+
+    def _touch(self, entry, texts):
+        """Record use of a resident backend; caller holds the lock"""
+        now = time.monotonic()
+        entry["rate"] = self._rate(entry, now) + texts
+        entry["last_used"] = now
+        entry["texts"] += texts
+
+    def _rate(self, entry, now):
+        return entry["rate"] * 0.5 ** ((now - entry["last_used"]) / self.hot_half_life)
+
+    def _schedule(self, backend_id):
+        """Future of a backend load, starting one unless it recently failed; caller holds the lock"""
+        if backend_id in self._loading:
+            return self._loading[backend_id]
+        failed = self._failed.get(backend_id)
+        if failed is not None and time.monotonic() - failed[0] < self.retry_after:
+            return None
+        future = self._executor.submit(self._load, backend_id)
+        self._loading[backend_id] = future
+        return future
+
+    def _load(self, backend_id):
+        spec = self.backends[backend_id]
+        with self._lock:
+            evicted = self._make_room(spec["memory_mb"] or 0, keep=None)
+        if evicted:
+            gc.collect()
+
+        started = time.monotonic()
+        try:
+            classifier = self._loader(spec)
+        except Exception as e:
+            with self._lock:
+                self._loading.pop(backend_id, None)
+                self._failed[backend_id] = (time.monotonic(), str(e))
+                self.stats["load_failures"] += 1
+            print(f"❌ Error loading classifier {backend_id}: {e}")
+            raise
+        seconds = time.monotonic() - started
+        memory_mb = model_memory_mb(classifier) or spec["memory_mb"] or 0
+
+        with self._lock:
+            now = time.monotonic()
+            self._resident[backend_id] = {"classifier": classifier, "memory_mb": memory_mb, "loaded_at": now,
+                                          "last_used": now, "rate": 0.0, "texts": 0}
+            self._loading.pop(backend_id, None)
+            self._failed.pop(backend_id, None)
+            self.stats["loads"] += 1
+            self.stats["load_seconds"] += seconds
+            evicted = self._make_room(0, keep=backend_id)
+        if evicted:
+            gc.collect()
+        print(f"✅ Classifier {backend_id} loaded in {seconds:.1f}s ({memory_mb:.0f} MB)")
+        return classifier
+
+    def _used_mb(self):
+        return sum(entry["memory_mb"] for entry in self._resident.values())
+
+    def _make_room(self, needed_mb, keep):
+        """Evict cold, unpinned backends (LRU first) until needed_mb fits; caller holds the lock"""
+        now = time.monotonic()
+        evicted = []
+        for backend_id in list(self._resident):
+            if self._used_mb() + needed_mb <= self.budget_mb:
+                break
+            entry = self._resident[backend_id]
+            if backend_id == keep or backend_id in self._pinned or self._rate(entry, now) >= self.hot_threshold:
+                continue
+            del self._resident[backend_id]
+            evicted.append(backend_id)
+            self.stats["evictions"] += 1
+            print(f"⚠️  Evicted classifier {backend_id} ({entry['memory_mb']:.0f} MB) to stay within the model budget")
+        if self._used_mb() + needed_mb > self.budget_mb:
+            print(f"⚠️  Model budget of {self.budget_mb} MB exceeded: remaining models are pinned or hot")
+        return evicted
+
+    def get_stats(self):
+        with self._lock:
+            now = time.monotonic()
+            resident = {
+                backend_id: {
+                    "memory_mb": round(entry["memory_mb"], 1),
+                    "texts": entry["texts"],
+                    "rate": round(self._rate(entry, now), 1),
+                    "pinned": backend_id in self._pinned,
+                    "hot": self._rate(entry, now) >= self.hot_threshold,
+                    "idle_seconds": round(now - entry["last_used"], 1)
+                }
+                for backend_id, entry in self._resident.items()
+            }
+            return {
+                **self.stats,
+                "load_seconds": round(self.stats["load_seconds"], 2),
+                "budget_mb": self.budget_mb,
+                "used_mb": round(self._used_mb(), 1),
+                "routes": {f"{tenant}:{language}": backend_id or "default"
+                           for (tenant, language), backend_id in self.routes.items()},
+                "resident": resident,
+                "loading": list(self._loading),
+                "failed": {backend_id: error for backend_id, (_, error) in self._failed.items()}
+            }
+
+
+# Test the registry with rules-only stand-in models
+if __name__ == "__main__":
+    def slow_loader(spec):
+        time.sleep(1.0)  # Stands in for downloading and loading weights
+        return ClassifierAgent(mode="rules", profile_path="")
+
+    registry = ModelRegistry(
+        {
+            "*:spanish": {"mode": "rules", "model": "spanish", "memory_mb": 600},
+            "*:french": {"mode": "rules", "model": "french", "memory_mb": 600},
+            "acme:*": {"mode": "rules", "model": "acme", "memory_mb": 600, "pinned": True}
+        },
+        ClassifierAgent(mode="rules", profile_path=""),
+        budget_mb=1300,
+        detect_languages=lambda texts: [text.split()[0] for text in texts],
+        loader=slow_loader
+    )
+    registry.start()
+    started = time.time()
+    registry.classify_batch(["spanish hola idiot", "english hello"])
+    print(f"Spanish not resident yet, served by the default in {(time.time() - started) * 1000:.1f} ms")
+    time.sleep(1.5)
+    registry.classify_batch(["spanish hola"])
+    registry.classify_batch(["french bonjour"])
+    time.sleep(2.5)
+    registry.classify_batch(["french bonjour"], tenant="acme")
+    print(json.dumps(registry.get_stats(), indent=2))
+    registry.stop()
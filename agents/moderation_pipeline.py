@@ -0,0 +1,231 @@
+import json
+from contextlib import nullcontext
+from itertools import islice
+from utils.fingerprint import content_fingerprint
+
+
+class ModerationPipeline:
+    """Runs classify -> risk -> action for single items, batches and NDJSON streams"""
+    def __init__(self, classifier, risk_assessor, action_decider, auditor,
+                 dataset_manager=None, persistence_queue=None, near_duplicates=None,
+                 admission=None, profiler=None, trending=None):
+        self.classifier = classifier
+        self.risk_assessor = risk_assessor
+        self.action_decider = action_decider
+        self.auditor = auditor
+        self.dataset_manager = dataset_manager
+        self.persistence_queue = persistence_queue
+        self.near_duplicates = near_duplicates
+        # Optional AdmissionController gating model inference
+        self.admission = admission
+        # Optional Profiler timing each stage and counting its allocations
+        self.profiler = profiler
+        # Optional TrendingTerms fed with flagged content (non-blocking)
+        self.trending = trending
+
+    def _admit(self, priority):
+        """Model slot context; yields True when classification must degrade to rules"""
+        if self.admission is None:
+            return nullcontext(False)
+        return self.admission.admit(priority)
+
+    def _request(self):
+        if self.profiler is None:
+            return nullcontext(False)
+        return self.profiler.request()
+
+    def _stage(self, name):
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.stage(name)
+
+    def _routing(self, tenant, backends, served):
+        """Extra classify arguments; only tenant-aware classifiers (ModelRegistry) route"""
+        if not getattr(self.classifier, 'tenant_aware', False):
+            return {}
+        return {'tenant': tenant, 'backends': backends, 'served': served}
+
+    def _scopes(self, texts, tenant):
+        """
+        Backend each text routes to (all None without a ModelRegistry)
+        Near-duplicates are only shared between texts classified by the same backend
+        """
+        if not getattr(self.classifier, 'tenant_aware', False):
+            return [None] * len(texts)
+        return self.classifier.route_keys(texts, tenant)
+
+    def moderate(self, content, user_id="anonymous", persist=True, priority="normal", tenant=None):
+        """
+        Moderate a single piece of content
+        Raises AdmissionRejectedError when low-priority work is shed under overload
+        """
+        with self._request():
+            fingerprint = content_fingerprint(content)
+            scopes = self._scopes([content], tenant)
+            with self._stage("near_duplicate"):
+                signature, match = self._find_near_duplicate(content, scopes[0])
+            degraded = False
+            if match is not None:
+                classification = dict(match['classification'])
+            else:
+                served = list(scopes)
+                with self._admit(priority) as degraded, self._stage("classify"):
+                    classification = self.classifier.classify(
+                        content, rules_only=degraded, **self._routing(tenant, scopes, served)
+                    )
+                if not degraded:
+                    self._remember(signature, fingerprint, classification, served[0])
+
+            result = self._decide(content, user_id, classification, persist, fingerprint)
+            result['near_duplicate'] = self._near_duplicate_marker(match)
+            result['degraded'] = degraded
+            return result
+
+    def moderate_batch(self, items, persist=True, batch_size=None, priority="normal", tenant=None):
+        """
+        Moderate a list of {'content', 'user_id'} items through the batched classifier
+        Failures are returned per item as {'error': ...} instead of raising
+        """
+        with self._request():
+            fingerprints = [content_fingerprint(item['content']) for item in items]
+            scopes = self._scopes([item['content'] for item in items], tenant)
+            with self._stage("near_duplicate"):
+                lookups = [
+                    self._find_near_duplicate(item['content'], scope) for item, scope in zip(items, scopes)
+                ]
+            misses = [i for i, (_, match) in enumerate(lookups) if match is None]
+
+            # Only items without a near-duplicate go through the model
+            classifications = [
+                dict(match['classification']) if match is not None else None
+                for _, match in lookups
+            ]
+            degraded = False
+            if misses:
+                served = [scopes[i] for i in misses]
+                with self._admit(priority) as degraded, self._stage("classify"):
+                    classified = self.classifier.classify_batch(
+                        [items[i]['content'] for i in misses], batch_size=batch_size,
+                        rules_only=degraded, **self._routing(tenant, [scopes[i] for i in misses], served)
+                    )
+                for i, classification, scope in zip(misses, classified, served):
+                    classifications[i] = classification
+                    if not degraded:
+                        self._remember(lookups[i][0], fingerprints[i], classification, scope)
+
+            results = []
+            for item, fingerprint, classification, (_, match) in zip(items, fingerprints, classifications, lookups):
+                try:
+                    result = self._decide(
+                        item['content'], item.get('user_id', 'anonymous'),
+                        classification, persist, fingerprint
+                    )
+                    result['near_duplicate'] = self._near_duplicate_marker(match)
+                    result['degraded'] = degraded and match is None
+                    results.append(result)
+                except Exception as e:
+                    results.append({'error': str(e)})
+            return results
+
+    def moderate_stream(self, lines, max_in_flight=32, persist=True, batch_size=None, priority="normal",
+                        tenant=None, first_line=1):
+        """
+        Moderate an iterable of NDJSON lines, yielding one NDJSON result line per input line
+        At most max_in_flight lines are held in memory at a time; first_line numbers the first one
+        """
+        numbered = enumerate(lines, first_line)
+        while True:
+            chunk = list(islice(numbered, max_in_flight))
+            if not chunk:
+                break
+
+            items = []
+            for line_no, raw in chunk:
+                if not raw.strip():
+                    continue
+                try:
+                    item = json.loads(raw)
+                    if not isinstance(item, dict) or not isinstance(item.get('content'), str):
+                        raise ValueError("each line needs a string 'content' field")
+                    items.append((line_no, item))
+                except ValueError as e:
+                    yield self._stream_line({'line': line_no, 'error': f"Invalid line: {e}"})
+
+            if not items:
+                continue
+
+            try:
+                results = self.moderate_batch(
+                    [item for _, item in items], persist=persist,
+                    batch_size=batch_size, priority=priority, tenant=tenant
+                )
+            except Exception as e:
+                results = [{'error': str(e)}] * len(items)
+
+            for (line_no, item), result in zip(items, results):
+                yield self._stream_line({'line': line_no, 'id': item.get('id'), **result})
+
+    def _find_near_duplicate(self, content, scope):
+        """Returns (signature, match) where match is a recent similar decision of the scope or None"""
+        if self.near_duplicates is None:
+            return None, None
+        signature = self.near_duplicates.signature(content)
+        return signature, self.near_duplicates.query(signature, scope)
+
+    def _remember(self, signature, fingerprint, classification, scope):
+        """Index a decision under the backend that classified it (after a fallback, the default)"""
+        if self.near_duplicates is not None:
+            self.near_duplicates.add(signature, classification, fingerprint, scope)
+
+    def _near_duplicate_marker(self, match):
+        if match is None:
+            return None
+        return {
+            'hit': True,
+            'similarity': round(match['similarity'], 4),
+            'matched_content_hash': match['content_hash']
+        }
+
+    def _decide(self, content, user_id, classification, persist, fingerprint):
+        """Assess risk, decide actions and hand the decision to persistence"""
+        with self._stage("risk"):
+            risk_assessment = self.risk_assessor.evaluate_risk(classification, content, user_id)
+        if self.trending is not None:
+            self.trending.observe(content, risk_assessment['level'], classification)
+        with self._stage("action"):
+            actions = self.action_decider.determine_action(risk_assessment, classification, content)
+        with self._stage("explain"):
+            explanation = self.auditor.generate_explanation(classification, risk_assessment)
+
+        result = {
+            'content_hash': fingerprint,
+            'classification': classification,
+            'risk_score': risk_assessment,
+            'action': actions,
+            'explanation': explanation
+        }
+        if persist:
+            self.persist(content, user_id, result)
+        return result
+
+    def persist(self, content, user_id, result):
+        """
+        Hand a decision to persistence (write-behind unless in sync mode)
+        For results moderated with persist=False, e.g. when the caller awaits persistence separately
+        """
+        if self.persistence_queue is None:
+            return
+        with self._stage("persist"):
+            self.persistence_queue.submit({
+                'audit_entry': self.auditor.build_entry(
+                    content, user_id, result['classification'], result['risk_score'],
+                    result['action'], result['explanation'], result['content_hash']
+                ),
+                'dataset_entry': self.dataset_manager.build_entry(
+                    content, user_id, result['classification'], result['risk_score'],
+                    result['action'], result['content_hash']
+                )
+            })
+
+    def _stream_line(self, payload):
+        return json.dumps(payload) + "\n"
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+from typing import Dict, List
+
+import numpy as np
+
+# Short descriptions whose mean embedding is the category prototype
+CATEGORY_DESCRIPTIONS = {
+    "hate speech": [
+        "hateful slurs attacking people for their race, religion or ethnicity",
+        "saying a group of people is inferior and should be eliminated",
+        "dehumanising insults aimed at a protected group"
+    ],
+    "harassment": [
+        "insulting and bullying a specific person",
+        "you are a worthless idiot and everyone hates you",
+        "repeatedly mocking and intimidating someone online"
+    ],
+    "violence": [
+        "threatening to kill or hurt someone",
+        "describing a violent attack in graphic detail",
+        "I am going to beat you up"
+    ],
+    "self-harm": [
+        "wanting to kill myself or end my life",
+        "talking about cutting or hurting oneself",
+        "I don't want to live anymore"
+    ],
+    "sexual content": [
+        "explicit sexual descriptions or pornography",
+        "asking someone to send nude pictures",
+        "sexually suggestive messages"
+    ],
+    "spam": [
+        "click this link to win a free prize",
+        "buy now, limited time offer, huge discount",
+        "unsolicited advertising and repeated promotional messages"
+    ],
+    "misinformation": [
+        "false claims presented as facts about health or science",
+        "conspiracy theories about vaccines or elections",
+        "fabricated news stories meant to mislead"
+    ]
+}
+
+DEFAULT_THRESHOLD = 0.35
+DEFAULT_SCALE = 20.0
+
+
+class PrototypeClassifier:
+    """
+    Embedding classifier: one sentence-encoder pass per text, cosine similarity per category.
+
+    Each category is represented by the normalised mean embedding of a few
+    descriptions. Prototypes are cached on disk per (model, descriptions), so
+    adding a category only embeds its own descriptions. Cosine similarity is
+    mapped to a probability with a per-category calibrated threshold and scale.
+    """
+    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2",
+                 cache_dir="models/prototypes", descriptions=None):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.calibration_path = os.path.join(cache_dir, f"calibration-{model_name.replace('/', '_')}.json")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.encoder = SentenceTransformer(model_name, device="cpu")
+        self.categories: List[str] = []
+        self.prototypes = np.zeros((0, self.encoder.get_sentence_embedding_dimension()), dtype=np.float32)
+        self.calibration = self._load_calibration()
+        if not self.calibration:
+            print("⚠️ Prototype thresholds are uncalibrated; run calibrate_prototypes.py")
+
+        for category, category_descriptions in (descriptions or CATEGORY_DESCRIPTIONS).items():
+            self.add_category(category, category_descriptions)
+
+    def add_category(self, category: str, descriptions: List[str]):
+        """Add or replace a category prototype (embeds only this category's descriptions)"""
+        prototype = self._load_or_build_prototype(category, descriptions)
+        if category in self.categories:
+            self.prototypes[self.categories.index(category)] = prototype
+        else:
+            self.categories.append(category)
+            self.prototypes = np.vstack([self.prototypes, prototype])
+
+    def _load_or_build_prototype(self, category, descriptions):
+        key = hashlib.sha256(json.dumps([self.model_name, category, descriptions]).encode()).hexdigest()[:16]
+        path = os.path.join(self.cache_dir, f"prototype-{key}.npy")
+        if os.path.exists(path):
+            return np.load(path)
+
+        embeddings = self.encoder.encode(descriptions, normalize_embeddings=True)
+        prototype = embeddings.mean(axis=0)
+        prototype = (prototype / np.linalg.norm(prototype)).astype(np.float32)
+        np.save(path, prototype)
+        return prototype
+
+    def similarities(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """Cosine similarity of each text to each prototype, shape (texts, categories)"""
+        embeddings = self.encoder.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+        return embeddings @ self.prototypes.T
+
+    def score_batch(self, texts: List[str], batch_size: int = 32) -> List[Dict[str, float]]:
+        """Calibrated per-category probabilities for each text"""
+        thresholds, scales = self._calibration_arrays()
+        probabilities = 1.0 / (1.0 + np.exp(-(self.similarities(texts, batch_size) - thresholds) * scales))
+        return [dict(zip(self.categories, map(float, row))) for row in probabilities]
+
+    def _calibration_arrays(self):
+        thresholds = np.array([
+            self.calibration.get(c, {}).get("threshold", DEFAULT_THRESHOLD) for c in self.categories
+        ])
+        scales = np.array([
+            self.calibration.get(c, {}).get("scale", DEFAULT_SCALE) for c in self.categories
+        ])
+        return thresholds, scales
+
+    def calibrate(self, texts: List[str], labels: List[List[str]], scale: float = DEFAULT_SCALE,
+                  min_positives: int = 1):
+        """
+        Fit a per-category threshold that maximises F1 on labelled examples
+        labels holds the list of categories present for each text; categories with
+        fewer than min_positives examples keep their current calibration
+        (calibrate_prototypes.py runs this on labelled dataset rows)
+        """
+        similarities = self.similarities(texts)
+        for column, category in enumerate(self.categories):
+            truth = np.array([category in text_labels for text_labels in labels])
+            if truth.sum() < max(1, min_positives):
+                continue
+            best_threshold, best_f1 = DEFAULT_THRESHOLD, -1.0
+            for threshold in np.unique(similarities[:, column]):
+                predicted = similarities[:, column] >= threshold
+                true_positives = np.sum(predicted & truth)
+                f1 = 2 * true_positives / (predicted.sum() + truth.sum())
+                if f1 > best_f1:
+                    best_threshold, best_f1 = float(threshold), float(f1)
+            self.calibration[category] = {"threshold": best_threshold, "scale": scale, "f1": round(best_f1, 4)}
+
+        with open(self.calibration_path, 'w') as f:
+            json.dump(self.calibration, f, indent=2)
+        return self.calibration
+
+    def _load_calibration(self):
+        try:
+            with open(self.calibration_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
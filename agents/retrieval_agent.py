@@ -1,64 +1,194 @@
 import json
+import threading
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 
 class RetrievalAgent:
-    def __init__(self, dataset_manager):
+    """
+    Similar-case search over a category score matrix built from the dataset.
+
+    Each indexed row keeps its category scores and the byte offset of its dataset
+    row; the full case is read back only for the top matches. The matrix is split
+    into a base, mapped read-only from the latest snapshot, and an in-memory delta
+    of rows appended since. Booting replays only the dataset rows written after
+    the snapshot's offset.
+    """
+    def __init__(self, dataset_manager, snapshot_store=None):
         self.dataset_manager = dataset_manager
+        self.snapshot_store = snapshot_store
+        self._lock = threading.Lock()
+        self._categories = {}  # Category -> column in the score matrices
+        self._base_scores = np.full((0, 0), np.nan, dtype=np.float32)
+        self._base_offsets = np.zeros(0, dtype=np.int64)
+        self._scores = np.full((0, 0), np.nan, dtype=np.float32)  # Delta since the snapshot
+        self._offsets = np.zeros(0, dtype=np.int64)
+        self._count = 0  # Rows used in the delta
+        self._sync_lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._dataset_offset = 0  # Byte offset of the next unindexed dataset row
+        self._load_snapshot()
+        self._sync()
+    
+    def _load_snapshot(self):
+        if self.snapshot_store is None:
+            return
+        arrays, meta = self.snapshot_store.load("retrieval")
+        if arrays is None:
+            return
+        if not self.dataset_manager.matches_snapshot(meta.get('dataset'), meta['dataset_offset']):
+            # Offsets into a replaced or truncated dataset would map to the wrong rows
+            print("⚠️ Retrieval snapshot does not match the current dataset file; rebuilding the index")
+            return
+        self._categories = {category: i for i, category in enumerate(meta['categories'])}
+        self._base_scores = arrays['scores']
+        self._base_offsets = arrays['offsets']
+        self._dataset_offset = meta['dataset_offset']
+        # The delta's columns must line up with the base even before any row is added
+        self._scores = np.full((0, len(self._categories)), np.nan, dtype=np.float32)
+        print(f"✅ Retrieval index loaded from snapshot ({len(self._base_offsets)} cases)")
+    
+    def snapshot(self):
+        """Write base + delta as a new snapshot and map it back as the base"""
+        if self.snapshot_store is None:
+            return
+        with self._snapshot_lock:
+            with self._sync_lock, self._lock:
+                base_count = len(self._base_offsets)
+                columns = len(self._categories)
+                base = self._base_scores
+                if base.shape[1] < columns:
+                    base = np.pad(base, ((0, 0), (0, columns - base.shape[1])), constant_values=np.nan)
+                scores = np.concatenate([base, self._scores[:self._count, :columns]])
+                offsets = np.concatenate([self._base_offsets, self._offsets[:self._count]])
+                categories = sorted(self._categories, key=self._categories.get)
+                dataset_offset = self._dataset_offset
+                dataset = self.dataset_manager.file_identity()
+            
+            generation = self.snapshot_store.save(
+                "retrieval", {'scores': scores, 'offsets': offsets},
+                {'categories': categories, 'dataset_offset': dataset_offset, 'dataset': dataset}
+            )
+            arrays, _ = self.snapshot_store.load("retrieval", generation)
+            self._swap_base(arrays, len(offsets) - base_count)
+    
+    def _swap_base(self, arrays, indexed):
+        with self._lock:
+            # Rows indexed while the snapshot was written stay in the delta
+            self._base_scores = arrays['scores']
+            self._base_offsets = arrays['offsets']
+            self._scores[:self._count - indexed] = self._scores[indexed:self._count]
+            self._offsets[:self._count - indexed] = self._offsets[indexed:self._count]
+            self._count -= indexed
+    
+    def _sync(self):
+        """Index dataset rows appended since the last sync, by this or any other worker"""
+        with self._sync_lock:
+            rows, dataset_offset = self.dataset_manager.read_since(self._dataset_offset)
+            
+            entries = []
+            for offset, row in rows:
+                try:
+                    entries.append((offset, json.loads(row['classification'])))
+                except (json.JSONDecodeError, TypeError, KeyError) as e:
+                    print(f"Error processing row: {e}")
+                    continue
+            if entries:
+                self._index_rows(entries)
+            self._dataset_offset = dataset_offset
+    
+    def _index_rows(self, entries):
+        """Add (dataset offset, classification) pairs to the delta"""
+        with self._lock:
+            for _, classification in entries:
+                for category in classification:
+                    if category not in self._categories:
+                        self._categories[category] = len(self._categories)
+            
+            rows, cols = self._scores.shape
+            needed = self._count + len(entries)
+            if needed > rows or len(self._categories) > cols:
+                # Grow geometrically so appends stay amortised O(1)
+                grown = np.full((max(needed, rows * 2, 64), len(self._categories)), np.nan, dtype=np.float32)
+                grown[:rows, :cols] = self._scores
+                self._scores = grown
+                grown_offsets = np.zeros(grown.shape[0], dtype=np.int64)
+                grown_offsets[:rows] = self._offsets
+                self._offsets = grown_offsets
+            
+            for offset, classification in entries:
+                for category, score in classification.items():
+                    if isinstance(score, (int, float)):
+                        self._scores[self._count, self._categories[category]] = score
+                self._offsets[self._count] = offset
+                self._count += 1
+    
+    def _similarity(self, scores, current):
+        """Mean of min(current, historical) over the categories both have scores for"""
+        current = current[:scores.shape[1]]
+        matching = ~np.isnan(scores) & ~np.isnan(current)
+        matching_counts = matching.sum(axis=1)
+        overlap = np.where(matching, np.fmin(scores, current), 0.0).sum(axis=1)
+        return np.divide(
+            overlap, matching_counts,
+            out=np.zeros(len(scores)), where=matching_counts > 0
+        )
     
     def search_similar_content(self, current_classification, threshold=0.6):
         """
-        Simple version - find similar content based on classification patterns
+        Find similar content based on classification patterns
+        Similarity is the mean of min(current, historical) over shared categories
         """
-        if self.dataset_manager.dataset.empty:
+        self._sync()
+        with self._lock:
+            base_scores, base_offsets = self._base_scores, self._base_offsets
+            scores = self._scores[:self._count]
+            offsets = self._offsets[:self._count].copy()
+            categories = dict(self._categories)
+        if len(base_offsets) + len(offsets) == 0:
             return []
         
-        similar_cases = []
-        
         try:
-            for _, row in self.dataset_manager.dataset.iterrows():
-                try:
-                    # Get historical classification
-                    hist_classification = json.loads(row['classification'])
-                    
-                    # Calculate simple similarity score
-                    similarity_score = 0
-                    matching_categories = 0
-                    
-                    for category, current_score in current_classification.items():
-                        if category in hist_classification:
-                            hist_score = hist_classification[category]
-                            # Ensure both are numbers
-                            if isinstance(current_score, (int, float)) and isinstance(hist_score, (int, float)):
-                                similarity_score += min(current_score, hist_score)
-                                matching_categories += 1
-                    
-                    # Calculate average similarity
-                    if matching_categories > 0:
-                        similarity_score /= matching_categories
-                    
-                    # Add to results if above threshold
-                    if similarity_score >= threshold:
-                        similar_cases.append({
-                            'similarity': similarity_score,
-                            'classification': hist_classification,
-                            'risk_score': json.loads(row['risk_score']),
-                            'action_taken': json.loads(row['action_taken']),
-                            'timestamp': str(row['timestamp'])
-                        })
-                
-                except (json.JSONDecodeError, TypeError) as e:
-                    print(f"Error processing row: {e}")
-                    continue
+            current = np.full(len(categories), np.nan, dtype=np.float32)
+            for category, current_score in current_classification.items():
+                if category in categories and isinstance(current_score, (int, float)):
+                    current[categories[category]] = current_score
             
-            # Sort by similarity (highest first)
-            similar_cases.sort(key=lambda x: x['similarity'], reverse=True)
-            return similar_cases[:5]  # Return top 5 similar cases
+            similarity = np.concatenate([
+                self._similarity(base_scores, current),
+                self._similarity(scores, current)
+            ])
+            all_offsets = np.concatenate([base_offsets, offsets])
+            
+            # Sort by similarity (highest first), keeping insertion order for ties
+            candidates = np.flatnonzero(similarity >= threshold)
+            candidates = candidates[np.argsort(-similarity[candidates], kind='stable')][:5]
+            
+            rows = self.dataset_manager.get_rows([int(all_offsets[row]) for row in candidates])
+            similar_cases = []
+            for row, record in zip(candidates, rows):
+                similar_cases.append({
+                    'similarity': round(float(similarity[row]), 4),
+                    'classification': json.loads(record['classification']),
+                    'risk_score': json.loads(record['risk_score']),
+                    'action_taken': json.loads(record['action_taken']),
+                    'timestamp': record['timestamp']
+                })
+            return similar_cases  # Return top 5 similar cases
             
         except Exception as e:
             print(f"Error in search_similar_content: {e}")
             return []  # Return empty list instead of crashing
     
+    def get_stats(self):
+        with self._lock:
+            return {
+                'snapshot_cases': len(self._base_offsets),
+                'delta_cases': self._count,
+                'categories': len(self._categories),
+                'dataset_offset': self._dataset_offset
+            }
+    
     def retrieve_precedents(self, classification, min_confidence=0.5):
         """
         Simple version - retrieve historical precedents
@@ -1,5 +1,8 @@
 class RiskAgent:
-    def __init__(self):
+    def __init__(self, velocity_store=None, config=None):
+        # Optional UserVelocityStore; when set, posting velocity adds risk
+        self.velocity_store = velocity_store
+        self.velocity_limit = 20  # Posts per window before velocity adds risk
         self.thresholds = {
             "hate speech": 0.4,  # Lowered thresholds to be more sensitive
             "harassment": 0.4,
@@ -9,8 +12,25 @@ class RiskAgent:
             "spam": 0.6,
             "misinformation": 0.5
         }
+        self.category_weights = {
+            "violence": 0.7,      # Much higher weight for violence
+            "self-harm": 0.7,     # Much higher weight for self-harm
+            "sexual content": 0.6,  # Increased from 0.25 to 0.6
+            "hate speech": 0.5,
+            "harassment": 0.5,
+            "spam": 0.2,
+            "misinformation": 0.3
+        }
+        # Minimum score for each risk level above Low
+        self.level_cutoffs = {"Medium": 0.3, "High": 0.7}
+        
+        # Optional overrides, e.g. a candidate config being replayed
+        config = config or {}
+        self.thresholds.update(config.get('thresholds', {}))
+        self.category_weights.update(config.get('category_weights', {}))
+        self.level_cutoffs.update(config.get('level_cutoffs', {}))
     
-    def evaluate_risk(self, classification, text):
+    def evaluate_risk(self, classification, text, user_id=None):
         print(f"🔍 Risk evaluation for: {classification}")  # DEBUG
         risk_score = 0.0
         reasons = []
@@ -36,6 +56,11 @@ class RiskAgent:
         risk_score += text_risk
         print(f"   Text characteristics add {text_risk:.2f} risk")  # DEBUG
         
+        # Recent behaviour of the posting user
+        velocity_risk, velocity_reasons = self._evaluate_user_velocity(user_id)
+        risk_score += velocity_risk
+        reasons.extend(velocity_reasons)
+        
         # Ensure minimum risk for certain keywords
         risk_score = self._apply_keyword_boost(text, risk_score)
         
@@ -43,10 +68,14 @@ class RiskAgent:
         risk_score = min(1.0, max(0.0, risk_score))  # Clamp between 0 and 1
         print(f"   Final risk score: {risk_score:.2f}")  # DEBUG
         
+        risk_level = self._get_risk_level(risk_score)
+        if self._tracks_user(user_id):
+            self.velocity_store.record(user_id, high_risk=risk_level == "High")
+        
         return {
             "score": risk_score,
             "reasons": reasons,
-            "level": self._get_risk_level(risk_score)
+            "level": risk_level
         }
     
     def _ensure_float(self, value):
@@ -62,16 +91,7 @@ class RiskAgent:
             return 0.0
     
     def _get_category_weight(self, category):
-        weights = {
-            "violence": 0.7,      # Much higher weight for violence
-            "self-harm": 0.7,     # Much higher weight for self-harm
-            "sexual content": 0.6,  # Increased from 0.25 to 0.6
-            "hate speech": 0.5,
-            "harassment": 0.5,
-            "spam": 0.2,
-            "misinformation": 0.3
-        }
-        return weights.get(category, 0.3)
+        return self.category_weights.get(category, 0.3)
     
     def _evaluate_text_characteristics(self, text):
         risk = 0.0
@@ -91,6 +111,33 @@ class RiskAgent:
             risk += 0.2
         return risk
     
+    def _tracks_user(self, user_id):
+        # "anonymous" is shared by every unidentified poster, so it has no velocity
+        return self.velocity_store is not None and user_id not in (None, "", "anonymous")
+    
+    def _evaluate_user_velocity(self, user_id):
+        """Risk from the user's posting rate and recent high-risk rate"""
+        if not self._tracks_user(user_id):
+            return 0.0, []
+        
+        features = self.velocity_store.get_features(user_id)
+        risk = 0.0
+        reasons = []
+        
+        if features["posts"] > self.velocity_limit * 2:
+            risk += 0.2
+            reasons.append(f"Very high posting velocity: {features['posts']} posts")
+        elif features["posts"] > self.velocity_limit:
+            risk += 0.1
+            reasons.append(f"High posting velocity: {features['posts']} posts")
+        
+        # Only trust the rate once the user has some history in the window
+        if features["posts"] >= 3 and features["high_risk_rate"] >= 0.5:
+            risk += 0.2
+            reasons.append(f"Recent high-risk rate: {features['high_risk_rate']:.0%}")
+        
+        return risk, reasons
+    
     def _apply_keyword_boost(self, text, current_risk):
         """Apply minimum risk scores for clearly dangerous content"""
         text_lower = text.lower()
@@ -115,9 +162,9 @@ class RiskAgent:
         return current_risk
     
     def _get_risk_level(self, score):
-        if score < 0.3:
+        if score < self.level_cutoffs["Medium"]:
             return "Low"
-        elif score < 0.7:
+        elif score < self.level_cutoffs["High"]:
             return "Medium"
         else:
             return "High"
\ No newline at end of file
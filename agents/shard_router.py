@@ -0,0 +1,321 @@
+import bisect
+import hashlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import requests
+
+from agents.communication_protocols import Message
+from utils.fingerprint import content_fingerprint
+
+
+class ShardUnavailableError(Exception):
+    """Raised when no classifier node could answer a request"""
+    pass
+
+
+def _ring_hash(value):
+    return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+
+class ShardRouter:
+    """
+    Routes classification requests to classifier nodes on a consistent-hash ring.
+
+    The key is the content fingerprint, so the same text always lands on the same
+    node and that node's classification cache stays hot. Each node owns
+    `replicas` points on the ring; when a node fails its health checks (or
+    failure_threshold requests in a row) the ring is rebuilt without it and only
+    its keys move to their next node, coming back when it recovers.
+
+    A request that has not answered after hedge_delay seconds (by default the p95
+    of recent node latency) is also sent to the next node on the ring and the
+    first answer wins, which cuts the latency tail from a slow or stalled node.
+    """
+    def __init__(self, endpoints, replicas=64, timeout=5.0, hedge_delay=None, health_interval=5.0,
+                 failure_threshold=2, max_workers=32):
+        self.endpoints = [endpoint.rstrip('/') for endpoint in endpoints]
+        self.replicas = replicas
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.health_interval = health_interval
+        self.failure_threshold = failure_threshold
+        self._session = requests.Session()
+        self._session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=max_workers))
+        self._requests = ThreadPoolExecutor(max_workers, thread_name_prefix="shard-request")
+        self._groups = ThreadPoolExecutor(max_workers, thread_name_prefix="shard-group")
+        self._lock = threading.Lock()
+        self._healthy = set(self.endpoints)
+        self._failures = {endpoint: 0 for endpoint in self.endpoints}
+        self._latencies = deque(maxlen=500)
+        self.node_stats = {
+            endpoint: {"requests": 0, "failures": 0, "texts": 0, "latencies": deque(maxlen=500)}
+            for endpoint in self.endpoints
+        }
+        self.stats = {"requests": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0, "rebalances": 0}
+        self._ring = ([], [])
+        self._rebuild_ring()
+        self._thread = None
+        self._running = False
+
+    def _rebuild_ring(self):
+        """Ring of the healthy nodes; swapped in whole so lookups never see a partial ring"""
+        points = sorted(
+            (_ring_hash(f"{endpoint}#{i}"), endpoint)
+            for endpoint in self.endpoints if endpoint in self._healthy
+            for i in range(self.replicas)
+        )
+        self._ring = ([point for point, _ in points], [endpoint for _, endpoint in points])
+
+    def nodes_for(self, fingerprint, count=2):
+        """Up to count distinct healthy nodes for a fingerprint, primary first"""
+        points, owners = self._ring
+        if not points:
+            return []
+        start = bisect.bisect(points, int(fingerprint[:16], 16))
+        nodes = []
+        for i in range(len(points)):
+            owner = owners[(start + i) % len(points)]
+            if owner not in nodes:
+                nodes.append(owner)
+                if len(nodes) == count:
+                    break
+        return nodes
+
+    def classify(self, text):
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts):
+        """
+        One classification per text, in order
+        Texts are grouped by their node order on the ring and the groups are sent concurrently;
+        raises ShardUnavailableError when a group could not be classified anywhere
+        """
+        groups = {}
+        for i, text in enumerate(texts):
+            nodes = self.nodes_for(content_fingerprint(text), count=len(self.endpoints))
+            if not nodes:
+                raise ShardUnavailableError("No healthy classifier nodes")
+            groups.setdefault(tuple(nodes), []).append(i)
+
+        results = [None] * len(texts)
+        futures = {
+            self._groups.submit(self._hedged, list(nodes), [texts[i] for i in indices]): indices
+            for nodes, indices in groups.items()
+        }
+        for future, indices in futures.items():
+            for i, classification in zip(indices, future.result()):
+                results[i] = classification
+        return results
+
+    def _current_hedge_delay(self):
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        with self._lock:
+            if len(self._latencies) < 20:
+                return 0.1
+            return max(float(np.percentile(self._latencies, 95)), 0.01)
+
+    def _hedged(self, nodes, texts):
+        """Send to the primary, hedge to the next node when it is slow, fail over on errors"""
+        with self._lock:
+            self.stats["requests"] += 1
+        remaining = list(nodes)
+        pending = {self._requests.submit(self._post, remaining.pop(0), texts): "primary"}
+        deadline = time.monotonic() + self.timeout
+        hedged = False
+        last_error = None
+
+        while pending:
+            timeout = self._current_hedge_delay() if not hedged and remaining else deadline - time.monotonic()
+            done, _ = wait(pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+            if not done:
+                if hedged or not remaining or time.monotonic() >= deadline:
+                    break
+                hedged = True
+                with self._lock:
+                    self.stats["hedges"] += 1
+                pending[self._requests.submit(self._post, remaining.pop(0), texts)] = "hedge"
+                continue
+
+            for future in done:
+                attempt = pending.pop(future)
+                try:
+                    classifications = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if attempt == "hedge":
+                    with self._lock:
+                        self.stats["hedge_wins"] += 1
+                return classifications
+
+            if not pending and remaining:
+                with self._lock:
+                    self.stats["failovers"] += 1
+                pending[self._requests.submit(self._post, remaining.pop(0), texts)] = "failover"
+
+        raise ShardUnavailableError(f"No classifier node answered: {last_error or 'timed out'}")
+
+    def _post(self, endpoint, texts):
+        message = Message("shard_router", "classifier_agent", "classify_text", {'texts': texts})
+        started = time.monotonic()
+        try:
+            response = self._session.post(f"{endpoint}/classify", json=message.to_dict(), timeout=self.timeout)
+            response.raise_for_status()
+            classifications = response.json()['classifications']
+        except Exception:
+            self._record(endpoint, len(texts), None)
+            raise
+        self._record(endpoint, len(texts), time.monotonic() - started)
+        return classifications
+
+    def _record(self, endpoint, texts, latency):
+        with self._lock:
+            stats = self.node_stats[endpoint]
+            stats["requests"] += 1
+            stats["texts"] += texts
+            if latency is None:
+                stats["failures"] += 1
+                self._failures[endpoint] += 1
+                if self._failures[endpoint] >= self.failure_threshold:
+                    self._set_health(endpoint, False)
+                return
+            self._failures[endpoint] = 0
+            stats["latencies"].append(latency)
+            self._latencies.append(latency)
+
+    def _set_health(self, endpoint, healthy):
+        """Caller holds self._lock"""
+        if (endpoint in self._healthy) == healthy:
+            return
+        if healthy:
+            self._healthy.add(endpoint)
+            self._failures[endpoint] = 0
+            print(f"✅ Classifier node {endpoint} is back; ring rebalanced")
+        else:
+            self._healthy.discard(endpoint)
+            print(f"⚠️  Classifier node {endpoint} is down; ring rebalanced")
+        self.stats["rebalances"] += 1
+        self._rebuild_ring()
+
+    def check_health(self):
+        """Probe every node's /health once and rebalance the ring on changes"""
+        for endpoint in self.endpoints:
+            try:
+                healthy = self._session.get(f"{endpoint}/health", timeout=min(self.timeout, 2.0)).status_code == 200
+            except requests.RequestException:
+                healthy = False
+            with self._lock:
+                if healthy:
+                    self._set_health(endpoint, True)
+                else:
+                    self._failures[endpoint] += 1
+                    if self._failures[endpoint] >= self.failure_threshold:
+                        self._set_health(endpoint, False)
+
+    def start(self):
+        """Start background health checks"""
+        if self._running:
+            return
+        self._running = True
+
+        def health_loop():
+            while self._running:
+                self.check_health()
+                time.sleep(self.health_interval)
+
+        self._thread = threading.Thread(target=health_loop, name="shard-health")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._requests.shutdown(wait=False)
+        self._groups.shutdown(wait=False)
+
+    def get_stats(self):
+        with self._lock:
+            nodes = {}
+            for endpoint, stats in self.node_stats.items():
+                latencies = list(stats["latencies"])
+                nodes[endpoint] = {
+                    "healthy": endpoint in self._healthy,
+                    "requests": stats["requests"],
+                    "failures": stats["failures"],
+                    "texts": stats["texts"],
+                    "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1) if latencies else None,
+                    "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1) if latencies else None
+                }
+            return {
+                **self.stats,
+                "healthy_nodes": len(self._healthy),
+                "total_nodes": len(self.endpoints),
+                "hedge_delay_ms": None if self.hedge_delay is None else round(self.hedge_delay * 1000),
+                "nodes": nodes
+            }
+
+
+class ShardedClassifier:
+    """
+    ClassifierAgent interface backed by a ShardRouter
+    Falls back to the local classifier when no node answers, and uses it
+    directly for rules-only (degraded) classification
+    """
+    def __init__(self, router, local_classifier):
+        self.router = router
+        self.local = local_classifier
+        self.categories = local_classifier.categories
+        self.batch_size = local_classifier.batch_size
+
+    def classify(self, text, rules_only=False):
+        return self.classify_batch([text], rules_only=rules_only)[0]
+
+    def classify_batch(self, texts, batch_size=None, rules_only=False):
+        if rules_only:
+            return self.local.classify_batch(texts, batch_size=batch_size, rules_only=True)
+        try:
+            return self.router.classify_batch(texts)
+        except ShardUnavailableError as e:
+            print(f"❌ Sharded classification failed, classifying locally: {e}")
+            return self.local.classify_batch(texts, batch_size=batch_size)
+
+
+# Test the router against local stand-in nodes: python -m agents.shard_router
+if __name__ == "__main__":
+    import subprocess
+    import sys
+
+    ports = [5101, 5102, 5103]
+    nodes = [
+        subprocess.Popen([sys.executable, "classifier_node.py", "--mode", "rules", "--port", str(port),
+                          "--delay-ms", "200" if port == 5103 else "5"],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for port in ports
+    ]
+    router = ShardRouter([f"http://127.0.0.1:{port}" for port in ports], health_interval=1.0)
+    try:
+        for _ in range(120):  # Nodes take a few seconds to import torch
+            time.sleep(0.5)
+            try:
+                if all(requests.get(f"{endpoint}/health", timeout=1).ok for endpoint in router.endpoints):
+                    break
+            except requests.RequestException:
+                pass
+        texts = [f"test message number {i} you idiot" for i in range(300)]
+        started = time.time()
+        for i in range(0, len(texts), 10):
+            router.classify_batch(texts[i:i + 10])
+        print(f"Classified {len(texts)} texts in {time.time() - started:.2f}s")
+
+        nodes[0].terminate()
+        nodes[0].wait()
+        router.classify_batch(texts[:50])
+        print("Stats:", router.get_stats())
+    finally:
+        for node in nodes:
+            node.terminate()
+        router.stop()
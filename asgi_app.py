@@ -0,0 +1,206 @@
+# ASGI serving mode: uvicorn asgi_app:app (or python asgi_app.py)
+#
+# /moderate and /moderate/stream are served natively on the event loop: concurrent
+# requests are coalesced by a MicroBatcher into pipeline batches on a dedicated
+# inference executor, persistence and retrieval run on an I/O executor and are
+# awaited, and each request has a timeout and is cancelled when its client goes
+# away. Every other route is the Flask app from main.py, mounted through a2wsgi.
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.requests import ClientDisconnect, Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import main
+from utils.admission_control import AdmissionRejectedError
+from utils.micro_batcher import MicroBatcher, BatchQueueFullError
+from utils.persistence_queue import PersistenceBackpressureError
+
+REQUEST_TIMEOUT = float(os.getenv('ASGI_REQUEST_TIMEOUT', '30'))
+
+# Inference threads are few (each batch already uses all torch threads); I/O threads are many
+inference_executor = ThreadPoolExecutor(
+    int(os.getenv('ASGI_INFERENCE_THREADS', '1')), thread_name_prefix="asgi-inference"
+)
+io_executor = ThreadPoolExecutor(int(os.getenv('ASGI_IO_THREADS', '16')), thread_name_prefix="asgi-io")
+
+
+def run_batch(key, items):
+    """One pipeline batch for items sharing a (priority, tenant) key; persisted by the callers"""
+    priority, tenant = key
+    return main.pipeline.moderate_batch(items, persist=False, priority=priority, tenant=tenant)
+
+
+batcher = MicroBatcher(
+    run_batch, inference_executor,
+    concurrency=inference_executor._max_workers,
+    max_batch=int(os.getenv('ASGI_MAX_BATCH', '32')),
+    max_wait=float(os.getenv('ASGI_MAX_WAIT_MS', '5')) / 1000,
+    max_queue=int(os.getenv('ASGI_MAX_QUEUE', '10000'))
+)
+request_stats = {"requests": 0, "timeouts": 0, "disconnects": 0, "errors": 0}
+
+
+async def _in_io(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(io_executor, func, *args)
+
+
+async def _disconnected(request):
+    """Returns once the client has gone away (the body must already have been read)"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def _moderate(content, user_id, priority, tenant):
+    result = await batcher.submit({'content': content, 'user_id': user_id}, key=(priority, tenant))
+    if 'error' in result:
+        raise RuntimeError(result['error'])
+    await _in_io(main.pipeline.persist, content, user_id, result)
+    similar_cases = await _in_io(main.retriever.search_similar_content, result['classification'])
+    result['similar_cases'] = similar_cases[:3]
+    return result
+
+
+async def moderate_content(request):
+    request_stats["requests"] += 1
+    try:
+        data = await request.json()
+        content = data['content']
+    except (ValueError, KeyError, TypeError):
+        return JSONResponse({'error': "Body must be JSON with a 'content' field"}, status_code=400)
+    user_id = data.get('user_id', 'anonymous')
+    priority = request.headers.get('X-Priority', data.get('priority', 'normal'))
+    tenant = request.headers.get('X-Tenant', data.get('tenant'))
+
+    work = asyncio.ensure_future(_moderate(content, user_id, priority, tenant))
+    disconnect = asyncio.ensure_future(_disconnected(request))
+    done, _ = await asyncio.wait({work, disconnect}, timeout=REQUEST_TIMEOUT,
+                                 return_when=asyncio.FIRST_COMPLETED)
+    disconnect.cancel()
+    if work not in done:
+        work.cancel()
+        if disconnect in done:
+            request_stats["disconnects"] += 1
+            return Response(status_code=499)
+        request_stats["timeouts"] += 1
+        return JSONResponse({'error': f"Moderation timed out after {REQUEST_TIMEOUT}s"}, status_code=504)
+
+    try:
+        return JSONResponse(work.result())
+    except AdmissionRejectedError as e:
+        return JSONResponse({'error': str(e)}, status_code=429, headers={'Retry-After': str(e.retry_after)})
+    except (BatchQueueFullError, PersistenceBackpressureError) as e:
+        return JSONResponse({'error': str(e)}, status_code=503)
+    except Exception as e:
+        request_stats["errors"] += 1
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+class ModerateStream:
+    """
+    Same NDJSON protocol as the Flask route; each chunk of lines is one pipeline batch
+    A raw ASGI endpoint because results are sent while the body is still being read,
+    and StreamingResponse would compete with the body for receive() messages
+    """
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        try:
+            # Also the chunk handed to the inference thread, so it is capped like the Flask route
+            max_in_flight = main.stream_max_in_flight(
+                int(request.query_params.get('max_in_flight', main.STREAM_MAX_IN_FLIGHT))
+            )
+        except ValueError:
+            max_in_flight = main.STREAM_MAX_IN_FLIGHT
+        persist = request.query_params.get('persist', 'true').lower() != 'false'
+        priority = request.query_params.get('priority', 'low')
+        tenant = request.headers.get('X-Tenant', request.query_params.get('tenant'))
+        loop = asyncio.get_running_loop()
+
+        def moderate_chunk(lines, first_line):
+            return "".join(main.pipeline.moderate_stream(
+                lines, max_in_flight=len(lines), persist=persist, priority=priority,
+                tenant=tenant, first_line=first_line
+            )).encode()
+
+        async def flush(chunk, first_line):
+            try:
+                body = await loop.run_in_executor(inference_executor, moderate_chunk, chunk, first_line)
+            except Exception as e:
+                # The 200 is already sent, so a failure is reported per line and the stream goes on
+                request_stats["errors"] += 1
+                body = "".join(
+                    json.dumps({'line': line_no, 'error': str(e)}) + "\n"
+                    for line_no, line in enumerate(chunk, first_line) if line.strip()
+                ).encode()
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'application/x-ndjson')]})
+        buffered = b""
+        chunk = []
+        next_line = 1
+        try:
+            async for data in request.stream():
+                buffered += data
+                *lines, buffered = buffered.split(b"\n")
+                for line in lines:
+                    chunk.append(line)
+                    if len(chunk) == max_in_flight:
+                        await flush(chunk, next_line)
+                        next_line += len(chunk)
+                        chunk = []
+            if buffered:
+                chunk.append(buffered)
+            if chunk:
+                await flush(chunk, next_line)
+        except (ClientDisconnect, OSError):
+            request_stats["disconnects"] += 1  # Stop moderating lines nobody will read
+            return
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+async def stream_stats(request):
+    return StreamingResponse(
+        main.stats_stream.async_events(), media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def get_asgi_stats(request):
+    return JSONResponse({**request_stats, 'batcher': batcher.get_stats(), 'timeout_seconds': REQUEST_TIMEOUT})
+
+
+@asynccontextmanager
+async def lifespan(app):
+    batcher.start()
+    yield
+    await batcher.stop()
+    inference_executor.shutdown(wait=False)
+    io_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/moderate', moderate_content, methods=['POST']),
+        Route('/moderate/stream', ModerateStream(), methods=['POST']),
+        Route('/api/stats/stream', stream_stats),
+        Route('/api/asgi-stats', get_asgi_stats),
+        Mount('/', app=WSGIMiddleware(main.app))
+    ],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    host, _, port = os.getenv('WEB_BIND', '127.0.0.1:5000').rpartition(':')
+    uvicorn.run(app, host=host or '127.0.0.1', port=int(port))
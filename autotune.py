@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+CPU inference autotuner
+
+Sweeps worker processes, torch intra-op / inter-op threads, classifier batch
+size and length buckets against a sample of a representative corpus on this
+machine. The configuration with the best throughput whose p95 batch latency
+meets the SLO is written to the inference profile that ClassifierAgent loads
+at startup (and gunicorn.conf.py reads the worker count from).
+
+    python autotune.py posts.jsonl --slo-ms 1500 --output inference_profile.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bulk_moderate import detect_format, read_chunks
+
+# Length bucket presets (characters); None keeps input order
+BUCKET_PRESETS = {
+    'none': None,
+    'two': [128],
+    'three': [64, 256],
+    'five': [32, 64, 128, 256]
+}
+
+_classifier = None
+
+
+def _init_worker(intra_op_threads, inter_op_threads):
+    global _classifier
+    sys.stdout = open(os.devnull, 'w')
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+
+    import torch
+    torch.set_num_threads(intra_op_threads)
+    torch.set_num_interop_threads(inter_op_threads)
+
+    from agents.classifier_agent import ClassifierAgent
+    # Measure the model itself: no existing profile, no fast path
+    _classifier = ClassifierAgent(profile_path="")
+
+
+def run_trial(texts, batch_size, length_buckets, repeats):
+    """Classify texts in one worker; returns per-batch latencies in seconds"""
+    _classifier.batch_size = batch_size
+    _classifier.length_buckets = length_buckets
+    _classifier._run_model(texts[:batch_size], batch_size)  # Warm up this batch shape
+
+    latencies = []
+    for _ in range(repeats):
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            began = time.perf_counter()
+            _classifier._run_model_bucketed(batch, batch_size)
+            latencies.append(time.perf_counter() - began)
+    return latencies
+
+
+def load_sample(path, content_column, sample_size, seed):
+    """Random sample of non-empty texts from a CSV / JSONL / Parquet corpus"""
+    texts = []
+    for frame in read_chunks(path, detect_format(path), 10000):
+        texts.extend(t for t in frame[content_column].tolist() if isinstance(t, str) and t.strip())
+    if not texts:
+        raise SystemExit(f"No '{content_column}' texts found in {path}")
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(len(texts), size=min(sample_size, len(texts)), replace=False)
+    return [texts[i] for i in chosen]
+
+
+def thread_layouts(args, cpu_count):
+    """(workers, intra-op threads, inter-op threads) combinations that fit the machine"""
+    layouts = []
+    for workers in args.workers:
+        for intra in args.threads:
+            if workers * intra > cpu_count:
+                continue
+            for inter in args.interop_threads:
+                layouts.append((workers, intra, inter))
+    return layouts
+
+
+def sweep(args):
+    cpu_count = os.cpu_count() or 1
+    texts = load_sample(args.corpus, args.content_column, args.sample, args.seed)
+    print(f"Sample: {len(texts)} texts, median length {int(np.median([len(t) for t in texts]))} chars, "
+          f"{cpu_count} CPUs")
+
+    results = []
+    for workers, intra, inter in thread_layouts(args, cpu_count):
+        print(f"\nWorkers {workers} x {intra} intra-op / {inter} inter-op threads (loading models...)")
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(intra, inter)) as pool:
+            shards = [texts[i::workers] for i in range(workers)]
+            for batch_size in args.batch_sizes:
+                for bucket_name in args.buckets:
+                    buckets = BUCKET_PRESETS[bucket_name]
+                    began = time.perf_counter()
+                    futures = [
+                        pool.submit(run_trial, shard, batch_size, buckets, args.repeats)
+                        for shard in shards
+                    ]
+                    latencies = [latency for future in futures for latency in future.result()]
+                    elapsed = time.perf_counter() - began
+
+                    result = {
+                        'workers': workers,
+                        'intra_op_threads': intra,
+                        'inter_op_threads': inter,
+                        'batch_size': batch_size,
+                        'length_buckets': buckets,
+                        'throughput': len(texts) * args.repeats / elapsed,
+                        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+                        'p95_ms': float(np.percentile(latencies, 95) * 1000)
+                    }
+                    results.append(result)
+                    within = "" if result['p95_ms'] <= args.slo_ms else "  (over SLO)"
+                    print(f"  batch {batch_size:>3}  buckets {bucket_name:<5}  "
+                          f"{result['throughput']:7.2f} texts/s  p95 {result['p95_ms']:8.1f} ms{within}")
+    return results
+
+
+def choose_profile(results, slo_ms):
+    """Best throughput within the latency SLO, or the lowest-latency setting if none meets it"""
+    within = [r for r in results if r['p95_ms'] <= slo_ms]
+    if within:
+        return max(within, key=lambda r: r['throughput']), True
+    return min(results, key=lambda r: r['p95_ms']), False
+
+
+def parse_int_list(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def parse_args(argv=None):
+    cpu_count = os.cpu_count() or 1
+    default_threads = sorted({1, 2, 4, max(1, cpu_count // 2), cpu_count} & set(range(1, cpu_count + 1)))
+    parser = argparse.ArgumentParser(description="Tune CPU inference settings for ClassifierAgent")
+    parser.add_argument('corpus', help="CSV, JSONL or Parquet file of representative content")
+    parser.add_argument('--content-column', default='content')
+    parser.add_argument('--sample', type=int, default=256, help="Texts per trial")
+    parser.add_argument('--repeats', type=int, default=1, help="Passes over the sample per trial")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=parse_int_list, default=[1, 2, max(1, cpu_count // 2)],
+                        help="Comma-separated worker process counts")
+    parser.add_argument('--threads', type=parse_int_list, default=default_threads,
+                        help="Comma-separated intra-op thread counts")
+    parser.add_argument('--interop-threads', type=parse_int_list, default=[1],
+                        help="Comma-separated inter-op thread counts")
+    parser.add_argument('--batch-sizes', type=parse_int_list, default=[1, 4, 8, 16, 32])
+    parser.add_argument('--buckets', type=lambda v: v.split(','), default=list(BUCKET_PRESETS),
+                        help=f"Comma-separated length bucket presets: {', '.join(BUCKET_PRESETS)}")
+    parser.add_argument('--slo-ms', type=float, default=1000.0, help="p95 latency budget per batch")
+    parser.add_argument('--output', default=os.getenv('INFERENCE_PROFILE', 'inference_profile.json'))
+    args = parser.parse_args(argv)
+    args.workers = sorted(set(args.workers))
+    unknown = [name for name in args.buckets if name not in BUCKET_PRESETS]
+    if unknown:
+        parser.error(f"Unknown bucket presets: {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = sweep(args)
+    if not results:
+        raise SystemExit("No worker/thread combination fits this machine; adjust --workers/--threads")
+
+    best, meets_slo = choose_profile(results, args.slo_ms)
+    profile = {
+        **best,
+        'slo_ms': args.slo_ms,
+        'meets_slo': meets_slo,
+        'cpu_count': os.cpu_count(),
+        'sample_size': args.sample,
+        'tuned_at': datetime.now().isoformat()
+    }
+    tmp_path = args.output + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, args.output)
+
+    if not meets_slo:
+        print(f"\n⚠️  No configuration met the {args.slo_ms:.0f} ms SLO; using the lowest-latency one")
+    print(f"\n✅ Wrote {args.output}: {best['workers']} workers x {best['intra_op_threads']} threads, "
+          f"batch {best['batch_size']}, buckets {best['length_buckets']} "
+          f"({best['throughput']:.2f} texts/s, p95 {best['p95_ms']:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
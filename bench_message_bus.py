@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+MessageBus transport benchmark
+
+Compares the in-process queue, the Unix socket transport (agents in two
+processes) and HTTPCommunicator (Flask in a second process) on:
+
+- hop latency: ping-pong between two agents, round trip / 2, p50 / p99
+- throughput: one-way messages per second to an agent that acknowledges the last one
+
+    python bench_message_bus.py --messages 20000 --pings 2000 --payload-bytes 256
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agents.communication_protocols import HTTPCommunicator, Message, MessageBus, UnixSocketTransport
+
+
+def serve(bus):
+    """Echo pings back to the sender and acknowledge the last message of a throughput run"""
+    def echo_handler(message):
+        bus.send_message(Message("echo", message.sender, "pong", message.data))
+
+    def sink_handler(message):
+        if message.data.get('last'):
+            bus.send_message(Message("sink", message.sender, "done", {}))
+
+    bus.register_agent("echo", echo_handler)
+    bus.register_agent("sink", sink_handler)
+    bus.start_processing()
+
+
+def run_http_server(port):
+    from flask import Flask, request, jsonify
+    app = Flask(__name__)
+
+    @app.route('/agents/<agent_id>', methods=['POST'])
+    def receive(agent_id):
+        Message.from_dict(request.json)
+        return jsonify({'status': 'success'})
+
+    @app.route('/health')
+    def health():
+        return jsonify({'status': 'ok'})
+
+    import logging
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app.run(port=port, threaded=True)
+
+
+class Client:
+    """The benchmarking agent: counts pongs and acknowledgements from the other side"""
+    def __init__(self, bus):
+        self.bus = bus
+        self.pong = threading.Event()
+        self.done = threading.Event()
+
+        def handler(message):
+            if message.message_type == "pong":
+                self.pong.set()
+            elif message.message_type == "done":
+                self.done.set()
+
+        bus.register_agent("bench", handler)
+        bus.start_processing()
+
+    def ping_pong(self, pings, payload):
+        hops = []
+        for _ in range(pings):
+            self.pong.clear()
+            started = time.perf_counter()
+            self.bus.send_message(Message("bench", "echo", "ping", {'payload': payload}))
+            if not self.pong.wait(5):
+                raise RuntimeError("No pong within 5s")
+            hops.append((time.perf_counter() - started) / 2)
+        return hops
+
+    def throughput(self, messages, payload):
+        self.done.clear()
+        started = time.perf_counter()
+        for i in range(messages):
+            self.bus.send_message(Message("bench", "sink", "count",
+                                          {'payload': payload, 'last': i == messages - 1}))
+        if not self.done.wait(60):
+            raise RuntimeError("Throughput run was not acknowledged within 60s")
+        return messages / (time.perf_counter() - started)
+
+
+def bench_http(args, payload):
+    port = args.http_port
+    server = subprocess.Popen([sys.executable, __file__, '--serve', 'http', '--http-port', str(port)],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                requests.get(f"http://127.0.0.1:{port}/health", timeout=1)
+                break
+            except requests.RequestException:
+                time.sleep(0.2)
+        communicator = HTTPCommunicator('127.0.0.1', port)
+        communicator.register_endpoint("echo", "agents/echo")
+
+        hops = []
+        for _ in range(args.pings):
+            started = time.perf_counter()
+            if not communicator.send_http_message(Message("bench", "echo", "ping", {'payload': payload})):
+                raise RuntimeError("HTTP send failed")
+            hops.append((time.perf_counter() - started) / 2)
+
+        messages = max(args.messages // 20, 100)  # Each message is a blocking request
+        started = time.perf_counter()
+        for _ in range(messages):
+            communicator.send_http_message(Message("bench", "echo", "count", {'payload': payload}))
+        return hops, messages / (time.perf_counter() - started)
+    finally:
+        server.terminate()
+
+
+def report(name, hops, rate):
+    hops_us = np.asarray(hops) * 1e6
+    print(f"{name:<12} {np.percentile(hops_us, 50):>10.1f} {np.percentile(hops_us, 99):>10.1f} {rate:>14,.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark MessageBus transports")
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--pings', type=int, default=2000)
+    parser.add_argument('--payload-bytes', type=int, default=256)
+    parser.add_argument('--http-port', type=int, default=5199)
+    parser.add_argument('--serve', choices=['unix', 'http'], help=argparse.SUPPRESS)
+    parser.add_argument('--socket-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve == 'unix':
+        serve(MessageBus(UnixSocketTransport(args.socket_dir)))
+        threading.Event().wait()
+    if args.serve == 'http':
+        run_http_server(args.http_port)
+        return
+
+    payload = "x" * args.payload_bytes
+    print(f"{'transport':<12} {'p50 hop µs':>10} {'p99 hop µs':>10} {'messages/s':>14}")
+
+    bus = MessageBus()
+    serve(bus)
+    client = Client(bus)
+    report("in-process", client.ping_pong(args.pings, payload), client.throughput(args.messages, payload))
+    bus.stop_processing()
+
+    socket_dir = tempfile.mkdtemp()
+    server = subprocess.Popen([sys.executable, __file__, '--serve', 'unix', '--socket-dir', socket_dir])
+    transport = UnixSocketTransport(socket_dir)
+    try:
+        while not all(os.path.exists(os.path.join(socket_dir, f"{a}.sock")) for a in ("echo", "sink")):
+            time.sleep(0.05)
+        client = Client(MessageBus(transport))
+        report("unix socket", client.ping_pong(args.pings, payload), client.throughput(args.messages, payload))
+    finally:
+        server.terminate()
+        transport.close()
+
+    report("http", *bench_http(args, payload))
+
+
+if __name__ == "__main__":
+    main()
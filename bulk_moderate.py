@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Offline bulk moderation
+
+Reads CSV / JSONL / Parquet input in chunks, runs ClassifierAgent, RiskAgent and
+ActionAgent across a process pool and writes one Parquet part file per chunk.
+Completed chunks are recorded in a checkpoint so an interrupted job resumes
+where it stopped.
+
+    python bulk_moderate.py posts.jsonl --output-dir out/ --workers 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.fingerprint import content_fingerprint
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+# Per-process agents, created once by the pool initializer
+_classifier = None
+_risk_assessor = None
+_action_decider = None
+
+
+def _init_worker(torch_threads, quiet):
+    global _classifier, _risk_assessor, _action_decider
+    if quiet:
+        # The agents print per-item debug output; keep the progress line readable
+        sys.stdout = open(os.devnull, 'w')
+
+    from agents.classifier_agent import ClassifierAgent
+    from agents.risk_agent import RiskAgent
+    from agents.action_agent import ActionAgent
+    _classifier = ClassifierAgent(num_threads=torch_threads)
+    _risk_assessor = RiskAgent()
+    _action_decider = ActionAgent()
+
+
+def moderate_chunk(chunk_index, records, batch_size, keep_content):
+    """Moderate one chunk of {'id', 'content', 'user_id'} records inside a worker"""
+    valid = [r for r in records if isinstance(r['content'], str)]
+    classifications = _classifier.classify_batch(
+        [r['content'] for r in valid], batch_size=batch_size
+    )
+    classified = iter(classifications)
+
+    rows = []
+    for record in records:
+        content = record['content']
+        row = {
+            'id': record['id'],
+            'user_id': record['user_id'],
+            'content_hash': None,
+            'classification': None,
+            'risk_score': None,
+            'risk_level': None,
+            'actions': None,
+            'error': None
+        }
+        if keep_content:
+            row['content'] = content
+
+        if not isinstance(content, str):
+            row['error'] = "missing content"
+            rows.append(row)
+            continue
+
+        try:
+            classification = next(classified)
+            risk_assessment = _risk_assessor.evaluate_risk(classification, content, record['user_id'])
+            actions = _action_decider.determine_action(risk_assessment, classification, content)
+            row.update({
+                'content_hash': content_fingerprint(content),
+                'classification': json.dumps(classification),
+                'risk_score': risk_assessment['score'],
+                'risk_level': risk_assessment['level'],
+                'actions': json.dumps(actions['actions'])
+            })
+            # One float column per category keeps scores queryable without JSON parsing
+            for category, score in classification.items():
+                row[f"score_{category}"] = score
+        except Exception as e:
+            row['error'] = str(e)
+        rows.append(row)
+
+    return chunk_index, rows
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if extension in ('.parquet', '.pq'):
+        return 'parquet'
+    return 'csv'
+
+
+def read_chunks(path, input_format, chunk_size):
+    """Yield DataFrames of at most chunk_size rows"""
+    if input_format == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif input_format == 'jsonl':
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size)
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def count_rows(path, input_format):
+    """Row count for ETA reporting (line count for text formats)"""
+    if input_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+
+    lines = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            lines += block.count(b'\n')
+    return lines - 1 if input_format == 'csv' else lines
+
+
+def to_records(frame, start_row, args):
+    """Convert an input chunk to plain records that pickle cheaply"""
+    records = []
+    for offset, row in enumerate(frame.to_dict('records')):
+        content = row.get(args.content_column)
+        user_id = row.get(args.user_column)
+        records.append({
+            'id': row.get(args.id_column, start_row + offset),
+            'content': content if isinstance(content, str) else None,
+            'user_id': normalize_user_id(user_id)
+        })
+    return records
+
+
+def normalize_user_id(value):
+    """
+    User ID as a string; numeric IDs keep their value (a column with gaps is read
+    as float, so 12345.0 becomes '12345') and only missing values are 'anonymous'
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return 'anonymous'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def load_checkpoint(path, args):
+    if not os.path.exists(path):
+        return {'completed': [], 'rows_done': 0}
+
+    with open(path, 'r') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('input') != os.path.abspath(args.input) or checkpoint.get('chunk_size') != args.chunk_size:
+        raise SystemExit(
+            f"Checkpoint in {args.output_dir} belongs to a different input or chunk size; "
+            "use a new --output-dir or pass --restart"
+        )
+    return checkpoint
+
+
+def save_checkpoint(path, args, completed, rows_done):
+    """Write the checkpoint atomically so a crash never leaves it half-written"""
+    checkpoint = {
+        'input': os.path.abspath(args.input),
+        'chunk_size': args.chunk_size,
+        'completed': sorted(completed),
+        'rows_done': rows_done,
+        'updated': datetime.now().isoformat()
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def report_progress(rows_done, rows_this_run, total_rows, started):
+    elapsed = max(time.time() - started, 1e-9)
+    throughput = rows_this_run / elapsed
+    line = f"\r{rows_done:,} rows  {throughput:,.1f} rows/s"
+    if total_rows:
+        remaining = max(total_rows - rows_done, 0)
+        eta = remaining / throughput if throughput > 0 else float('inf')
+        line += f"  {rows_done / total_rows:.1%}  ETA {_format_duration(eta)}"
+    sys.stderr.write(line + "   ")
+    sys.stderr.flush()
+
+
+def _format_duration(seconds):
+    if seconds == float('inf'):
+        return "--:--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def run(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    checkpoint_path = os.path.join(args.output_dir, CHECKPOINT_FILE)
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    checkpoint = load_checkpoint(checkpoint_path, args)
+    completed = set(checkpoint['completed'])
+    rows_done = checkpoint['rows_done']
+    if completed:
+        print(f"Resuming: {len(completed)} chunks ({rows_done:,} rows) already done")
+
+    input_format = args.format or detect_format(args.input)
+    total_rows = count_rows(args.input, input_format)
+    torch_threads = max(1, (os.cpu_count() or 1) // args.workers)
+
+    started = time.time()
+    rows_this_run = 0
+    max_in_flight = args.workers * 2
+    in_flight = {}
+
+    def collect(done):
+        nonlocal rows_done, rows_this_run
+        for future in done:
+            chunk_index, rows = future.result()
+            part_path = os.path.join(args.output_dir, f"part-{chunk_index:06d}.parquet")
+            pd.DataFrame(rows).to_parquet(part_path, index=False)
+            completed.add(chunk_index)
+            rows_done += len(rows)
+            rows_this_run += len(rows)
+            del in_flight[future]
+        save_checkpoint(checkpoint_path, args, completed, rows_done)
+        report_progress(rows_done, rows_this_run, total_rows, started)
+
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(torch_threads, not args.verbose)
+    ) as pool:
+        start_row = 0
+        for chunk_index, frame in enumerate(read_chunks(args.input, input_format, args.chunk_size)):
+            chunk_start, start_row = start_row, start_row + len(frame)
+            if chunk_index in completed:
+                continue
+
+            # Keep a bounded number of chunks in flight so memory stays flat
+            while len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+
+            future = pool.submit(
+                moderate_chunk, chunk_index, to_records(frame, chunk_start, args),
+                args.batch_size, args.keep_content
+            )
+            in_flight[future] = chunk_index
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+
+    elapsed = time.time() - started
+    print(f"\nDone: {rows_done:,} rows in {args.output_dir} "
+          f"({rows_this_run:,} this run, {_format_duration(elapsed)})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline bulk content moderation")
+    parser.add_argument('input', help="CSV, JSONL or Parquet file")
+    parser.add_argument('--output-dir', required=True, help="Directory for Parquet parts and the checkpoint")
+    parser.add_argument('--format', choices=['csv', 'jsonl', 'parquet'], help="Input format (default: from extension)")
+    parser.add_argument('--content-column', default='content')
+    parser.add_argument('--user-column', default='user_id')
+    parser.add_argument('--id-column', default='id')
+    parser.add_argument('--chunk-size', type=int, default=1000, help="Rows per chunk / output part")
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help="Classifier batch size (default: from the inference profile, else 8)")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Worker processes (each loads its own model)")
+    parser.add_argument('--keep-content', action='store_true', help="Copy the original content into the output")
+    parser.add_argument('--restart', action='store_true', help="Ignore any existing checkpoint")
+    parser.add_argument('--verbose', action='store_true', help="Show agent output from the workers")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Calibrate the prototype classifier's per-category thresholds from labelled data
+
+Labelled examples are dataset rows that kept their text (DATASET_STORE_CONTENT=true).
+A row's categories are the ones its stored decision scored at or above
+--label-threshold. Feedback overrides that: a decision marked inaccurate takes
+its expected classification instead, or is left out when none was given. The
+fitted thresholds are written next to the cached prototypes, where prototype
+mode (CLASSIFIER_MODE=prototype) loads them at startup.
+
+    python calibrate_prototypes.py --dataset moderation_dataset.csv --feedback feedback.db
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bulk_moderate import read_chunks
+
+
+def load_verdicts(path):
+    """content_hash -> (accurate, expected classification or None), latest feedback wins"""
+    verdicts = {}
+    if not path or not os.path.exists(path):
+        return verdicts
+    if path.endswith('.db'):
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            rows = conn.execute("SELECT content_hash, accurate, expected_classification FROM feedback ORDER BY id")
+            for content_hash, accurate, expected in rows:
+                verdicts[content_hash] = (bool(accurate), json.loads(expected) if expected else None)
+        finally:
+            conn.close()
+    else:
+        for frame in read_chunks(path, 'csv', 100000):
+            expected_column = frame['expected_classification'] if 'expected_classification' in frame else [None] * len(frame)
+            for content_hash, accurate, expected in zip(frame['content_hash'], frame['accurate'], expected_column):
+                verdicts[content_hash] = (
+                    str(accurate).lower() in ('true', '1'),
+                    json.loads(expected) if isinstance(expected, str) and expected else None
+                )
+    return verdicts
+
+
+def label_categories(classification, label_threshold):
+    return [
+        category for category, score in classification.items()
+        if category != 'normal content' and isinstance(score, (int, float)) and score >= label_threshold
+    ]
+
+
+def load_examples(args, verdicts):
+    """(texts, labels) of the most recent --limit distinct dataset rows with text"""
+    examples = {}  # content_hash -> (text, labels), insertion order = write order
+    stats = {'rows': 0, 'corrected': 0, 'dropped': 0}
+    for frame in read_chunks(args.dataset, 'csv', args.chunk_size):
+        if 'content' not in frame.columns:
+            raise SystemExit(f"❌ {args.dataset} has no content column; "
+                             "enable DATASET_STORE_CONTENT=true to collect calibration data")
+        for row in frame[['content_hash', 'content', 'classification']].itertuples(index=False):
+            if not isinstance(row.content, str) or not row.content.strip():
+                continue
+            stats['rows'] += 1
+            accurate, expected = verdicts.get(row.content_hash, (True, None))
+            if not accurate:
+                if expected is None:
+                    stats['dropped'] += 1
+                    continue
+                classification = expected
+                stats['corrected'] += 1
+            else:
+                try:
+                    classification = json.loads(row.classification)
+                except (TypeError, ValueError):
+                    continue
+            examples.pop(row.content_hash, None)
+            examples[row.content_hash] = (row.content, label_categories(classification, args.label_threshold))
+
+    selected = list(examples.values())[-args.limit:] if args.limit else list(examples.values())
+    print(f"📊 {stats['rows']} rows with text, {len(examples)} distinct, {len(selected)} used "
+          f"({stats['corrected']} corrected by feedback, {stats['dropped']} dropped as wrong without a correction)")
+    return [text for text, _ in selected], [labels for _, labels in selected]
+
+
+def run(args):
+    verdicts = load_verdicts(args.feedback)
+    texts, labels = load_examples(args, verdicts)
+    if not texts:
+        raise SystemExit("❌ No labelled examples to calibrate on")
+
+    from agents.prototype_classifier import PrototypeClassifier
+    classifier = PrototypeClassifier(args.model, cache_dir=args.cache_dir)
+    start = time.time()
+    calibration = classifier.calibrate(texts, labels, scale=args.scale, min_positives=args.min_positives)
+    print(f"✅ Calibrated on {len(texts)} examples in {time.time() - start:.1f}s -> {classifier.calibration_path}")
+    for category in classifier.categories:
+        positives = sum(category in text_labels for text_labels in labels)
+        fitted = calibration.get(category)
+        if fitted is None:
+            print(f"   {category:<16} {positives:>6} positives  (too few, current threshold kept)")
+        else:
+            print(f"   {category:<16} {positives:>6} positives  threshold {fitted['threshold']:.3f}  F1 {fitted['f1']:.3f}")
+    return calibration
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fit prototype classifier thresholds on labelled dataset rows")
+    parser.add_argument('--dataset', default='moderation_dataset.csv')
+    parser.add_argument('--feedback', default=os.getenv('FEEDBACK_DB_PATH', 'feedback.db'),
+                        help="feedback.db (SQLite) or feedback_data.csv")
+    parser.add_argument('--model', default=os.getenv('PROTOTYPE_MODEL', 'sentence-transformers/all-MiniLM-L6-v2'))
+    parser.add_argument('--cache-dir', default='models/prototypes')
+    parser.add_argument('--label-threshold', type=float, default=0.5,
+                        help="Stored score at which a decision counts as labelling a category")
+    parser.add_argument('--min-positives', type=int, default=20,
+                        help="Categories with fewer positive examples keep their current threshold")
+    parser.add_argument('--scale', type=float, default=20.0)
+    parser.add_argument('--limit', type=int, default=20000, help="Use at most the most recent N examples")
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
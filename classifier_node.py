@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Classifier node for sharded inference
+
+Serves ClassifierAgent over HTTP for ShardRouter: POST /classify takes a
+Message whose data is {'texts': [...]} and returns {'classifications': [...]};
+GET /health answers while the node is up. Classifications are cached by content
+fingerprint, and the router sends the same text to the same node, so each
+node's cache stays hot for its share of the traffic.
+
+    python classifier_node.py --port 5101
+    python classifier_node.py --port 5102 --mode rules --delay-ms 50   # local stand-in
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Flask, request, jsonify
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agents.classifier_agent import ClassifierAgent
+from agents.communication_protocols import Message
+from utils.fingerprint import content_fingerprint
+
+
+class ClassificationCache:
+    """LRU cache of classifications keyed by content fingerprint"""
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, fingerprint):
+        with self._lock:
+            classification = self._entries.get(fingerprint)
+            if classification is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(fingerprint)
+            self.stats["hits"] += 1
+            return classification
+
+    def put(self, fingerprint, classification):
+        with self._lock:
+            self._entries[fingerprint] = classification
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0
+            }
+
+
+def create_app(classifier, cache, delay=0.0):
+    app = Flask(__name__)
+
+    @app.route('/classify', methods=['POST'])
+    def classify():
+        try:
+            message = Message.from_dict(request.json)
+            texts = message.data['texts']
+        except (KeyError, TypeError) as e:
+            return jsonify({'error': f"Invalid message: {e}"}), 400
+
+        if delay:
+            time.sleep(delay)  # Simulated inference latency for stand-in nodes
+        fingerprints = [content_fingerprint(text) for text in texts]
+        classifications = [cache.get(fingerprint) for fingerprint in fingerprints]
+        misses = [i for i, classification in enumerate(classifications) if classification is None]
+        if misses:
+            for i, classification in zip(misses, classifier.classify_batch([texts[i] for i in misses])):
+                classifications[i] = classification
+                cache.put(fingerprints[i], classification)
+        return jsonify({'classifications': classifications})
+
+    @app.route('/health')
+    def health():
+        return jsonify({'status': 'ok', 'model_loaded': classifier.model_loaded, 'cache': cache.get_stats()})
+
+    return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve ClassifierAgent as a shard node")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5101)
+    parser.add_argument('--mode', default=None, help="Classifier mode: zero-shot, prototype or rules")
+    parser.add_argument('--cache-size', type=int, default=100000)
+    parser.add_argument('--delay-ms', type=float, default=0.0, help="Added latency per request (stand-ins)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    app = create_app(ClassifierAgent(mode=args.mode), ClassificationCache(args.cache_size), args.delay_ms / 1000)
+    app.run(host=args.host, port=args.port, threaded=True)
@@ -0,0 +1,24 @@
+# Run with: gunicorn -c gunicorn.conf.py main:app
+# Audit log, dataset and feedback are shared between workers through file locks
+# and SQLite, so WEB_WORKERS can be raised to the number of cores the models fit in.
+import json
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# autotune.py records the best worker count for this machine in the inference profile
+_profile = {}
+if os.path.exists(os.getenv('INFERENCE_PROFILE', 'inference_profile.json')):
+    with open(os.getenv('INFERENCE_PROFILE', 'inference_profile.json'), 'r') as f:
+        _profile = json.load(f)
+
+bind = os.getenv('WEB_BIND', '127.0.0.1:5000')
+workers = int(os.getenv('WEB_WORKERS', _profile.get('workers', 2)))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '4'))
+# Model loading happens per worker after the fork; give it time
+timeout = int(os.getenv('WEB_TIMEOUT', '120'))
+graceful_timeout = 30
+# Not preloaded: each worker loads its own models and starts its own background threads
+preload_app = False
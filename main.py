@@ -1,24 +1,244 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 from agents.classifier_agent import ClassifierAgent
 from agents.risk_agent import RiskAgent
 from agents.action_agent import ActionAgent
 from agents.audit_agent import AuditAgent
 from agents.retrieval_agent import RetrievalAgent  # COMMENTED OUT
 from agents.communication_protocols import message_bus, Message
+from agents.moderation_pipeline import ModerationPipeline
+from agents.fast_path_classifier import FastPathClassifier
+from agents.shard_router import ShardRouter, ShardedClassifier
+from agents.model_registry import ModelRegistry, load_registry_config
 from utils.dataset_manager import DatasetManager
-from utils.feedback_system import FeedbackSystem
+from utils.feedback_system import FeedbackSystem, SQLiteFeedbackSystem, parse_accurate
+from utils.persistence_queue import PersistenceQueue, PersistenceBackpressureError
+from utils.admission_control import AdmissionController, AdmissionRejectedError
+from utils.near_duplicate import NearDuplicateIndex
+from utils.user_velocity import UserVelocityStore
+from utils.audit_segments import end_of_day
+from utils.encrypted_segments import EncryptedSegmentStore, Keyring
+from utils.fingerprint import FingerprintIndex, content_fingerprint
+from utils.state_snapshot import SnapshotStore
+from utils.profiling import Profiler
+from utils.trending_terms import TrendingTerms
+from utils.language_id import get_language_identifier
+from utils.stats_stream import StatsStream
+from dotenv import load_dotenv
+import atexit
+import hmac
 import json
+import os
+
+load_dotenv()
 
 app = Flask(__name__)
 
+# Per-user posting velocity (fixed memory regardless of user count)
+velocity_store = None
+if os.getenv('VELOCITY_ENABLED', 'true').lower() == 'true':
+    velocity_store = UserVelocityStore(
+        max_hot_users=int(os.getenv('VELOCITY_MAX_HOT_USERS', '50000')),
+        snapshot_path=os.getenv('VELOCITY_SNAPSHOT_PATH', 'user_velocity.npz')
+    )
+    atexit.register(velocity_store.snapshot)
+
 # Initialize components
 classifier = ClassifierAgent()
-risk_assessor = RiskAgent()
+risk_assessor = RiskAgent(velocity_store)
 action_decider = ActionAgent()
-auditor = AuditAgent()
-dataset_manager = DatasetManager()
-retriever = RetrievalAgent(dataset_manager)  # COMMENTED OUT
-feedback_system = FeedbackSystem()
+# Derived state (retrieval index, stat counters) is snapshotted so restarts
+# load it by mmap and replay only what was logged after the snapshot
+snapshot_store = None
+if os.getenv('SNAPSHOT_ENABLED', 'true').lower() == 'true':
+    snapshot_store = SnapshotStore(os.getenv('SNAPSHOT_DIR', 'snapshots'))
+
+# Joins audit, dataset and feedback records on the canonical content fingerprint
+fingerprint_index = FingerprintIndex(os.getenv('FINGERPRINT_INDEX_PATH', 'fingerprint_index.db'))
+auditor = AuditAgent(
+    os.getenv('AUDIT_LOG_DIR', 'audit_segments'),
+    fingerprint_index=fingerprint_index,
+    segment_max_bytes=int(os.getenv('AUDIT_SEGMENT_MAX_MB', '64')) * 1024 * 1024,
+    legacy_log='audit_log.jsonl',
+    snapshot_store=snapshot_store
+)
+dataset_manager = DatasetManager(
+    fingerprint_index=fingerprint_index,
+    store_content=os.getenv('DATASET_STORE_CONTENT', 'false').lower() == 'true',
+    snapshot_store=snapshot_store
+)
+
+# Optional online classifier that serves confident items before the zero-shot model
+fast_path = None
+if os.getenv('FAST_PATH_ENABLED', 'false').lower() == 'true':
+    fast_path = FastPathClassifier(
+        classifier.categories,
+        model_dir=os.getenv('FAST_PATH_MODEL_DIR', 'models/fast_path'),
+        confidence=float(os.getenv('FAST_PATH_CONFIDENCE', '0.9'))
+    )
+    if fast_path.version == 0 and 'content' in dataset_manager.dataset.columns:
+        # First run: learn from the BART labels already in the dataset
+        fast_path.warm_start(dataset_manager.dataset.to_dict('records'))
+    fast_path.start_background_training(float(os.getenv('FAST_PATH_TRAIN_INTERVAL', '30')))
+    atexit.register(fast_path.stop_background_training)
+    classifier.fast_path = fast_path
+retriever = RetrievalAgent(dataset_manager, snapshot_store)  # COMMENTED OUT
+if snapshot_store is not None:
+    for component in (auditor, dataset_manager, retriever):
+        snapshot_store.register(component)
+    snapshot_store.start(float(os.getenv('SNAPSHOT_INTERVAL', '300')))
+    atexit.register(snapshot_store.stop)
+if os.getenv('FEEDBACK_BACKEND', 'sqlite') == 'sqlite':
+    feedback_system = SQLiteFeedbackSystem(
+        os.getenv('FEEDBACK_DB_PATH', 'feedback.db'), fingerprint_index=fingerprint_index
+    )
+else:
+    feedback_system = FeedbackSystem(fingerprint_index=fingerprint_index)
+
+# With SEGMENT_KEYS set, audit and dataset records are written only to encrypted
+# segment stores; the plaintext audit segments and dataset CSV get no new records.
+# Views that read those plaintext stores (audit queries and stats, retrieval of
+# similar cases, record lookup) therefore only show history from before encryption
+# was enabled; read the encrypted records with replay.py --source encrypted-audit.
+segment_keyring = Keyring.from_env()
+audit_archive = dataset_archive = None
+if segment_keyring is not None:
+    archive_dir = os.getenv('SEGMENT_ARCHIVE_DIR', 'encrypted_archive')
+    flush_interval = float(os.getenv('SEGMENT_FLUSH_SECONDS', '1'))
+    audit_archive = EncryptedSegmentStore(
+        os.path.join(archive_dir, 'audit'), segment_keyring, flush_interval=flush_interval
+    )
+    dataset_archive = EncryptedSegmentStore(
+        os.path.join(archive_dir, 'dataset'), segment_keyring, flush_interval=flush_interval
+    )
+    print("✅ Encrypted segment storage enabled; audit and dataset records are no longer written in plaintext")
+
+# Audit and dataset writes happen behind the response unless
+# PERSISTENCE_MODE=sync is set for deployments that need synchronous audit.
+# The retriever picks new rows up from the shared dataset file, so it also
+# sees decisions made by other gunicorn workers.
+persistence_queue = PersistenceQueue(
+    auditor, dataset_manager,
+    mode=os.getenv('PERSISTENCE_MODE', 'async'),
+    max_size=int(os.getenv('PERSISTENCE_QUEUE_SIZE', '1000')),
+    batch_size=int(os.getenv('PERSISTENCE_BATCH_SIZE', '64')),
+    audit_archive=audit_archive,
+    dataset_archive=dataset_archive,
+    write_plaintext=segment_keyring is None
+)
+persistence_queue.start()
+atexit.register(persistence_queue.shutdown)
+
+# Default and upper bound for ?max_in_flight= on the streaming endpoints, so one
+# request cannot make the server buffer and batch its whole body
+STREAM_MAX_IN_FLIGHT = int(os.getenv('STREAM_MAX_IN_FLIGHT', '32'))
+
+def stream_max_in_flight(requested):
+    """?max_in_flight= clamped to 1..STREAM_MAX_IN_FLIGHT"""
+    return min(max(1, requested), STREAM_MAX_IN_FLIGHT)
+
+# Near-duplicates of recent content reuse the earlier classification and skip the model
+near_duplicates = None
+if os.getenv('NEAR_DUP_ENABLED', 'true').lower() == 'true':
+    near_duplicates = NearDuplicateIndex(
+        threshold=float(os.getenv('NEAR_DUP_THRESHOLD', '0.9')),
+        max_entries=int(os.getenv('NEAR_DUP_MAX_ENTRIES', '100000'))
+    )
+
+# Bounded model concurrency; over the queue budget, requests fall back to rules or are shed
+admission = AdmissionController(
+    max_concurrency=int(os.getenv('ADMISSION_MAX_CONCURRENCY', '2')),
+    queue_budget=float(os.getenv('ADMISSION_QUEUE_BUDGET_MS', '500')) / 1000,
+    max_queue=int(os.getenv('ADMISSION_MAX_QUEUE', '32'))
+)
+
+# Opt-in profiling: PROFILING_MODE=sample is cheap enough for one production worker,
+# full adds tracemalloc and cProfile; dump with POST /admin/profile/dump or SIGUSR2
+profiler = Profiler(
+    os.getenv('PROFILING_MODE', 'off'),
+    output_dir=os.getenv('PROFILING_DIR', 'profiles'),
+    sample_rate=float(os.getenv('PROFILING_SAMPLE_RATE', '0.01')),
+    sample_interval=float(os.getenv('PROFILING_SAMPLE_INTERVAL_MS', '10')) / 1000
+)
+if profiler.enabled:
+    # Structures suspected of growing with uptime
+    profiler.watch('action_policy_items', lambda: sum(len(a) for a in action_decider.action_policies.values()))
+    profiler.watch('dataset_frame_bytes', lambda: int(dataset_manager._dataset.memory_usage(deep=True).sum())
+                   if dataset_manager._dataset is not None else 0)
+    if isinstance(feedback_system, FeedbackSystem):
+        profiler.watch('feedback_frame_bytes', lambda: int(feedback_system._feedback_data.memory_usage(deep=True).sum())
+                       if feedback_system._feedback_data is not None else 0)
+    profiler.watch('retrieval_index', retriever.get_stats)
+    profiler.watch('persistence_queue_depth', lambda: persistence_queue.get_stats()['queue_depth'])
+    if near_duplicates is not None:
+        profiler.watch('near_duplicate_entries', lambda: near_duplicates.get_stats()['entries'])
+    profiler.start()
+    profiler.install_signal_handler()
+    atexit.register(profiler.stop)
+
+# Classification spread over classifier_node.py hosts on a consistent-hash ring
+# when CLASSIFIER_SHARDS lists their URLs; the local classifier is the fallback
+shard_router = None
+pipeline_classifier = classifier
+if os.getenv('CLASSIFIER_SHARDS'):
+    hedge_delay_ms = os.getenv('SHARD_HEDGE_DELAY_MS')
+    shard_router = ShardRouter(
+        [url.strip() for url in os.getenv('CLASSIFIER_SHARDS').split(',') if url.strip()],
+        timeout=float(os.getenv('SHARD_TIMEOUT', '5')),
+        hedge_delay=float(hedge_delay_ms) / 1000 if hedge_delay_ms else None,
+        health_interval=float(os.getenv('SHARD_HEALTH_INTERVAL', '5'))
+    )
+    shard_router.start()
+    atexit.register(shard_router.stop)
+    pipeline_classifier = ShardedClassifier(shard_router, classifier)
+
+# Per-tenant and per-language classifiers from MODEL_REGISTRY_PATH, loaded lazily
+# within a RAM budget; everything not routed elsewhere uses the classifier above
+model_registry = None
+registry_config = load_registry_config()
+if registry_config.get('routes'):
+    model_registry = ModelRegistry(
+        registry_config['routes'], pipeline_classifier,
+        budget_mb=int(os.getenv('MODEL_REGISTRY_BUDGET_MB', '4096')),
+        detect_languages=get_language_identifier().detect_batch,
+        load_wait=float(os.getenv('MODEL_LOAD_WAIT_SECONDS', '0')),
+        hot_threshold=float(os.getenv('MODEL_HOT_THRESHOLD', '100'))
+    )
+    model_registry.start()
+    atexit.register(model_registry.stop)
+    pipeline_classifier = model_registry
+
+# Streaming top-k of terms in flagged content; with TRENDING_PROMOTE=true, fast-growing
+# terms are added to the classifier's rule keywords (used in rules-only mode)
+trending = None
+if os.getenv('TRENDING_ENABLED', 'true').lower() == 'true':
+    trending = TrendingTerms(
+        capacity=int(os.getenv('TRENDING_CAPACITY', '2000')),
+        window_seconds=float(os.getenv('TRENDING_WINDOW_SECONDS', '3600')),
+        classifier=classifier if os.getenv('TRENDING_PROMOTE', 'false').lower() == 'true' else None,
+        promote_min_count=int(os.getenv('TRENDING_PROMOTE_MIN_COUNT', '50')),
+        promote_growth=float(os.getenv('TRENDING_PROMOTE_GROWTH', '3')),
+        baseline_sample=float(os.getenv('TRENDING_BASELINE_SAMPLE', '0.1')),
+        promote_min_lift=float(os.getenv('TRENDING_PROMOTE_MIN_LIFT', '5'))
+    )
+    trending.start()
+    atexit.register(trending.stop)
+
+pipeline = ModerationPipeline(
+    pipeline_classifier, risk_assessor, action_decider, auditor,
+    dataset_manager, persistence_queue, near_duplicates, admission, profiler, trending
+)
+
+# Transparency stats pushed to dashboards over SSE, read once per tick for all subscribers.
+# Here each subscriber holds a worker thread, so few are admitted per worker and each is
+# ended after a while (the browser reconnects); dashboards refused a slot poll instead.
+stats_stream = StatsStream(
+    {'audit': auditor.get_audit_stats, 'feedback': feedback_system.get_feedback_stats},
+    tick=float(os.getenv('STATS_STREAM_TICK_SECONDS', '2')),
+    max_blocking=int(os.getenv('STATS_STREAM_WSGI_MAX_SUBSCRIBERS', '1')),
+    blocking_seconds=float(os.getenv('STATS_STREAM_WSGI_MAX_SECONDS', '300'))
+)
+stats_stream.start()
+atexit.register(stats_stream.stop)
 
 # Setup message bus handlers
 def classifier_handler(message):
@@ -46,69 +266,187 @@ def moderate_content():
         data = request.json
         content = data['content']
         user_id = data.get('user_id', 'anonymous')
+        priority = request.headers.get('X-Priority', data.get('priority', 'normal'))
         
-        # Classify content
-        classification = classifier.classify(content)
-        
-        # Assess risk
-        risk_assessment = risk_assessor.evaluate_risk(classification, content)
+        # Classify, assess risk, decide actions and persist the decision
+        # (write-behind unless running in sync mode)
+        response = pipeline.moderate(content, user_id, priority=priority,
+                                     tenant=request.headers.get('X-Tenant', data.get('tenant')))
         
-        # Decide actions
-        actions = action_decider.determine_action(risk_assessment, classification, content)
-        
-        # Audit the decision
-        explanation = auditor.generate_explanation(classification, risk_assessment)
-        audit_entry = auditor.log_decision(
-            content, user_id, classification, 
-            risk_assessment, actions, explanation
-        )
-        
-        # Add to dataset for future retrieval
-        dataset_manager.add_to_dataset(
-            content, user_id, classification, risk_assessment, actions
-        )
-        
-        # Retrieve similar cases - TEMPORARILY DISABLED
-        similar_cases = retriever.search_similar_content(classification)
-        
-        response = {
-            'classification': classification,
-            'risk_score': risk_assessment,
-            'action': actions,
-            'explanation': explanation,
-            'similar_cases': similar_cases[:3]  # TEMPORARILY DISABLED
-        }
+        # Retrieve similar cases from the in-memory index
+        similar_cases = retriever.search_similar_content(response['classification'])
+        response['similar_cases'] = similar_cases[:3]
         
         return jsonify(response)
     
+    except AdmissionRejectedError as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': str(e.retry_after)}
+    except PersistenceBackpressureError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Bulk moderation over a chunked NDJSON body ({"content", "user_id", "id"} per line).
+# Streams one NDJSON result per input line; bad lines are reported, not fatal.
+# Bulk traffic is low priority by default, so under overload its lines are shed first.
+@app.route('/moderate/stream', methods=['POST'])
+def moderate_stream():
+    max_in_flight = stream_max_in_flight(request.args.get('max_in_flight', STREAM_MAX_IN_FLIGHT, type=int))
+    persist = request.args.get('persist', 'true').lower() != 'false'
+    results = pipeline.moderate_stream(
+        request.stream, max_in_flight=max_in_flight, persist=persist,
+        priority=request.args.get('priority', 'low'),
+        tenant=request.headers.get('X-Tenant', request.args.get('tenant'))
+    )
+    return Response(stream_with_context(results), mimetype='application/x-ndjson')
+
 @app.route('/api/audit-stats')
 def get_audit_stats():
     stats = auditor.get_audit_stats()
     return jsonify(stats)
 
+# Paged audit history: ?from=&to= (ISO timestamps or dates, `to` inclusive of its
+# whole day), user_id, level, limit and the cursor returned by the previous page
+@app.route('/api/audit')
+def query_audit():
+    try:
+        entries, next_cursor = auditor.query(
+            start=request.args.get('from'),
+            end=end_of_day(request.args.get('to')),
+            user_id=request.args.get('user_id'),
+            level=request.args.get('level'),
+            cursor=request.args.get('cursor'),
+            limit=min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        )
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    return jsonify({'entries': entries, 'next_cursor': next_cursor})
+
 @app.route('/api/feedback', methods=['POST'])
 def submit_feedback():
     try:
         data = request.json
+        try:
+            accurate = parse_accurate(data['accurate'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        fingerprint = data.get('content_hash') or content_fingerprint(data['content'])
         feedback_system.record_feedback(
             data['content'],
             data.get('user_id', 'anonymous'),
-            data['accurate'],
+            accurate,
             data.get('notes', ''),
            # data.get('expected_classification'),
            # data.get('expected_action')
+            fingerprint=fingerprint
         )
+        if fast_path is not None:
+            # Confirmed or corrected decisions become weighted training examples
+            audit_offsets = fingerprint_index.lookup(fingerprint).get('audit', [])
+            decisions = auditor.get_entries(audit_offsets[-1:])
+            fast_path.observe_feedback(
+                data['content'], accurate,
+                decisions[0]['classification'] if decisions else None,
+                data.get('expected_classification')
+            )
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Server-sent events: a "snapshot" event, then "delta" events with changed values only.
+# Each subscriber holds a worker thread here, so dashboards belong on asgi_app.py, which
+# serves the same stream without one and without the subscriber cap.
+@app.route('/api/stats/stream')
+def stream_stats():
+    events = stats_stream.events()
+    if not next(events):
+        return jsonify({'error': 'Too many live stats subscribers, poll /api/audit-stats instead'}), 503
+    return Response(
+        events, mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/feedback-stats')
 def get_feedback_stats():
     stats = feedback_system.get_feedback_stats()
     return jsonify(stats)
 
+@app.route('/api/decisions/<fingerprint>')
+def get_decision(fingerprint):
+    offsets = fingerprint_index.lookup(fingerprint)
+    if not offsets:
+        return jsonify({'error': 'Unknown content fingerprint'}), 404
+    return app.response_class(
+        json.dumps({
+            'content_hash': fingerprint,
+            'audit': auditor.get_entries(offsets.get('audit', [])),
+            'dataset': dataset_manager.get_rows(offsets.get('dataset', [])),
+            'feedback': feedback_system.get_rows(offsets.get('feedback', []))
+        }, default=str),
+        mimetype='application/json'
+    )
+
+@app.route('/api/fast-path-stats')
+def get_fast_path_stats():
+    if fast_path is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **fast_path.get_stats()})
+
+@app.route('/api/admission-stats')
+def get_admission_stats():
+    return jsonify(admission.get_stats())
+
+@app.route('/api/shard-stats')
+def get_shard_stats():
+    if shard_router is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **shard_router.get_stats()})
+
+@app.route('/api/model-registry-stats')
+def get_model_registry_stats():
+    if model_registry is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **model_registry.get_stats()})
+
+@app.route('/api/trending-terms')
+def get_trending_terms():
+    if trending is None:
+        return jsonify({'enabled': False})
+    return jsonify({
+        'enabled': True,
+        'terms': trending.top(min(max(request.args.get('limit', 50, type=int), 1), 500)),
+        'promoted': trending.promoted,
+        'stats': trending.get_stats()
+    })
+
+@app.route('/api/persistence-stats')
+def get_persistence_stats():
+    return jsonify(persistence_queue.get_stats())
+
+@app.route('/api/near-duplicate-stats')
+def get_near_duplicate_stats():
+    if near_duplicates is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **near_duplicates.get_stats()})
+
+# Admin profiling endpoints; send PROFILING_ADMIN_TOKEN in X-Admin-Token (closed while it is unset)
+def _profiling_allowed():
+    token = os.getenv('PROFILING_ADMIN_TOKEN')
+    if not profiler.enabled or not token:
+        return False
+    return hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), token.encode())
+
+@app.route('/admin/profile/stats')
+def get_profile_stats():
+    if not _profiling_allowed():
+        return jsonify({'error': 'Profiling is disabled, PROFILING_ADMIN_TOKEN is unset or the token is wrong'}), 403
+    return jsonify(profiler.get_stats())
+
+@app.route('/admin/profile/dump', methods=['POST'])
+def dump_profile():
+    if not _profiling_allowed():
+        return jsonify({'error': 'Profiling is disabled, PROFILING_ADMIN_TOKEN is unset or the token is wrong'}), 403
+    return jsonify({'status': 'success', 'path': profiler.dump(reason='admin endpoint')})
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
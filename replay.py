@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Replay historical traffic through a candidate configuration
+
+Streams stored decisions from the audit segments, the encrypted audit segments
+(SEGMENT_KEYS deployments, --source encrypted-audit) or the moderation dataset and
+re-evaluates each one across a process pool twice: with the current (baseline)
+RiskAgent / ActionAgent settings and with a candidate config. Reports
+throughput, per-record latency and drift: risk level transitions, action
+changes and a confusion matrix of the candidate's level changes against user
+feedback labels. Records are read in chunks with a bounded number in flight and
+workers return only aggregate counts, so memory stays flat however long the
+history is.
+
+Candidate config (JSON), every key optional:
+
+    {
+      "thresholds": {"violence": 0.25},
+      "category_weights": {"spam": 0.3},
+      "level_cutoffs": {"Medium": 0.35, "High": 0.75},
+      "action_policies": {"Medium": ["flag for review"]},
+      "classifier_mode": "prototype"
+    }
+
+    python replay.py candidate.json --source audit --from 2024-01-01 --workers 4
+    python replay.py candidate.json --source dataset --reclassify --report drift.json
+
+Audit entries carry no text, so text characteristics and keyword boosts are
+only applied when replaying a dataset stored with content; user velocity is
+never replayed. Compare against the baseline columns to see the effect of the
+config change alone.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bulk_moderate import read_chunks, report_progress
+from utils.audit_segments import end_of_day
+
+LEVELS = ["Low", "Medium", "High"]
+# Per-record latency histogram bins: 1 µs to 10 s, log spaced
+LATENCY_BINS = np.logspace(-6, 1, 141)
+
+# Per-process agents and feedback labels, created once by the pool initializer
+_baseline = None
+_candidate = None
+_classifier = None
+_labels = None
+
+
+def _init_worker(baseline_config, candidate_config, labels, reclassify, torch_threads):
+    global _baseline, _candidate, _classifier, _labels
+    # The agents print per-item debug output; keep the progress line readable
+    sys.stdout = open(os.devnull, 'w')
+
+    from agents.risk_agent import RiskAgent
+    from agents.action_agent import ActionAgent
+    _baseline = (RiskAgent(config=baseline_config), ActionAgent(config=baseline_config))
+    _candidate = (RiskAgent(config=candidate_config), ActionAgent(config=candidate_config))
+    _labels = labels
+
+    if reclassify:
+        from agents.classifier_agent import ClassifierAgent
+        _classifier = ClassifierAgent(mode=candidate_config.get('classifier_mode'), num_threads=torch_threads)
+
+
+def _parse(value):
+    """Stored JSON column (dataset) or already-decoded value (audit)"""
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def _evaluate(agents, classification, text):
+    risk_assessor, action_decider = agents
+    risk = risk_assessor.evaluate_risk(classification, text)
+    action = action_decider.determine_action(risk, classification, text)
+    return risk, set(action['actions'])
+
+
+def empty_totals():
+    return {
+        'records': 0,
+        'skipped': 0,
+        'reclassified': 0,
+        'stored_vs_candidate': np.zeros((len(LEVELS), len(LEVELS)), dtype=np.int64),
+        'baseline_vs_candidate': np.zeros((len(LEVELS), len(LEVELS)), dtype=np.int64),
+        'action_changes_vs_stored': 0,
+        'action_changes_vs_baseline': 0,
+        'score_delta_sum': 0.0,
+        'score_abs_delta_sum': 0.0,
+        # Rows: feedback said the stored decision was accurate / inaccurate
+        # Columns: candidate kept / changed the stored risk level
+        'feedback_confusion': np.zeros((2, 2), dtype=np.int64),
+        'latency_histogram': np.zeros(len(LATENCY_BINS) + 1, dtype=np.int64)
+    }
+
+
+def merge_totals(totals, part):
+    for key, value in part.items():
+        totals[key] = totals[key] + value
+    return totals
+
+
+def replay_chunk(records):
+    """Re-evaluate one chunk of stored decisions; returns aggregate counts only"""
+    totals = empty_totals()
+    latencies = []
+
+    reclassified = {}
+    if _classifier is not None:
+        texts = [(i, r['content']) for i, r in enumerate(records) if isinstance(r.get('content'), str)]
+        if texts:
+            began = time.perf_counter()
+            classifications = _classifier.classify_batch([text for _, text in texts])
+            per_record = (time.perf_counter() - began) / len(texts)
+            reclassified = {i: (c, per_record) for (i, _), c in zip(texts, classifications)}
+
+    for i, record in enumerate(records):
+        try:
+            stored_risk = _parse(record['risk_score'])
+            stored_actions = set(_parse(record['action_taken'])['actions'])
+            stored_level = LEVELS.index(stored_risk['level'])
+            text = record.get('content') if isinstance(record.get('content'), str) else ""
+
+            classification, classify_time = reclassified.get(i, (None, 0.0))
+            if classification is None:
+                classification = _parse(record['classification'])
+
+            baseline_risk, baseline_actions = _evaluate(_baseline, _parse(record['classification']), text)
+            began = time.perf_counter()
+            candidate_risk, candidate_actions = _evaluate(_candidate, classification, text)
+            latencies.append(time.perf_counter() - began + classify_time)
+        except (KeyError, TypeError, ValueError):
+            totals['skipped'] += 1
+            continue
+
+        candidate_level = LEVELS.index(candidate_risk['level'])
+        totals['records'] += 1
+        totals['reclassified'] += int(i in reclassified)
+        totals['stored_vs_candidate'][stored_level, candidate_level] += 1
+        totals['baseline_vs_candidate'][LEVELS.index(baseline_risk['level']), candidate_level] += 1
+        totals['action_changes_vs_stored'] += int(candidate_actions != stored_actions)
+        totals['action_changes_vs_baseline'] += int(candidate_actions != baseline_actions)
+        delta = candidate_risk['score'] - float(stored_risk['score'])
+        totals['score_delta_sum'] += delta
+        totals['score_abs_delta_sum'] += abs(delta)
+
+        accurate = _labels.get(record.get('content_hash'))
+        if accurate is not None:
+            totals['feedback_confusion'][int(not accurate), int(candidate_level != stored_level)] += 1
+
+    totals['latency_histogram'] += np.bincount(
+        np.searchsorted(LATENCY_BINS, latencies), minlength=len(LATENCY_BINS) + 1
+    )
+    return totals
+
+
+def iter_audit_records(args):
+    """Chunks of audit entries, paged through the segment store without loading it"""
+    from utils.audit_segments import AuditSegmentStore
+    # Read-only: never seal or compress segments the live service is still writing
+    store = AuditSegmentStore(args.audit_dir, read_only=True)
+    cursor = None
+    while True:
+        entries, cursor = store.query(start=args.start, end=args.end, cursor=cursor,
+                                      limit=args.chunk_size, max_blocks=1 << 30)
+        if entries:
+            yield [{
+                'content_hash': entry.get('content_hash'),
+                'classification': entry.get('classification'),
+                'risk_score': entry.get('risk_score'),
+                'action_taken': entry.get('action_taken')
+            } for entry in entries]
+        if cursor is None:
+            return
+
+
+def iter_encrypted_audit_records(args):
+    """Chunks of audit entries decrypted from the encrypted segment store (SEGMENT_KEYS)"""
+    from utils.encrypted_segments import EncryptedSegmentStore, Keyring
+    keyring = Keyring.from_env()
+    if keyring is None:
+        raise SystemExit("❌ SEGMENT_KEYS is not set; it is needed to read the encrypted audit store")
+    store = EncryptedSegmentStore(os.path.join(args.archive_dir, 'audit'), keyring)
+    chunk = []
+    for entry in store.iter_records():
+        timestamp = entry.get('timestamp') or ''
+        if (args.start is not None and timestamp < args.start) or (args.end is not None and timestamp > args.end):
+            continue
+        chunk.append({
+            'content_hash': entry.get('content_hash'),
+            'classification': entry.get('classification'),
+            'risk_score': entry.get('risk_score'),
+            'action_taken': entry.get('action_taken')
+        })
+        if len(chunk) >= args.chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_dataset_records(args):
+    """Chunks of dataset rows; JSON columns are decoded inside the workers"""
+    columns = ['timestamp', 'content_hash', 'classification', 'risk_score', 'action_taken', 'content']
+    for frame in read_chunks(args.dataset, 'csv', args.chunk_size):
+        frame = frame[[c for c in columns if c in frame.columns]]
+        if args.start is not None:
+            frame = frame[frame['timestamp'].astype(str) >= args.start]
+        if args.end is not None:
+            frame = frame[frame['timestamp'].astype(str) <= args.end]
+        if len(frame):
+            yield frame.drop(columns='timestamp').to_dict('records')
+
+
+def load_labels(path):
+    """content_hash -> latest feedback 'accurate' label, from the SQLite or CSV feedback store"""
+    labels = {}
+    if not path or not os.path.exists(path):
+        return labels
+    if path.endswith('.db'):
+        conn = sqlite3.connect(path, timeout=30)
+        try:
+            for content_hash, accurate in conn.execute("SELECT content_hash, accurate FROM feedback ORDER BY id"):
+                labels[content_hash] = bool(accurate)
+        finally:
+            conn.close()
+    else:
+        for frame in read_chunks(path, 'csv', 100000):
+            for content_hash, accurate in zip(frame['content_hash'], frame['accurate']):
+                labels[content_hash] = str(accurate).lower() in ('true', '1')
+    return labels
+
+
+def load_config(path):
+    if not path:
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def latency_percentile(histogram, q):
+    total = histogram.sum()
+    if total == 0:
+        return 0.0
+    index = int(np.searchsorted(np.cumsum(histogram), q / 100 * total))
+    return float(LATENCY_BINS[min(index, len(LATENCY_BINS) - 1)])
+
+
+def build_report(totals, elapsed, args):
+    records = totals['records']
+    confusion = totals['feedback_confusion']
+
+    def matrix(counts):
+        return {LEVELS[i]: {LEVELS[j]: int(counts[i, j]) for j in range(len(LEVELS))} for i in range(len(LEVELS))}
+
+    def changed(counts):
+        return int(counts.sum() - np.trace(counts))
+
+    histogram = totals['latency_histogram']
+    return {
+        'candidate': os.path.abspath(args.candidate),
+        'source': args.source,
+        'records': records,
+        'skipped': totals['skipped'],
+        'reclassified': totals['reclassified'],
+        'elapsed_seconds': round(elapsed, 2),
+        'throughput': round(records / elapsed, 1) if elapsed > 0 else 0,
+        'latency_ms': {
+            f"p{q}": round(latency_percentile(histogram, q) * 1000, 4) for q in (50, 95, 99)
+        },
+        'level_changes_vs_stored': changed(totals['stored_vs_candidate']),
+        'level_changes_vs_baseline': changed(totals['baseline_vs_candidate']),
+        'level_transitions_vs_stored': matrix(totals['stored_vs_candidate']),
+        'level_transitions_vs_baseline': matrix(totals['baseline_vs_candidate']),
+        'action_changes_vs_stored': totals['action_changes_vs_stored'],
+        'action_changes_vs_baseline': totals['action_changes_vs_baseline'],
+        'mean_score_delta': round(totals['score_delta_sum'] / records, 4) if records else 0,
+        'mean_abs_score_delta': round(totals['score_abs_delta_sum'] / records, 4) if records else 0,
+        'feedback_confusion': {
+            'accurate_kept': int(confusion[0, 0]),
+            'accurate_changed': int(confusion[0, 1]),
+            'inaccurate_kept': int(confusion[1, 0]),
+            'inaccurate_changed': int(confusion[1, 1])
+        },
+        'replayed_at': datetime.now().isoformat()
+    }
+
+
+def print_report(report):
+    records = max(report['records'], 1)
+    print(f"\nReplayed {report['records']:,} records in {report['elapsed_seconds']}s "
+          f"({report['throughput']:,} records/s, {report['skipped']:,} skipped)")
+    latency = report['latency_ms']
+    print(f"Latency per record: p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms")
+    print(f"Level changes: {report['level_changes_vs_stored']:,} vs stored "
+          f"({report['level_changes_vs_stored'] / records:.2%}), "
+          f"{report['level_changes_vs_baseline']:,} vs baseline "
+          f"({report['level_changes_vs_baseline'] / records:.2%})")
+    print(f"Action changes: {report['action_changes_vs_stored']:,} vs stored, "
+          f"{report['action_changes_vs_baseline']:,} vs baseline")
+    print(f"Mean risk score delta: {report['mean_score_delta']:+.4f} "
+          f"(mean absolute {report['mean_abs_score_delta']:.4f})")
+
+    print("\nStored level -> candidate level")
+    print("          " + "".join(f"{level:>10}" for level in LEVELS))
+    for level, row in report['level_transitions_vs_stored'].items():
+        print(f"{level:<10}" + "".join(f"{row[to]:>10,}" for to in LEVELS))
+
+    confusion = report['feedback_confusion']
+    print("\nFeedback label vs candidate        kept level   changed level")
+    print(f"  stored decision accurate     {confusion['accurate_kept']:>12,} {confusion['accurate_changed']:>15,}")
+    print(f"  stored decision inaccurate   {confusion['inaccurate_kept']:>12,} {confusion['inaccurate_changed']:>15,}")
+
+
+def run(args):
+    candidate_config = load_config(args.candidate)
+    baseline_config = load_config(args.baseline)
+    labels = load_labels(args.feedback)
+    print(f"Loaded {len(labels):,} feedback labels")
+
+    chunks = {
+        'audit': iter_audit_records, 'encrypted-audit': iter_encrypted_audit_records, 'dataset': iter_dataset_records
+    }[args.source](args)
+    totals = empty_totals()
+    started = time.time()
+    rows_submitted = 0
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(baseline_config, candidate_config, labels,
+                                       args.reclassify, args.torch_threads)) as pool:
+        pending = set()
+
+        def drain(return_when):
+            nonlocal pending
+            done, pending = wait(pending, return_when=return_when)
+            for future in done:
+                merge_totals(totals, future.result())
+            processed = totals['records'] + totals['skipped']
+            report_progress(processed, processed, None, started)
+
+        for records in chunks:
+            if len(pending) >= args.workers * 2:
+                drain(FIRST_COMPLETED)
+            pending.add(pool.submit(replay_chunk, records))
+            rows_submitted += len(records)
+            if args.limit and rows_submitted >= args.limit:
+                break
+        if pending:
+            drain('ALL_COMPLETED')
+    sys.stderr.write("\n")
+
+    report = build_report(totals, time.time() - started, args)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report written to {args.report}")
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay stored moderation decisions through a candidate config")
+    parser.add_argument('candidate', help="JSON file with the candidate config")
+    parser.add_argument('--baseline', help="JSON config to compare against (default: current settings)")
+    parser.add_argument('--source', choices=['audit', 'encrypted-audit', 'dataset'], default='audit')
+    parser.add_argument('--audit-dir', default=os.getenv('AUDIT_LOG_DIR', 'audit_segments'))
+    parser.add_argument('--archive-dir', default=os.getenv('SEGMENT_ARCHIVE_DIR', 'encrypted_archive'),
+                        help="Encrypted segment directory (--source encrypted-audit)")
+    parser.add_argument('--dataset', default='moderation_dataset.csv')
+    parser.add_argument('--feedback', default=os.getenv('FEEDBACK_DB_PATH', 'feedback.db'),
+                        help="feedback.db (SQLite) or feedback_data.csv")
+    parser.add_argument('--from', dest='start', help="ISO timestamp to replay from")
+    parser.add_argument('--to', dest='end', type=end_of_day,
+                        help="ISO timestamp to replay to (a date includes that whole day)")
+    parser.add_argument('--limit', type=int, default=0, help="Stop after about this many records")
+    parser.add_argument('--reclassify', action='store_true',
+                        help="Re-run the classifier on stored content (dataset with content only)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--torch-threads', type=int, default=1, help="Torch threads per worker")
+    parser.add_argument('--report', help="Write the drift report as JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+What-if simulator for RiskAgent thresholds, category weights and level cutoffs
+
+Loads the stored category scores of every dataset row into a NumPy matrix once
+and evaluates a grid of candidate settings with batched array operations,
+reporting the High / Medium / Low distribution of each candidate and how well
+it agrees with user feedback. Works on the moderation dataset CSV (scores in the
+classification JSON) or on bulk_moderate.py Parquet output (score_<category>
+columns, no JSON parsing needed).
+
+Grid spec (JSON), lists of values to sweep, every key optional:
+
+    {
+      "thresholds": {"violence": [0.2, 0.3, 0.4], "spam": [0.5, 0.6, 0.7]},
+      "category_weights": {"sexual content": [0.4, 0.6, 0.8]},
+      "level_cutoffs": {"Medium": [0.25, 0.3], "High": [0.6, 0.7, 0.8]}
+    }
+
+    python risk_whatif.py grid.json --dataset moderation_dataset.csv --top 10
+
+Text characteristics, keyword boosts and user velocity need the original text
+and time; their contribution is carried over from each stored score as a fixed
+residual on top of the recomputed classification component.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agents.risk_agent import RiskAgent
+from bulk_moderate import detect_format, read_chunks
+from replay import load_labels
+
+LEVELS = ["Low", "Medium", "High"]
+MATRIX_VERSION = 2  # Bumped when load_matrix() changes, so older .whatif.npz caches are rebuilt
+
+
+def load_matrix(path, chunk_size=200000):
+    """
+    (categories, scores n x k float32, stored score n, stored level n, content hashes n)
+    Rows without a stored risk assessment are dropped. Categories are the union
+    over all chunks; a row that lacks one scores 0 for it
+    """
+    input_format = detect_format(path)
+    categories = set()
+    parts = []
+    for frame in read_chunks(path, input_format, chunk_size):
+        score_columns = [c for c in frame.columns if c.startswith('score_')]
+        if score_columns:
+            scores = frame[score_columns].rename(columns=lambda c: c[len('score_'):])
+            risk = pd.DataFrame({'score': frame['risk_score'], 'level': frame['risk_level']})
+        else:
+            scores = pd.DataFrame([
+                json.loads(c) if isinstance(c, str) else {} for c in frame['classification']
+            ], index=frame.index)
+            risk = pd.DataFrame([
+                json.loads(r) if isinstance(r, str) else {} for r in frame['risk_score']
+            ], index=frame.index)
+        scores = scores.drop(columns=['normal content'], errors='ignore')
+        categories.update(scores.columns)
+
+        valid = risk['level'].isin(LEVELS).to_numpy() if 'level' in risk else np.zeros(len(frame), dtype=bool)
+        parts.append((
+            scores[valid].astype(np.float32),
+            risk['score'].to_numpy(np.float32)[valid],
+            risk['level'].map(LEVELS.index).to_numpy(np.int8)[valid],
+            frame['content_hash'].to_numpy()[valid]
+        ))
+
+    if not parts:
+        raise SystemExit(f"No rows found in {path}")
+    categories = sorted(categories)
+    frames, stored_score, stored_level, hashes = zip(*parts)
+    scores = np.concatenate([f.reindex(columns=categories).fillna(0).to_numpy(np.float32) for f in frames])
+    stored_score, stored_level, hashes = (np.concatenate(p) for p in (stored_score, stored_level, hashes))
+    return categories, scores, stored_score, stored_level, hashes
+
+
+def load_cached_matrix(path, cache_path):
+    """load_matrix(), reusing the .npz written on a previous run while the dataset is unchanged"""
+    stat = os.stat(path)
+    key = np.asarray([MATRIX_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+    if cache_path and os.path.exists(cache_path):
+        cached = np.load(cache_path, allow_pickle=True)
+        if np.array_equal(cached['key'], key):
+            return (list(cached['categories']), cached['scores'], cached['stored_score'],
+                    cached['stored_level'], cached['hashes'])
+
+    categories, scores, stored_score, stored_level, hashes = load_matrix(path)
+    if cache_path:
+        tmp_path = cache_path + '.tmp.npz'
+        np.savez(tmp_path, key=key, categories=np.asarray(categories), scores=scores,
+                 stored_score=stored_score, stored_level=stored_level, hashes=hashes)
+        os.replace(tmp_path, cache_path)
+    return categories, scores, stored_score, stored_level, hashes
+
+
+def build_grid(spec, categories, max_candidates, seed):
+    """
+    Candidate settings as arrays: thresholds m x k, weights m x k, cutoffs m x 2
+    Every combination of the listed values, or a random sample of them when
+    there are more than max_candidates; unlisted values keep the current defaults
+    """
+    kinds = ('thresholds', 'category_weights', 'level_cutoffs')
+    if not isinstance(spec, dict) or not all(isinstance(spec.get(kind, {}), dict) for kind in kinds):
+        raise SystemExit(f"❌ The grid must be a JSON object of {', '.join(kinds)}, each mapping names to value lists")
+    if set(spec) - set(kinds):
+        raise SystemExit(f"❌ Unknown grid keys: {', '.join(sorted(set(spec) - set(kinds)))}. Use {', '.join(kinds)}")
+    if not any(spec.get(kind) for kind in kinds):
+        raise SystemExit(f"❌ The grid sweeps nothing; list values under {', '.join(kinds)}")
+    unknown = [
+        f"{kind}.{name}" for kind, known in (('thresholds', categories), ('category_weights', categories),
+                                             ('level_cutoffs', ["Medium", "High"]))
+        for name in spec.get(kind, {}) if name not in known
+    ]
+    if unknown:
+        raise SystemExit(f"❌ Grid names unknown keys: {', '.join(unknown)}. "
+                         f"Categories in the dataset: {', '.join(categories)}; level cutoffs: Medium, High")
+
+    defaults = RiskAgent()
+    axes = []  # (kind, index, values)
+    for kind, index_of in (('thresholds', categories.index), ('category_weights', categories.index),
+                           ('level_cutoffs', ["Medium", "High"].index)):
+        for name, values in spec.get(kind, {}).items():
+            axes.append((kind, index_of(name), np.asarray(values, dtype=np.float32)))
+
+    sizes = [len(values) for _, _, values in axes]
+    total = int(np.prod(sizes)) if axes else 1
+    if total > max_candidates:
+        choice = np.random.default_rng(seed).choice(total, size=max_candidates, replace=False)
+    else:
+        choice = np.arange(total)
+    picks = np.unravel_index(choice, sizes) if axes else []
+
+    m = len(choice)
+    grid = {
+        'categories': categories,
+        'thresholds': np.tile([defaults.thresholds.get(c, 0.4) for c in categories], (m, 1)).astype(np.float32),
+        'category_weights': np.tile([defaults._get_category_weight(c) for c in categories], (m, 1)).astype(np.float32),
+        'level_cutoffs': np.tile([defaults.level_cutoffs["Medium"], defaults.level_cutoffs["High"]],
+                                 (m, 1)).astype(np.float32)
+    }
+    for (kind, index, values), pick in zip(axes, picks):
+        grid[kind][:, index] = values[pick]
+    return grid, total
+
+
+def component_tables(thresholds, weights):
+    """
+    Per category, the distinct (threshold, weight) pairs among the candidates and
+    each candidate's index into them; sweeps repeat a handful of values per
+    category, so contributions are computed per pair and gathered per candidate
+    """
+    tables = []
+    for j in range(thresholds.shape[1]):
+        pairs, index = np.unique(np.stack([thresholds[:, j], weights[:, j]], axis=1),
+                                 axis=0, return_inverse=True)
+        tables.append((pairs, index.ravel()))
+    return tables
+
+
+def classification_component(scores, tables):
+    """Sum of score x weight over categories above threshold: n x m for m candidates"""
+    component = np.zeros((scores.shape[0], len(tables[0][1]) if tables else 1), dtype=np.float32)
+    for j, (pairs, index) in enumerate(tables):
+        column = scores[:, j:j + 1]
+        contribution = np.where(column > pairs[None, :, 0], column * pairs[None, :, 1], 0).astype(np.float32)
+        component += np.take(contribution, index, axis=1)
+    return component
+
+
+def simulate(scores, stored_score, stored_level, labels, grid, row_chunk=1024, candidate_chunk=512):
+    """
+    Level counts (m x 3) and, for rows with feedback, how many each candidate
+    agrees with (m): keeping the stored level where feedback called it accurate,
+    changing it where feedback called it inaccurate
+    """
+    defaults = RiskAgent()
+    current = classification_component(scores, component_tables(
+        np.asarray([[defaults.thresholds.get(c, 0.4) for c in grid['categories']]], dtype=np.float32),
+        np.asarray([[defaults._get_category_weight(c) for c in grid['categories']]], dtype=np.float32)
+    ))[:, 0]
+    residual = np.maximum(stored_score - np.minimum(current, 1.0), 0)
+
+    m = grid['thresholds'].shape[0]
+    at_least = np.zeros((m, 2), dtype=np.int64)  # Rows at or above Medium / High
+    agreement = np.zeros(m, dtype=np.int64)
+    labelled = labels >= 0
+    for c0 in range(0, m, candidate_chunk):
+        c1 = min(c0 + candidate_chunk, m)
+        tables = component_tables(grid['thresholds'][c0:c1], grid['category_weights'][c0:c1])
+        cutoffs = grid['level_cutoffs'][c0:c1]
+
+        def levels(rows):
+            risk = classification_component(scores[rows], tables)
+            risk += residual[rows, None]
+            np.clip(risk, 0, 1, out=risk)
+            return risk >= cutoffs[None, :, 0], risk >= cutoffs[None, :, 1]
+
+        for r0 in range(0, len(scores), row_chunk):
+            medium_or_high, high = levels(slice(r0, r0 + row_chunk))
+            at_least[c0:c1, 0] += medium_or_high.sum(axis=0)
+            at_least[c0:c1, 1] += high.sum(axis=0)
+
+        if labelled.any():
+            medium_or_high, high = levels(labelled)
+            kept = (medium_or_high.astype(np.int8) + high) == stored_level[labelled, None]
+            agreement[c0:c1] = (kept == (labels[labelled, None] == 1)).sum(axis=0)
+
+    counts = np.stack([len(scores) - at_least[:, 0], at_least[:, 0] - at_least[:, 1], at_least[:, 1]], axis=1)
+    return counts, agreement
+
+
+def candidates_frame(grid, counts, agreement, labelled, categories):
+    total = counts.sum(axis=1, keepdims=True)
+    frame = pd.DataFrame({
+        **{f"threshold_{c}": grid['thresholds'][:, j] for j, c in enumerate(categories)},
+        **{f"weight_{c}": grid['category_weights'][:, j] for j, c in enumerate(categories)},
+        'cutoff_medium': grid['level_cutoffs'][:, 0],
+        'cutoff_high': grid['level_cutoffs'][:, 1],
+        **{f"pct_{level.lower()}": counts[:, i] / np.maximum(total[:, 0], 1) for i, level in enumerate(LEVELS)},
+        'feedback_agreement': agreement / labelled if labelled else np.nan
+    })
+    return frame.round(4)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep RiskAgent settings over the stored dataset")
+    parser.add_argument('grid', help="JSON grid spec of values to sweep")
+    parser.add_argument('--dataset', default='moderation_dataset.csv',
+                        help="Dataset CSV or bulk_moderate.py Parquet output")
+    parser.add_argument('--feedback', default=os.getenv('FEEDBACK_DB_PATH', 'feedback.db'),
+                        help="feedback.db (SQLite) or feedback_data.csv")
+    parser.add_argument('--cache', help="Score matrix cache (default: <dataset>.whatif.npz, 'none' to disable)")
+    parser.add_argument('--max-candidates', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--top', type=int, default=10, help="Candidates to print, best agreement first")
+    parser.add_argument('--output', help="Write every candidate's results as CSV")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.grid, 'r') as f:
+        spec = json.load(f)
+
+    began = time.perf_counter()
+    cache_path = None if args.cache == 'none' else args.cache or args.dataset + '.whatif.npz'
+    categories, scores, stored_score, stored_level, hashes = load_cached_matrix(args.dataset, cache_path)
+    feedback = load_labels(args.feedback)
+    labels = np.fromiter((int(feedback[h]) if h in feedback else -1 for h in hashes),
+                         dtype=np.int8, count=len(hashes))
+    labelled = int((labels >= 0).sum())
+    print(f"Loaded {len(scores):,} rows x {len(categories)} categories "
+          f"({labelled:,} with feedback) in {time.perf_counter() - began:.1f}s")
+
+    grid, total = build_grid(spec, categories, args.max_candidates, args.seed)
+    sampled = f" (sampled from {total:,})" if total > len(grid['thresholds']) else ""
+    print(f"Evaluating {len(grid['thresholds']):,} candidates{sampled}...")
+
+    began = time.perf_counter()
+    counts, agreement = simulate(scores, stored_score, stored_level, labels, grid)
+    elapsed = time.perf_counter() - began
+    print(f"✅ {len(scores) * len(counts):,} row evaluations in {elapsed:.2f}s")
+
+    current = np.bincount(stored_level, minlength=len(LEVELS)) / len(stored_level)
+    print("\nStored distribution: " + "  ".join(f"{l} {p:.1%}" for l, p in zip(LEVELS, current)))
+
+    frame = candidates_frame(grid, counts, agreement, labelled, categories)
+    ranked = frame.sort_values('feedback_agreement', ascending=False) if labelled else frame
+    swept = [c for c in frame.columns if frame[c].nunique() > 1 and not c.startswith('pct_')
+             and c != 'feedback_agreement']
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(ranked[swept + ['pct_low', 'pct_medium', 'pct_high', 'feedback_agreement']]
+              .head(args.top).to_string(index=False))
+
+    if args.output:
+        ranked.to_csv(args.output, index=False)
+        print(f"\n✅ Wrote {len(frame):,} candidates to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
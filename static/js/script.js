@@ -7,8 +7,11 @@ document.addEventListener('DOMContentLoaded', function() {
     const errorDiv = document.getElementById('error');
     const refreshBtn = document.getElementById('refreshStatsBtn');
     
+    // Live stats: latest values from the server's stats stream
+    let transparencyStats = {};
+    
     // Initialize
-    loadTransparencyStats();
+    subscribeTransparencyStats();
     
     // Event listeners
     if (analyzeBtn) {
@@ -51,8 +54,6 @@ document.addEventListener('DOMContentLoaded', function() {
             
             if (response.ok) {
                 displayResults(data);
-                // Refresh stats after successful analysis
-                setTimeout(loadTransparencyStats, 500);
             } else {
                 showError(data.error || 'An error occurred during analysis.');
             }
@@ -120,22 +121,87 @@ document.addEventListener('DOMContentLoaded', function() {
         errorDiv.classList.remove('hidden');
     }
     
-    // Load transparency statistics
+    // Subscribe once to server-sent stats: a full snapshot, then deltas of changed values
+    function subscribeTransparencyStats() {
+        if (!window.EventSource) {
+            pollTransparencyStats();
+            return;
+        }
+        
+        const source = new EventSource('/api/stats/stream');
+        source.addEventListener('snapshot', function(event) {
+            transparencyStats = JSON.parse(event.data);
+            renderTransparencyStats();
+        });
+        source.addEventListener('delta', function(event) {
+            mergeStats(transparencyStats, JSON.parse(event.data));
+            renderTransparencyStats();
+        });
+        // EventSource reconnects by itself and is sent a fresh snapshot. It gives up when the
+        // server refuses the stream (too many subscribers), and then the dashboard polls.
+        source.onerror = function() {
+            if (source.readyState === EventSource.CLOSED) {
+                console.warn('Stats stream refused, polling instead');
+                pollTransparencyStats();
+            } else {
+                console.error('Stats stream interrupted, reconnecting');
+            }
+        };
+    }
+    
+    function pollTransparencyStats() {
+        loadTransparencyStats();
+        setInterval(loadTransparencyStats, 15000);
+    }
+    
+    function mergeStats(target, delta) {
+        for (const [key, value] of Object.entries(delta)) {
+            if (value && typeof value === 'object' && target[key] && typeof target[key] === 'object') {
+                mergeStats(target[key], value);
+            } else {
+                target[key] = value;
+            }
+        }
+    }
+    
+    function renderTransparencyStats() {
+        const audit = transparencyStats.audit || {};
+        const feedback = transparencyStats.feedback || {};
+        
+        document.getElementById('totalDecisions').textContent = audit.total_decisions || 0;
+        document.getElementById('highRiskPercent').textContent = (audit.high_risk_percentage || 0) + '%';
+        document.getElementById('mediumRiskPercent').textContent = (audit.medium_risk_percentage || 0) + '%';
+        document.getElementById('highRiskCount').textContent = '(' + (audit.high_risk_count || 0) + ')';
+        document.getElementById('mediumRiskCount').textContent = '(' + (audit.medium_risk_count || 0) + ')';
+        
+        document.getElementById('feedbackAccuracyPercent').textContent = (feedback.accuracy_percentage || 0).toFixed(1) + '%';
+        document.getElementById('feedbackCount').textContent = '(' + (feedback.total_feedback || 0) + ')';
+        
+        const categories = Object.entries(audit.category_counts || {})
+            .filter(([category, count]) => category !== 'normal content' && count)
+            .sort((a, b) => b[1] - a[1])
+            .slice(0, 3)
+            .map(([category, count]) => `${category} (${count})`);
+        document.getElementById('topCategories').textContent = categories.join(', ') || '-';
+        
+        // Update debug info
+        document.getElementById('debugInfo').textContent = JSON.stringify(transparencyStats, null, 2);
+    }
+    
+    // Load transparency statistics once (refresh button, or polling without the stream)
     async function loadTransparencyStats() {
         try {
-            const response = await fetch('/api/audit-stats');
+            const [response, feedbackResponse] = await Promise.all([
+                fetch('/api/audit-stats'), fetch('/api/feedback-stats')
+            ]);
             const data = await response.json();
             
             if (response.ok) {
-                // Update the transparency dashboard
-                document.getElementById('totalDecisions').textContent = data.total_decisions;
-                document.getElementById('highRiskPercent').textContent = data.high_risk_percentage + '%';
-                document.getElementById('mediumRiskPercent').textContent = data.medium_risk_percentage + '%';
-                document.getElementById('highRiskCount').textContent = '(' + data.high_risk_count + ')';
-                document.getElementById('mediumRiskCount').textContent = '(' + data.medium_risk_count + ')';
-                
-                // Update debug info
-                document.getElementById('debugInfo').textContent = JSON.stringify(data, null, 2);
+                transparencyStats.audit = data;
+                if (feedbackResponse.ok) {
+                    transparencyStats.feedback = await feedbackResponse.json();
+                }
+                renderTransparencyStats();
             } else {
                 console.error('Error loading stats:', data.error);
                 document.getElementById('debugInfo').textContent = 'Error: ' + (data.error || 'Unknown error');
@@ -0,0 +1,129 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when low-priority work is shed because the model queue is over budget"""
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Concurrency limit and queue-time budget in front of model inference.
+
+    Up to max_concurrency requests run the model at once; the rest wait. A request
+    whose expected wait (waiters x smoothed service time / concurrency) exceeds
+    queue_budget seconds, or that actually waits that long, is overloaded: normal
+    priority requests are admitted in degraded mode (rules only, no model) and
+    low priority requests are shed. Nothing is latched, so requests go back to
+    the model as soon as the queue drains.
+    """
+    def __init__(self, max_concurrency=2, queue_budget=0.5, max_queue=32):
+        self.max_concurrency = max_concurrency
+        self.queue_budget = queue_budget
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._service_time = 0.2  # EWMA of model time per request, seconds
+        self._recent_degraded = 0.0  # EWMA of the degraded-or-shed fraction
+        self.stats = {"requests": 0, "admitted": 0, "degraded": 0, "shed": 0}
+
+    @contextmanager
+    def admit(self, priority="normal"):
+        """
+        Hold a model slot for the duration of the block
+        Yields True when the caller should degrade to rule-only classification;
+        raises AdmissionRejectedError for shed low-priority requests
+        """
+        degraded = self._acquire(priority)
+        started = time.monotonic()
+        try:
+            yield degraded
+        finally:
+            if not degraded:
+                self._release(time.monotonic() - started)
+
+    def _acquire(self, priority):
+        deadline = time.monotonic() + self.queue_budget
+        with self._cond:
+            self.stats["requests"] += 1
+            if self._in_flight < self.max_concurrency and self._waiting == 0:
+                return self._admitted()
+
+            expected_wait = (self._waiting + 1) * self._service_time / self.max_concurrency
+            if expected_wait > self.queue_budget or self._waiting >= self.max_queue:
+                return self._overloaded(priority)
+
+            self._waiting += 1
+            try:
+                while self._in_flight >= self.max_concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return self._overloaded(priority)
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            return self._admitted()
+
+    def _admitted(self):
+        self._in_flight += 1
+        self.stats["admitted"] += 1
+        self._recent_degraded *= 0.98
+        return False
+
+    def _overloaded(self, priority):
+        self._recent_degraded = self._recent_degraded * 0.98 + 0.02
+        if priority == "low":
+            self.stats["shed"] += 1
+            raise AdmissionRejectedError(
+                "Server is overloaded, retry later",
+                retry_after=max(1, round(self._waiting * self._service_time / self.max_concurrency))
+            )
+        self.stats["degraded"] += 1
+        return True
+
+    def _release(self, elapsed):
+        with self._cond:
+            self._in_flight -= 1
+            self._service_time = 0.9 * self._service_time + 0.1 * elapsed
+            self._cond.notify()
+
+    def get_stats(self):
+        with self._cond:
+            requests = self.stats["requests"]
+            return {
+                **self.stats,
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                "max_concurrency": self.max_concurrency,
+                "queue_budget_ms": round(self.queue_budget * 1000),
+                "service_time_ms": round(self._service_time * 1000, 1),
+                "degraded_rate": round(self.stats["degraded"] / requests, 4) if requests else 0,
+                "shed_rate": round(self.stats["shed"] / requests, 4) if requests else 0,
+                "recent_overload_rate": round(self._recent_degraded, 4)
+            }
+
+
+# Test the admission controller
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    controller = AdmissionController(max_concurrency=2, queue_budget=0.3)
+
+    def handle(i):
+        try:
+            with controller.admit("low" if i % 4 == 0 else "normal") as degraded:
+                if not degraded:
+                    time.sleep(0.1)  # Stand-in for model inference
+                return "degraded" if degraded else "model"
+        except AdmissionRejectedError:
+            return "shed"
+
+    with ThreadPoolExecutor(32) as pool:
+        outcomes = list(pool.map(handle, range(200)))
+    print({outcome: outcomes.count(outcome) for outcome in set(outcomes)})
+    print("Stats:", controller.get_stats())
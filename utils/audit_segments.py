@@ -0,0 +1,364 @@
+import bisect
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from utils.file_store import FileLock, write_lines
+
+# A record address packs the segment number and the byte offset inside the
+# segment's uncompressed JSON Lines, so it survives compression of the segment
+_OFFSET_BITS = 40
+_SEGMENT_NAME = re.compile(r"segment-(\d{6})\.")
+BLOOM_BYTES = 1024
+BLOOM_HASHES = 3
+
+
+def make_address(segment, offset):
+    return (segment << _OFFSET_BITS) | offset
+
+
+def split_address(address):
+    return address >> _OFFSET_BITS, address & ((1 << _OFFSET_BITS) - 1)
+
+
+def end_of_day(value):
+    """An inclusive upper time bound: a date-only value covers that whole day (timestamps compare as ISO strings)"""
+    if value and 'T' not in value and ' ' not in value:
+        return value + 'T23:59:59.999999'
+    return value
+
+
+def _bloom_positions(user_id):
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=16).digest()
+    h1, h2 = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+    return [(h1 + i * h2) % (BLOOM_BYTES * 8) for i in range(BLOOM_HASHES)]
+
+
+def _entry_level(entry):
+    risk_score = entry.get('risk_score')
+    return risk_score.get('level', '') if isinstance(risk_score, dict) else ''
+
+
+def entry_category(entry):
+    """Highest-scoring category of an entry's classification"""
+    classification = entry.get('classification')
+    if not isinstance(classification, dict) or not classification:
+        return ''
+    return max(classification, key=classification.get)
+
+
+class AuditSegmentStore:
+    """
+    Audit history as numbered segments: one hot JSON Lines file plus gzip-compressed cold segments.
+
+    Every worker appends to the hot segment under a file lock. Once it passes
+    segment_max_bytes it is sealed: blocks of block_records lines are written as
+    independent gzip members, and a sparse index records each block's offsets,
+    timestamp range and risk-level counts, plus a bloom filter of its user IDs.
+    Queries skip whole segments and blocks using those summaries and decompress
+    only the blocks that can match. Only per-segment summaries stay in memory.
+
+    A read_only store (for offline tools next to a live service) never seals or
+    appends; it reads unsealed segments as they are.
+    """
+    def __init__(self, directory="audit_segments", segment_max_bytes=64 * 1024 * 1024,
+                 block_records=1024, read_only=False):
+        self.directory = directory
+        self.read_only = read_only
+        self.segment_max_bytes = segment_max_bytes
+        self.block_records = block_records
+        self.file_lock = FileLock(os.path.join(directory, "segments"))
+        self._lock = threading.Lock()
+        self._summaries = {}  # Sealed segment number -> summary from its index
+        self._block_cache = (None, None)  # Most recently used (segment, index, blooms)
+        if read_only:
+            if not os.path.isdir(directory):
+                raise FileNotFoundError(f"Audit segment directory {directory} does not exist")
+            return
+        os.makedirs(directory, exist_ok=True)
+        self._seal_pending()
+
+    def segment_path(self, segment, suffix):
+        return os.path.join(self.directory, f"segment-{segment:06d}.{suffix}")
+
+    def segment_numbers(self):
+        numbers = set()
+        for path in glob.glob(os.path.join(self.directory, "segment-*")):
+            match = _SEGMENT_NAME.match(os.path.basename(path))
+            if match:
+                numbers.add(int(match.group(1)))
+        return sorted(numbers)
+
+    def is_sealed(self, segment):
+        return os.path.exists(self.segment_path(segment, "index.json"))
+
+    def hot_segment(self):
+        """Number of the segment currently receiving appends"""
+        numbers = self.segment_numbers()
+        if not numbers:
+            return 0
+        return numbers[-1] + 1 if self.is_sealed(numbers[-1]) else numbers[-1]
+
+    def append(self, entries):
+        """Append entries to the hot segment; returns each entry's address"""
+        self._check_writable()
+        lines = [(json.dumps(entry) + "\n").encode() for entry in entries]
+        to_seal = None
+        with self.file_lock.exclusive():
+            segment = self.hot_segment()
+            path = self.segment_path(segment, "jsonl")
+            offsets = write_lines(path, lines)
+            if os.path.getsize(path) >= self.segment_max_bytes:
+                # Start the next segment now; compress this one outside the lock
+                open(self.segment_path(segment + 1, "jsonl"), 'ab').close()
+                to_seal = segment
+        if to_seal is not None:
+            sealer = threading.Thread(target=self.seal, args=(to_seal,), name="audit-sealer")
+            sealer.daemon = True
+            sealer.start()
+        return [make_address(segment, offset) for offset in offsets]
+
+    def _check_writable(self):
+        if self.read_only:
+            raise PermissionError(f"Audit segment store {self.directory} is opened read-only")
+
+    def _seal_pending(self):
+        """Seal full segments left behind by a crash or an interrupted sealer"""
+        hot = self.hot_segment()
+        for segment in self.segment_numbers():
+            if segment < hot and not self.is_sealed(segment):
+                self.seal(segment)
+
+    def seal(self, segment):
+        """Compress a full segment into gzip blocks with a sparse index"""
+        self._check_writable()
+        source = self.segment_path(segment, "jsonl")
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        blocks, blooms = [], bytearray()
+        summary = {'count': 0, 'levels': {}, 'categories': {}, 'min_timestamp': None, 'max_timestamp': None}
+        try:
+            with open(source, 'rb') as f, open(self.segment_path(segment, "jsonl.gz") + suffix, 'wb') as out:
+                offset = 0
+                while True:
+                    lines = [line for line in (f.readline() for _ in range(self.block_records)) if line]
+                    if not lines:
+                        break
+                    block, bloom = self._compress_block(lines, offset, out)
+                    blocks.append(block)
+                    blooms += bloom
+                    offset += block['size']
+                    self._merge_summary(summary, block)
+        except FileNotFoundError:
+            return  # Another worker sealed it first
+        summary['blocks'] = blocks
+
+        for name, data in (("jsonl.gz", None), ("users.bin", bytes(blooms)),
+                           ("index.json", json.dumps(summary).encode())):
+            target = self.segment_path(segment, name)
+            if data is not None:
+                with open(target + suffix, 'wb') as f:
+                    f.write(data)
+            os.replace(target + suffix, target)
+        try:
+            os.remove(source)
+        except FileNotFoundError:
+            pass
+        print(f"✅ Sealed audit segment {segment} ({summary['count']} entries, {len(blocks)} blocks)")
+
+    def _compress_block(self, lines, start, out):
+        levels, categories, bloom = {}, {}, bytearray(BLOOM_BYTES)
+        timestamps = []
+        for line in lines:
+            entry = json.loads(line)
+            level = _entry_level(entry)
+            levels[level] = levels.get(level, 0) + 1
+            category = entry_category(entry)
+            categories[category] = categories.get(category, 0) + 1
+            timestamps.append(str(entry.get('timestamp', '')))
+            for position in _bloom_positions(entry.get('user_id')):
+                bloom[position // 8] |= 1 << (position % 8)
+        data = b"".join(lines)
+        compressed = gzip.compress(data)
+        block = {
+            'start': start, 'size': len(data),
+            'position': out.tell(), 'length': len(compressed),
+            'count': len(lines), 'levels': levels, 'categories': categories,
+            'min_timestamp': min(timestamps), 'max_timestamp': max(timestamps)
+        }
+        out.write(compressed)
+        return block, bloom
+
+    def _merge_summary(self, summary, block):
+        summary['count'] += block['count']
+        for level, count in block['levels'].items():
+            summary['levels'][level] = summary['levels'].get(level, 0) + count
+        for category, count in block.get('categories', {}).items():
+            summary['categories'][category] = summary['categories'].get(category, 0) + count
+        if summary['min_timestamp'] is None or block['min_timestamp'] < summary['min_timestamp']:
+            summary['min_timestamp'] = block['min_timestamp']
+        if summary['max_timestamp'] is None or block['max_timestamp'] > summary['max_timestamp']:
+            summary['max_timestamp'] = block['max_timestamp']
+
+    def summary(self, segment):
+        """Counts and timestamp range of a sealed segment, cached in memory"""
+        with self._lock:
+            if segment not in self._summaries:
+                index = self._load_index(segment)
+                index.pop('blocks')
+                self._summaries[segment] = index
+            return self._summaries[segment]
+
+    def _load_index(self, segment):
+        with open(self.segment_path(segment, "index.json"), 'r') as f:
+            return json.load(f)
+
+    def _blocks(self, segment):
+        """Block index and user blooms of one sealed segment (the last one used is cached)"""
+        with self._lock:
+            cached_segment, cached = self._block_cache
+            if cached_segment == segment:
+                return cached
+        index = self._load_index(segment)
+        with open(self.segment_path(segment, "users.bin"), 'rb') as f:
+            blooms = f.read()
+        cached = (index['blocks'], [block['start'] for block in index['blocks']], blooms)
+        with self._lock:
+            self._block_cache = (segment, cached)
+        return cached
+
+    def _read_block(self, segment, block):
+        with open(self.segment_path(segment, "jsonl.gz"), 'rb') as f:
+            f.seek(block['position'])
+            return gzip.decompress(f.read(block['length']))
+
+    def read(self, addresses):
+        """Entries at the given addresses"""
+        entries = []
+        for address in addresses:
+            segment, offset = split_address(address)
+            line = self._read_hot_line(segment, offset)
+            if line is None and self.is_sealed(segment):
+                blocks, starts, _ = self._blocks(segment)
+                i = bisect.bisect_right(starts, offset) - 1
+                if i >= 0:
+                    data = self._read_block(segment, blocks[i])
+                    start = offset - blocks[i]['start']
+                    line = data[start:data.index(b"\n", start) + 1]
+            if line:
+                entries.append(json.loads(line))
+        return entries
+
+    def _read_hot_line(self, segment, offset):
+        try:
+            with open(self.segment_path(segment, "jsonl"), 'rb') as f:
+                f.seek(offset)
+                line = f.readline()
+                return line if line.endswith(b"\n") else None
+        except FileNotFoundError:
+            return None
+
+    def iter_hot(self, segment, offset):
+        """(offset, next offset, entry) for complete lines in an unsealed segment from offset on"""
+        try:
+            with open(self.segment_path(segment, "jsonl"), 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        return  # Batch still being written
+                    yield offset, offset + len(line), json.loads(line)
+                    offset += len(line)
+        except FileNotFoundError:
+            return
+
+    def query(self, start=None, end=None, user_id=None, level=None, cursor=None,
+              limit=100, max_blocks=64):
+        """
+        Entries matching the filters in write order, one page at a time
+        start/end are ISO timestamps; cursor is the next_cursor of the previous page.
+        At most max_blocks cold blocks are decompressed per page, so a sparse filter
+        can return a short page with a cursor to continue from.
+        """
+        segment, offset = split_address(int(cursor)) if cursor else (0, 0)
+        bloom_positions = _bloom_positions(user_id) if user_id is not None else None
+        entries, blocks_read = [], 0
+
+        def matches(entry):
+            timestamp = str(entry.get('timestamp', ''))
+            return ((start is None or timestamp >= start) and (end is None or timestamp <= end)
+                    and (user_id is None or str(entry.get('user_id')) == str(user_id))
+                    and (level is None or _entry_level(entry) == level))
+
+        def overlaps(summary):
+            return ((start is None or summary['max_timestamp'] is None or summary['max_timestamp'] >= start)
+                    and (end is None or summary['min_timestamp'] is None or summary['min_timestamp'] <= end)
+                    and (level is None or summary['levels'].get(level, 0) > 0))
+
+        for number in self.segment_numbers():
+            if number < segment:
+                continue
+            if number > segment:
+                offset = 0
+
+            if not self.is_sealed(number):
+                for _, offset, entry in self.iter_hot(number, offset):
+                    if matches(entry):
+                        entries.append(entry)
+                        if len(entries) == limit:
+                            return entries, str(make_address(number, offset))
+                if not self.is_sealed(number):
+                    continue
+                # Sealed while we were reading; continue from the compressed copy
+            if not overlaps(self.summary(number)):
+                continue
+
+            blocks, _, blooms = self._blocks(number)
+            for i, block in enumerate(blocks):
+                if block['start'] + block['size'] <= offset or not overlaps(block):
+                    continue
+                if bloom_positions is not None:
+                    bloom = blooms[i * BLOOM_BYTES:(i + 1) * BLOOM_BYTES]
+                    if not all(bloom[p // 8] & (1 << (p % 8)) for p in bloom_positions):
+                        continue
+                if blocks_read == max_blocks:
+                    return entries, str(make_address(number, max(offset, block['start'])))
+                blocks_read += 1
+
+                position = block['start']
+                for line in self._read_block(number, block).splitlines(keepends=True):
+                    position += len(line)
+                    if position > offset:
+                        entry = json.loads(line)
+                        if matches(entry):
+                            entries.append(entry)
+                            if len(entries) == limit:
+                                return entries, str(make_address(number, position))
+        return entries, None
+
+
+# Test the audit segment store
+if __name__ == "__main__":
+    import tempfile
+    import time
+    from datetime import datetime, timedelta
+
+    store = AuditSegmentStore(tempfile.mkdtemp(), segment_max_bytes=2 * 1024 * 1024)
+    base = datetime(2024, 1, 1)
+    start_time = time.time()
+    for batch in range(200):
+        store.append([{
+            'timestamp': (base + timedelta(seconds=batch * 500 + i)).isoformat(),
+            'user_id': f"user{(batch * 500 + i) % 5000}",
+            'risk_score': {'level': 'High' if i % 50 == 0 else 'Low'},
+            'action_taken': []
+        } for i in range(500)])
+    time.sleep(1)
+    print(f"Appended 100k entries in {time.time() - start_time:.2f}s, segments: {store.segment_numbers()}")
+
+    start_time = time.time()
+    page, cursor = store.query(user_id="user42", limit=10)
+    print(f"user42: {len(page)} entries, next cursor {cursor} ({time.time() - start_time:.3f}s)")
+    page, cursor = store.query(start=(base + timedelta(seconds=90000)).isoformat(), level='High', limit=5)
+    print("High after 25h:", [entry['timestamp'] for entry in page])
@@ -1,49 +1,154 @@
+import os
+import threading
 import pandas as pd
 import json
 from datetime import datetime
+from utils.fingerprint import content_fingerprint
+from utils.file_store import FileLock, append_csv_rows, read_csv_rows_at, read_csv_since
+
+DATASET_COLUMNS = [
+    'timestamp', 'content_hash', 'user_id', 'classification',
+    'risk_score', 'action_taken'
+]
 
 class DatasetManager:
-    def __init__(self, dataset_path="moderation_dataset.csv"):
+    """
+    Moderation dataset stored as a CSV file shared by every worker process
+    
+    Rows are appended under an exclusive file lock rather than rewriting the file;
+    the DataFrame view is reloaded whenever the file has grown, so it includes
+    rows written by other workers. Fingerprint index offsets are byte offsets.
+    """
+    def __init__(self, dataset_path="moderation_dataset.csv", fingerprint_index=None, store_content=False,
+                 snapshot_store=None):
         self.dataset_path = dataset_path
-        self.dataset = self._load_dataset()
+        self.fingerprint_index = fingerprint_index
+        # Keep the raw text so classifiers can be trained from the dataset
+        self.store_content = store_content
+        self.file_lock = FileLock(dataset_path)
+        self._lock = threading.Lock()
+        self._dataset = None
+        self._loaded_size = -1
+        # Running stats, restored from the latest snapshot and advanced by tailing the file
+        self.snapshot_store = snapshot_store
+        self._stats_lock = threading.Lock()
+        self._stats = {'total_entries': 0, 'last_entry': None, 'offset': 0}
+        if snapshot_store is not None:
+            _, meta = snapshot_store.load("dataset_stats")
+            if meta is not None and self.matches_snapshot(meta.pop('dataset', None), meta['offset']):
+                self._stats = meta
+    
+    def file_identity(self):
+        """Which dataset file byte offsets refer to: absolute path and inode (None before it exists)"""
+        try:
+            inode = os.stat(self.dataset_path).st_ino
+        except FileNotFoundError:
+            inode = None
+        return {'path': os.path.abspath(self.dataset_path), 'inode': inode}
+    
+    def matches_snapshot(self, identity, offset):
+        """
+        True if a snapshot taken at byte offset of the dataset file with this identity
+        still applies: same path, same file (not replaced) and not truncated below offset
+        """
+        current = self.file_identity()
+        if not identity or identity.get('path') != current['path']:
+            return False
+        if identity.get('inode') is not None and identity['inode'] != current['inode']:
+            return False
+        return offset <= self._file_size()
+    
+    @property
+    def dataset(self):
+        """The dataset as a DataFrame, reloaded when any worker has appended to it"""
+        with self._lock:
+            size = self._file_size()
+            if size != self._loaded_size:
+                self._dataset = self._load_dataset()
+                self._loaded_size = size
+            return self._dataset
+    
+    def _file_size(self):
+        try:
+            return os.path.getsize(self.dataset_path)
+        except FileNotFoundError:
+            return 0
     
     def _load_dataset(self):
         """Load or create moderation dataset"""
         try:
-            return pd.read_csv(self.dataset_path)
-        except FileNotFoundError:
+            with self.file_lock.shared():
+                return pd.read_csv(self.dataset_path)
+        except (FileNotFoundError, pd.errors.EmptyDataError):
             # Create new dataset with columns
-            return pd.DataFrame(columns=[
-                'timestamp', 'content_hash', 'user_id', 'classification', 
-                'risk_score', 'action_taken'
-            ])
+            return pd.DataFrame(columns=DATASET_COLUMNS)
     
-    def add_to_dataset(self, content, user_id, classification, risk_score, action):
-        """Add moderation decision to dataset for training"""
-        new_entry = {
+    def build_entry(self, content, user_id, classification, risk_score, action, fingerprint=None):
+        """Build a dataset row without persisting it"""
+        entry = {
             'timestamp': datetime.now().isoformat(),
-            'content_hash': hash(content),
+            'content_hash': fingerprint or content_fingerprint(content),
             'user_id': user_id,
             'classification': json.dumps(classification),
             'risk_score': json.dumps(risk_score),
             'action_taken': json.dumps(action)
         }
-        
-        # Convert to DataFrame and append
-        new_df = pd.DataFrame([new_entry])
-        self.dataset = pd.concat([self.dataset, new_df], ignore_index=True)
-        self._save_dataset()
+        if self.store_content:
+            entry['content'] = content
+        return entry
+    
+    def add_entries(self, entries):
+        """Append a batch of dataset rows in one locked write"""
+        self.index_entries(entries, self.append_entries(entries))
         return True
     
-    def _save_dataset(self):
-        """Save dataset to CSV"""
-        self.dataset.to_csv(self.dataset_path, index=False)
+    def append_entries(self, entries):
+        """Append a batch of dataset rows without indexing them; returns their byte offsets"""
+        return append_csv_rows(self.dataset_path, entries, DATASET_COLUMNS, self.file_lock)
+    
+    def index_entries(self, entries, offsets):
+        """Record already-appended rows in the fingerprint index (safe to retry)"""
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.add("dataset", [
+                (entry['content_hash'], offset) for entry, offset in zip(entries, offsets)
+            ])
+    
+    def get_rows(self, offsets):
+        """Dataset rows at the given byte offsets"""
+        return read_csv_rows_at(self.dataset_path, offsets, self.file_lock)
+    
+    def read_since(self, offset):
+        """Rows appended after byte offset by any worker, and the offset to continue from"""
+        return read_csv_since(self.dataset_path, offset, self.file_lock)
+    
+    def add_to_dataset(self, content, user_id, classification, risk_score, action, fingerprint=None):
+        """Add moderation decision to dataset for training"""
+        new_entry = self.build_entry(content, user_id, classification, risk_score, action, fingerprint)
+        return self.add_entries([new_entry])
+    
+    def _refresh_stats(self):
+        """Count rows appended since the last refresh, by this or any other worker"""
+        with self._stats_lock:
+            rows, offset = self.read_since(self._stats['offset'])
+            for _, row in rows:
+                timestamp = row.get('timestamp')
+                if timestamp and (self._stats['last_entry'] is None or timestamp > self._stats['last_entry']):
+                    self._stats['last_entry'] = timestamp
+            self._stats['total_entries'] += len(rows)
+            self._stats['offset'] = offset
+            return dict(self._stats)
+    
+    def snapshot(self):
+        """Save the running stats with the file offset they cover"""
+        if self.snapshot_store is not None:
+            self.snapshot_store.save("dataset_stats", {}, {**self._refresh_stats(), 'dataset': self.file_identity()})
     
     def get_dataset_stats(self):
         """Get statistics about the collected dataset"""
+        stats = self._refresh_stats()
         return {
-            "total_entries": len(self.dataset),
-            "last_entry": self.dataset['timestamp'].max() if not self.dataset.empty else "No entries"
+            "total_entries": stats['total_entries'],
+            "last_entry": stats['last_entry'] or "No entries"
         }
 
 # Test the dataset manager
@@ -0,0 +1,326 @@
+import base64
+import glob
+import json
+import os
+import struct
+import time
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from dotenv import load_dotenv
+
+from utils.file_store import FileLock
+
+load_dotenv()
+
+MAGIC = b"CMSEG1"
+TRAILER_MAGIC = b"CMSEGEND"
+VERSION = 1
+NONCE_PREFIX_SIZE = 8
+_LENGTH = struct.Struct(">I")
+_TRAILER = struct.Struct(">QI8s")  # Index offset, index chunk number, magic
+
+
+class Keyring:
+    """
+    Segment encryption keys by ID
+
+    New segments are written with the active key; every segment records its key ID,
+    so rotating the active key never requires re-encrypting older segments.
+    """
+    def __init__(self, keys, active_key_id):
+        if active_key_id not in keys:
+            raise ValueError(f"Active key {active_key_id!r} is not in the keyring")
+        for key_id, key in keys.items():
+            if len(key) not in (16, 24, 32):
+                raise ValueError(f"Key {key_id!r} must be 128, 192 or 256 bits")
+        self.keys = keys
+        self.active_key_id = active_key_id
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build the keyring from SEGMENT_KEYS ("id:base64key,id:base64key")
+        and SEGMENT_ACTIVE_KEY; returns None when no keys are configured
+        """
+        spec = os.getenv('SEGMENT_KEYS', '').strip()
+        if not spec:
+            return None
+        keys = {}
+        for item in spec.split(','):
+            key_id, _, encoded = item.strip().partition(':')
+            keys[key_id] = base64.urlsafe_b64decode(encoded)
+        return cls(keys, os.getenv('SEGMENT_ACTIVE_KEY', next(reversed(keys))))
+
+    @staticmethod
+    def generate_key():
+        """New 256-bit key, base64 encoded for SEGMENT_KEYS"""
+        return base64.urlsafe_b64encode(AESGCM.generate_key(bit_length=256)).decode()
+
+    def get(self, key_id):
+        if key_id not in self.keys:
+            raise KeyError(f"Segment key {key_id!r} is not in the keyring")
+        return self.keys[key_id]
+
+
+class SegmentWriter:
+    """
+    Writes newline-delimited JSON records to one encrypted segment file.
+
+    Records are buffered into chunks of up to chunk_size bytes. Each chunk is
+    sealed with AES-GCM under nonce = segment nonce prefix + chunk number, and
+    the header, chunk number and final flag are bound in as associated data,
+    so reordered, dropped or truncated chunks fail to decrypt. close() appends
+    an encrypted chunk index and a trailer pointing at it, so readers can seek
+    straight to any chunk.
+    """
+    def __init__(self, path, keyring, chunk_size=64 * 1024):
+        key_id = keyring.active_key_id.encode()
+        self.path = path
+        self.chunk_size = chunk_size
+        self.cipher = AESGCM(keyring.get(keyring.active_key_id))
+        self.nonce_prefix = os.urandom(NONCE_PREFIX_SIZE)
+        self.header = (
+            MAGIC + bytes([VERSION, len(key_id)]) + key_id
+            + self.nonce_prefix + _LENGTH.pack(chunk_size)
+        )
+        self.file = open(path, 'xb')
+        self.file.write(self.header)
+        self.buffer = bytearray()
+        self.buffered_records = 0
+        self.buffered_since = None  # When the oldest buffered record was added
+        self.index = []  # [file offset, first record number, record count] per chunk
+        self.record_count = 0
+
+    def append_records(self, records):
+        """Serialise records into the chunk buffer, sealing chunks as they fill"""
+        # Serialise every record first so a record that cannot be encoded adds nothing
+        lines = [json.dumps(record, separators=(',', ':')).encode() + b"\n" for record in records]
+        for line in lines:
+            if self.buffer and len(self.buffer) + len(line) > self.chunk_size:
+                self._seal_chunk()
+            if not self.buffer:
+                self.buffered_since = time.monotonic()
+            self.buffer += line
+            self.buffered_records += 1
+
+    def sync(self):
+        """Push sealed chunks to disk; the partial chunk stays buffered"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def flush(self):
+        """Seal any partial chunk and push it to disk"""
+        if self.buffer:
+            self._seal_chunk()
+        self.sync()
+
+    def size(self):
+        return self.file.tell() + len(self.buffer)
+
+    def _seal_chunk(self, final=False, plaintext=None):
+        chunk_number = len(self.index)
+        if plaintext is None:
+            plaintext = bytes(self.buffer)
+            self.index.append([self.file.tell(), self.record_count, self.buffered_records])
+            self.record_count += self.buffered_records
+            self.buffer.clear()
+            self.buffered_records = 0
+        nonce = self.nonce_prefix + struct.pack(">I", chunk_number)
+        aad = self.header + struct.pack(">I?", chunk_number, final)
+        ciphertext = self.cipher.encrypt(nonce, plaintext, aad)
+        self.file.write(_LENGTH.pack(len(ciphertext)) + ciphertext)
+
+    def close(self):
+        """Seal the last chunk, write the chunk index and the trailer"""
+        if self.file.closed:
+            return
+        if self.buffer:
+            self._seal_chunk()
+        index_offset = self.file.tell()
+        self._seal_chunk(final=True, plaintext=json.dumps(self.index).encode())
+        self.file.write(_TRAILER.pack(index_offset, len(self.index), TRAILER_MAGIC))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+class SegmentReader:
+    """Reads an encrypted segment, sequentially or by chunk via the chunk index"""
+    def __init__(self, path, keyring):
+        self.path = path
+        self.file = open(path, 'rb')
+        magic = self.file.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an encrypted segment")
+        version, key_id_length = self.file.read(2)
+        key_id = self.file.read(key_id_length).decode()
+        self.nonce_prefix = self.file.read(NONCE_PREFIX_SIZE)
+        (self.chunk_size,) = _LENGTH.unpack(self.file.read(_LENGTH.size))
+        self.data_start = self.file.tell()
+        self.header = (
+            MAGIC + bytes([version, key_id_length]) + key_id.encode()
+            + self.nonce_prefix + _LENGTH.pack(self.chunk_size)
+        )
+        self.key_id = key_id
+        self.cipher = AESGCM(keyring.get(key_id))
+        self.index = self._read_index()
+
+    def _read_index(self):
+        """Chunk index from the trailer, or None for a segment that was never closed"""
+        self.file.seek(0, os.SEEK_END)
+        end = self.file.tell()
+        if end - self.data_start < _TRAILER.size:
+            return None
+        self.file.seek(end - _TRAILER.size)
+        index_offset, index_chunk, magic = _TRAILER.unpack(self.file.read(_TRAILER.size))
+        if magic != TRAILER_MAGIC:
+            return None
+        self.file.seek(index_offset)
+        return json.loads(self._decrypt(index_chunk, self._read_ciphertext(), final=True))
+
+    def _read_ciphertext(self):
+        length_bytes = self.file.read(_LENGTH.size)
+        if len(length_bytes) < _LENGTH.size:
+            return None
+        (length,) = _LENGTH.unpack(length_bytes)
+        return self.file.read(length)
+
+    def _decrypt(self, chunk_number, ciphertext, final=False):
+        nonce = self.nonce_prefix + struct.pack(">I", chunk_number)
+        aad = self.header + struct.pack(">I?", chunk_number, final)
+        return self.cipher.decrypt(nonce, ciphertext, aad)
+
+    def read_chunk(self, chunk_number):
+        """Decrypt one chunk by number and return its records"""
+        self.file.seek(self.index[chunk_number][0])
+        return self._parse(self._decrypt(chunk_number, self._read_ciphertext()))
+
+    def iter_records(self, start_record=0):
+        """Yield records from start_record on, seeking past earlier chunks"""
+        if self.index is None:
+            yield from self._iter_unindexed(start_record)
+            return
+        for chunk_number, (_, first_record, count) in enumerate(self.index):
+            if first_record + count <= start_record:
+                continue
+            records = self.read_chunk(chunk_number)
+            yield from records[max(0, start_record - first_record):]
+
+    def _iter_unindexed(self, start_record):
+        """Sequential scan for segments left open by a crash; stops at the first torn chunk"""
+        self.file.seek(self.data_start)
+        chunk_number = 0
+        record_number = 0
+        while True:
+            ciphertext = self._read_ciphertext()
+            if ciphertext is None:
+                return
+            try:
+                records = self._parse(self._decrypt(chunk_number, ciphertext))
+            except Exception:
+                return
+            for record in records:
+                if record_number >= start_record:
+                    yield record
+                record_number += 1
+            chunk_number += 1
+
+    def _parse(self, plaintext):
+        return [json.loads(line) for line in plaintext.splitlines() if line]
+
+    def close(self):
+        self.file.close()
+
+
+class EncryptedSegmentStore:
+    """
+    Directory of encrypted segments, rolled over once a segment reaches segment_max_bytes
+
+    Chunks are sealed when full, so their size does not depend on how records are
+    batched. A partial chunk is sealed once its oldest record has waited
+    flush_interval seconds (on the next append or flush_due()), which bounds how
+    many records a crash can lose from the archive.
+    """
+    def __init__(self, directory, keyring, segment_max_bytes=64 * 1024 * 1024, chunk_size=64 * 1024,
+                 flush_interval=1.0):
+        self.directory = directory
+        self.keyring = keyring
+        self.segment_max_bytes = segment_max_bytes
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.writer = None
+        os.makedirs(directory, exist_ok=True)
+        # Workers sharing the directory claim segment numbers under this lock
+        self.file_lock = FileLock(os.path.join(directory, "segments"))
+
+    def _segment_paths(self):
+        return sorted(glob.glob(os.path.join(self.directory, "segment-*.cmseg")))
+
+    def _open_writer(self):
+        with self.file_lock.exclusive():
+            paths = self._segment_paths()
+            next_number = int(os.path.basename(paths[-1])[8:14]) + 1 if paths else 0
+            path = os.path.join(self.directory, f"segment-{next_number:06d}.cmseg")
+            self.writer = SegmentWriter(path, self.keyring, self.chunk_size)
+
+    def append_records(self, records):
+        """Append a batch of records; full chunks are made durable straight away"""
+        if self.writer is None:
+            self._open_writer()
+        sealed_end = self.writer.file.tell()
+        self.writer.append_records(records)
+        if not self.flush_due() and self.writer.file.tell() != sealed_end:
+            self.writer.sync()
+        if self.writer.size() >= self.segment_max_bytes:
+            self.writer.close()
+            self.writer = None
+
+    def flush_due(self):
+        """Seal and sync the partial chunk if its oldest record has waited flush_interval; True if it did"""
+        writer = self.writer
+        if writer is None or not writer.buffer:
+            return False
+        if time.monotonic() - writer.buffered_since < self.flush_interval:
+            return False
+        writer.flush()
+        return True
+
+    def iter_records(self):
+        """Yield every record in write order"""
+        for path in self._segment_paths():
+            reader = SegmentReader(path, self.keyring)
+            try:
+                yield from reader.iter_records()
+            finally:
+                reader.close()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+# Test the encrypted segment store
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    directory = tempfile.mkdtemp()
+    old_keys = Keyring({"k1": base64.urlsafe_b64decode(Keyring.generate_key())}, "k1")
+    store = EncryptedSegmentStore(directory, old_keys, segment_max_bytes=1024 * 1024)
+    start = time.time()
+    for batch in range(100):
+        store.append_records([{"batch": batch, "n": i, "text": "x" * 100} for i in range(1000)])
+    store.close()
+    print(f"Wrote 100k records in {time.time() - start:.2f}s")
+
+    # Rotate: add a new active key, keep the old one for reading
+    rotated = Keyring({**old_keys.keys, "k2": base64.urlsafe_b64decode(Keyring.generate_key())}, "k2")
+    store = EncryptedSegmentStore(directory, rotated, segment_max_bytes=1024 * 1024)
+    store.append_records([{"after_rotation": True}])
+    store.close()
+
+    start = time.time()
+    count = sum(1 for _ in store.iter_records())
+    print(f"Read {count} records from {len(store._segment_paths())} segments in {time.time() - start:.2f}s")
+    reader = SegmentReader(store._segment_paths()[0], rotated)
+    print("Record 2500 via chunk index:", next(reader.iter_records(start_record=2500))["n"])
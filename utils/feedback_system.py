@@ -1,50 +1,93 @@
 import json
+import os
+import sqlite3
+import threading
 import pandas as pd
 from datetime import datetime
-import hashlib
+from utils.fingerprint import content_fingerprint
+from utils.file_store import FileLock, append_csv_rows, read_csv_rows_at
+
+FEEDBACK_COLUMNS = [
+    'timestamp', 'content_hash', 'user_id', 'accurate', 
+    'notes', 'expected_classification', 'expected_action'
+]
+
+_TRUE = ('true', '1', 'yes')
+_FALSE = ('false', '0', 'no')
+
+def parse_accurate(value):
+    """
+    The 'accurate' flag as a bool: JSON booleans and numbers as-is, strings from
+    forms or CSV ("false", "0", "no") by value rather than truthiness
+    """
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return False
+        raise ValueError(f"accurate must be true or false, got {value!r}")
+    return bool(value)
 
 class FeedbackSystem:
-    def __init__(self, feedback_file="feedback_data.csv"):
+    """
+    Feedback stored in a CSV file that several worker processes append to under a
+    file lock; the DataFrame view is reloaded whenever the file has grown
+    """
+    def __init__(self, feedback_file="feedback_data.csv", fingerprint_index=None):
         self.feedback_file = feedback_file
-        self.feedback_data = self._load_feedback()
+        self.fingerprint_index = fingerprint_index
+        self.file_lock = FileLock(feedback_file)
+        self._lock = threading.Lock()
+        self._feedback_data = None
+        self._loaded_size = -1
+    
+    @property
+    def feedback_data(self):
+        """Feedback as a DataFrame, including rows recorded by other workers"""
+        with self._lock:
+            size = os.path.getsize(self.feedback_file) if os.path.exists(self.feedback_file) else 0
+            if size != self._loaded_size:
+                self._feedback_data = self._load_feedback()
+                self._loaded_size = size
+            return self._feedback_data
     
     def _load_feedback(self):
         """Load feedback data from file"""
         try:
-            return pd.read_csv(self.feedback_file)
-        except FileNotFoundError:
-            return pd.DataFrame(columns=[
-                'timestamp', 'content_hash', 'user_id', 'accurate', 
-                'notes', 'expected_classification', 'expected_action'
-            ])
+            with self.file_lock.shared():
+                return pd.read_csv(self.feedback_file)
+        except (FileNotFoundError, pd.errors.EmptyDataError):
+            return pd.DataFrame(columns=FEEDBACK_COLUMNS)
     
     def record_feedback(self, content, user_id, accurate, notes="", 
-                       expected_classification=None, expected_action=None):
+                       expected_classification=None, expected_action=None, fingerprint=None):
         """Record user feedback about moderation accuracy"""
         feedback_entry = {
             'timestamp': datetime.now().isoformat(),
-            'content_hash': hashlib.sha256(content.encode()).hexdigest(),
+            'content_hash': fingerprint or content_fingerprint(content),
             'user_id': user_id,
-            'accurate': accurate,
+            'accurate': parse_accurate(accurate),
             'notes': notes,
             'expected_classification': json.dumps(expected_classification) if expected_classification else None,
             'expected_action': json.dumps(expected_action) if expected_action else None
         }
         
-        # Add to DataFrame
-        new_df = pd.DataFrame([feedback_entry])
-        self.feedback_data = pd.concat([self.feedback_data, new_df], ignore_index=True)
-        self._save_feedback()
+        # Append to the shared file
+        offsets = append_csv_rows(self.feedback_file, [feedback_entry], FEEDBACK_COLUMNS, self.file_lock)
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.add("feedback", [(feedback_entry['content_hash'], offsets[0])])
         
         return True
     
-    def _save_feedback(self):
-        """Save feedback data to file"""
-        self.feedback_data.to_csv(self.feedback_file, index=False)
+    def get_rows(self, offsets):
+        """Feedback rows at the given byte offsets"""
+        return read_csv_rows_at(self.feedback_file, offsets, self.file_lock)
     
     def get_feedback_stats(self):
         """Calculate accuracy metrics from feedback"""
-        if self.feedback_data.empty:
+        feedback_data = self.feedback_data
+        if feedback_data.empty:
             return {
                 'total_feedback': 0,
                 'accuracy_percentage': 0,
@@ -52,8 +95,8 @@ class FeedbackSystem:
                 'inaccuracy_count': 0
             }
         
-        accurate_count = len(self.feedback_data[self.feedback_data['accurate'] == True])
-        total_feedback = len(self.feedback_data)
+        accurate_count = len(feedback_data[feedback_data['accurate'] == True])
+        total_feedback = len(feedback_data)
         
         return {
             'total_feedback': total_feedback,
@@ -62,18 +105,20 @@ class FeedbackSystem:
             'inaccuracy_count': total_feedback - accurate_count
         }
     
-    def export_training_data(self):
+    def export_training_data(self, auditor=None):
         """
         Prepare misclassified examples for model retraining
-        Returns examples where users indicated inaccuracies
+        Returns examples where users indicated inaccuracies; with an auditor and a
+        fingerprint index, each example also carries the decision it refers to
         """
-        if self.feedback_data.empty:
+        feedback_data = self.feedback_data
+        if feedback_data.empty:
             return []
         
         # Get inaccurate classifications with expected outcomes
-        inaccurate_feedback = self.feedback_data[
-            (self.feedback_data['accurate'] == False) &
-            (self.feedback_data['expected_classification'].notna())
+        inaccurate_feedback = feedback_data[
+            (feedback_data['accurate'] == False) &
+            (feedback_data['expected_classification'].notna())
         ]
         
         training_examples = []
@@ -87,14 +132,185 @@ class FeedbackSystem:
             if pd.notna(row['expected_action']):
                 example['expected_action'] = json.loads(row['expected_action'])
             
+            if auditor is not None and self.fingerprint_index is not None:
+                audit_offsets = self.fingerprint_index.lookup(row['content_hash']).get('audit', [])
+                decisions = auditor.get_entries(audit_offsets[-1:])
+                example['decision'] = decisions[0] if decisions else None
+            
             training_examples.append(example)
         
         return training_examples
     
     def get_recent_feedback(self, limit=10):
         """Get most recent feedback entries"""
-        if self.feedback_data.empty:
+        feedback_data = self.feedback_data
+        if feedback_data.empty:
             return []
         
-        recent = self.feedback_data.sort_values('timestamp', ascending=False).head(limit)
-        return recent.to_dict('records')
\ No newline at end of file
+        recent = feedback_data.sort_values('timestamp', ascending=False).head(limit)
+        return recent.to_dict('records')
+
+class SQLiteFeedbackSystem:
+    """
+    FeedbackSystem backed by an embedded SQLite database in WAL mode
+
+    Inserts are single prepared statements, stats are aggregate queries and exports
+    stream through a cursor, so several worker processes can record feedback at once.
+    """
+    def __init__(self, db_path="feedback.db", fingerprint_index=None, import_csv="feedback_data.csv"):
+        self.db_path = db_path
+        self.fingerprint_index = fingerprint_index
+        self._local = threading.local()
+        self._create_schema()
+        if import_csv and os.path.exists(import_csv):
+            self._import_csv(import_csv)
+    
+    def _connection(self):
+        """One connection per thread; WAL lets readers run alongside the writer"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def _create_schema(self):
+        conn = self._connection()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS feedback (
+                id INTEGER PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                user_id TEXT,
+                accurate INTEGER NOT NULL,
+                notes TEXT,
+                expected_classification TEXT,
+                expected_action TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp);
+            CREATE INDEX IF NOT EXISTS idx_feedback_content_hash ON feedback (content_hash);
+            CREATE INDEX IF NOT EXISTS idx_feedback_accurate ON feedback (accurate);
+        """)
+        conn.commit()
+    
+    def _import_csv(self, csv_path):
+        """One-off import of feedback recorded by the CSV backend"""
+        # Workers start together; the lock makes sure only the first one imports
+        with FileLock(self.db_path).exclusive():
+            conn = self._connection()
+            if conn.execute("SELECT EXISTS (SELECT 1 FROM feedback)").fetchone()[0]:
+                return
+            self._import_rows(conn, csv_path)
+    
+    def _import_rows(self, conn, csv_path):
+        # user_id as text, as the CSV backend kept it: read as numbers, 123 would import as 123.0
+        legacy = pd.read_csv(csv_path, dtype={'user_id': str})
+        rows = [
+            (
+                str(row['timestamp']), str(row['content_hash']),
+                None if pd.isna(row['user_id']) else str(row['user_id']),
+                int(str(row['accurate']).strip().lower() in _TRUE),
+                None if pd.isna(row['notes']) else row['notes'],
+                None if pd.isna(row['expected_classification']) else row['expected_classification'],
+                None if pd.isna(row['expected_action']) else row['expected_action']
+            )
+            for row in legacy.to_dict('records')
+        ]
+        with conn:
+            conn.executemany(_INSERT_FEEDBACK, rows)
+        print(f"Imported {len(rows)} feedback entries from {csv_path}")
+    
+    def record_feedback(self, content, user_id, accurate, notes="", 
+                       expected_classification=None, expected_action=None, fingerprint=None):
+        """Record user feedback about moderation accuracy"""
+        content_hash = fingerprint or content_fingerprint(content)
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(_INSERT_FEEDBACK, (
+                datetime.now().isoformat(),
+                content_hash,
+                None if user_id is None else str(user_id),
+                int(parse_accurate(accurate)),
+                notes,
+                json.dumps(expected_classification) if expected_classification else None,
+                json.dumps(expected_action) if expected_action else None
+            ))
+        if self.fingerprint_index is not None:
+            self.fingerprint_index.add("feedback", [(content_hash, cursor.lastrowid)])
+        
+        return True
+    
+    def get_rows(self, offsets):
+        """Feedback rows by ID"""
+        if not offsets:
+            return []
+        placeholders = ",".join("?" * len(offsets))
+        rows = self._connection().execute(
+            f"SELECT * FROM feedback WHERE id IN ({placeholders}) ORDER BY id", list(offsets)
+        )
+        return [self._row_to_dict(row) for row in rows]
+    
+    def get_feedback_stats(self):
+        """Calculate accuracy metrics from feedback"""
+        total_feedback, accurate_count = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(accurate), 0) FROM feedback"
+        ).fetchone()
+        
+        return {
+            'total_feedback': total_feedback,
+            'accuracy_percentage': (accurate_count / total_feedback * 100) if total_feedback > 0 else 0,
+            'accuracy_count': accurate_count,
+            'inaccuracy_count': total_feedback - accurate_count
+        }
+    
+    def iter_training_data(self, auditor=None):
+        """Stream misclassified examples with expected outcomes, one row at a time"""
+        cursor = self._connection().execute(
+            "SELECT content_hash, expected_classification, expected_action, notes FROM feedback "
+            "WHERE accurate = 0 AND expected_classification IS NOT NULL ORDER BY id"
+        )
+        for row in cursor:
+            example = {
+                'content_hash': row['content_hash'],
+                'expected_classification': json.loads(row['expected_classification']),
+                'notes': row['notes']
+            }
+            
+            if row['expected_action'] is not None:
+                example['expected_action'] = json.loads(row['expected_action'])
+            
+            if auditor is not None and self.fingerprint_index is not None:
+                audit_offsets = self.fingerprint_index.lookup(row['content_hash']).get('audit', [])
+                decisions = auditor.get_entries(audit_offsets[-1:])
+                example['decision'] = decisions[0] if decisions else None
+            
+            yield example
+    
+    def export_training_data(self, auditor=None):
+        """
+        Prepare misclassified examples for model retraining
+        Returns examples where users indicated inaccuracies
+        """
+        return list(self.iter_training_data(auditor))
+    
+    def get_recent_feedback(self, limit=10):
+        """Get most recent feedback entries (served from the timestamp index)"""
+        rows = self._connection().execute(
+            "SELECT * FROM feedback ORDER BY timestamp DESC LIMIT ?", (limit,)
+        )
+        return [self._row_to_dict(row) for row in rows]
+    
+    def _row_to_dict(self, row):
+        record = dict(row)
+        record['accurate'] = bool(record['accurate'])
+        return record
+
+
+_INSERT_FEEDBACK = """
+    INSERT INTO feedback (
+        timestamp, content_hash, user_id, accurate, notes,
+        expected_classification, expected_action
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
@@ -0,0 +1,147 @@
+import csv
+import fcntl
+import io
+import os
+from contextlib import contextmanager
+
+
+class FileLock:
+    """
+    Advisory lock on path + ".lock", shared between processes and threads
+
+    Every acquisition opens its own descriptor, so flock() excludes other
+    threads of the same process as well as other worker processes.
+    """
+    def __init__(self, path):
+        self.lock_path = path + ".lock"
+
+    @contextmanager
+    def _locked(self, operation):
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, operation)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def exclusive(self):
+        """Held by writers"""
+        return self._locked(fcntl.LOCK_EX)
+
+    def shared(self):
+        """Held by readers that must not see a half-written batch"""
+        return self._locked(fcntl.LOCK_SH)
+
+
+def append_lines(path, lines, lock):
+    """
+    Append encoded lines in one write under the exclusive lock
+    Returns the byte offset of each line, stable across processes
+    """
+    with lock.exclusive():
+        return write_lines(path, lines)
+
+
+def write_lines(path, lines):
+    """Append lines with one write and fsync; the caller holds the exclusive lock"""
+    with open(path, 'ab') as f:
+        offset = f.seek(0, os.SEEK_END)
+        offsets = []
+        for line in lines:
+            offsets.append(offset)
+            offset += len(line)
+        f.write(b"".join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+    return offsets
+
+
+def read_header(path):
+    """Column names from the first row of a CSV file, or None if it has none yet"""
+    try:
+        with open(path, 'r', newline='') as f:
+            return next(csv.reader(f), None)
+    except FileNotFoundError:
+        return None
+
+
+def append_csv_rows(path, rows, default_columns, lock):
+    """
+    Append dict rows to a CSV file shared by several writers
+    The header is written by whichever writer creates the file; later rows follow
+    that header's column order. Returns the byte offset of each row.
+    """
+    with lock.exclusive():
+        columns = read_header(path)
+        lines = []
+        if columns is None:
+            columns = list(default_columns)
+            for row in rows:
+                columns.extend(key for key in row if key not in columns)
+            lines.append(_csv_line(columns))
+        for row in rows:
+            lines.append(_csv_line([row.get(column) for column in columns]))
+        offsets = write_lines(path, lines)
+    return offsets[len(lines) - len(rows):]
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(values)
+    return buffer.getvalue().encode()
+
+
+def read_csv_rows_at(path, offsets, lock):
+    """CSV rows (as dicts) starting at the given byte offsets"""
+    if not offsets:
+        return []
+    with lock.shared():
+        columns = read_header(path)
+        if columns is None:
+            return []
+        rows = []
+        with open(path, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            for offset in offsets:
+                if offset >= size:
+                    continue
+                f.seek(offset)
+                values = next(csv.reader(_decoded_lines(f)), None)
+                if values:
+                    rows.append(dict(zip(columns, values)))
+        return rows
+
+
+def read_csv_since(path, offset, lock):
+    """
+    Rows appended after byte offset, by any writer
+    Returns ([(row offset, row)], new offset); the header is skipped when reading from the start
+    """
+    if offset and os.path.getsize(path) <= offset:
+        return [], offset
+    with lock.shared():
+        columns = read_header(path)
+        if columns is None:
+            return [], offset
+        with open(path, 'rb') as f:
+            if offset == 0:
+                f.readline()  # Header
+            else:
+                f.seek(offset)
+            reader = csv.reader(_decoded_lines(f))
+            rows = []
+            while True:
+                # The line generator reads lazily, so tell() is at the next record's start
+                start = f.tell()
+                values = next(reader, None)
+                if values is None:
+                    break
+                if values:
+                    rows.append((start, dict(zip(columns, values))))
+            return rows, f.tell()
+
+
+def _decoded_lines(f):
+    for line in iter(f.readline, b""):
+        yield line.decode()
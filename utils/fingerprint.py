@@ -0,0 +1,78 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Optional secret so fingerprints can't be matched against guessed content outside this deployment
+_FINGERPRINT_KEY = os.getenv('FINGERPRINT_KEY', '').encode()[:64]
+
+
+def normalize_content(text):
+    """Canonical form used for fingerprinting: NFKC, case-folded, single-spaced"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', text).casefold()).strip()
+
+
+def content_fingerprint(text):
+    """
+    Canonical content fingerprint shared by the audit log, dataset and feedback
+    Keyed BLAKE2b over the normalized text, stable across processes and restarts
+    """
+    return hashlib.blake2b(
+        normalize_content(text).encode(), key=_FINGERPRINT_KEY, digest_size=16
+    ).hexdigest()
+
+
+class FingerprintIndex:
+    """
+    On-disk fingerprint -> (store, record offset) index
+
+    Each store registers the offset of every record it writes, so a decision can be
+    joined to its audit entry, dataset row and feedback with indexed lookups.
+    """
+    def __init__(self, db_path="fingerprint_index.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # Worker processes share the database; wait out another writer's commit
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS record_offsets (
+                fingerprint TEXT NOT NULL,
+                store TEXT NOT NULL,
+                record_offset INTEGER NOT NULL,
+                PRIMARY KEY (fingerprint, store, record_offset)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def add(self, store, entries):
+        """Register (fingerprint, offset) pairs written to a store"""
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO record_offsets VALUES (?, ?, ?)",
+                [(fingerprint, store, offset) for fingerprint, offset in entries]
+            )
+            self.conn.commit()
+
+    def lookup(self, fingerprint):
+        """Offsets per store for a fingerprint, oldest first"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT store, record_offset FROM record_offsets "
+                "WHERE fingerprint = ? ORDER BY store, record_offset",
+                (fingerprint,)
+            ).fetchall()
+        offsets = {}
+        for store, offset in rows:
+            offsets.setdefault(store, []).append(offset)
+        return offsets
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
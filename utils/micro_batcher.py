@@ -0,0 +1,170 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+
+class BatchQueueFullError(Exception):
+    """Raised when the micro-batcher already holds max_queue waiting items"""
+    pass
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent asyncio requests into batches run on an executor.
+
+    Items are queued per key (items with different keys never share a batch).
+    When an executor slot is free the oldest key's items, up to max_batch, go
+    out as one batch, after waiting at most max_wait seconds for it to fill.
+    While every slot is busy, items keep queueing, so batches grow with load
+    and the model runs at full batch size exactly when throughput matters.
+
+    run_batch(key, items) runs on the executor and returns one result per item.
+    A caller that is cancelled (timeout or client disconnect) while its item is
+    still queued is dropped from the batch; once a batch has started, its
+    result is simply discarded.
+    """
+    def __init__(self, run_batch, executor, concurrency=1, max_batch=32, max_wait=0.005, max_queue=10000):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.concurrency = concurrency
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._queues = OrderedDict()  # Key -> deque of (item, future, enqueued_at)
+        self._pending = 0
+        self._ready = None
+        self._slots = None
+        self._task = None
+        self.stats = {"submitted": 0, "batches": 0, "batched_items": 0, "max_batch_seen": 0,
+                      "cancelled": 0, "rejected": 0, "errors": 0}
+
+    def start(self):
+        """Start the dispatcher on the running event loop"""
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for queue in self._queues.values():
+            for _, future, _ in queue:
+                future.cancel()
+        self._queues.clear()
+        self._pending = 0
+
+    async def submit(self, item, key=None):
+        """Result of run_batch for item; raises BatchQueueFullError when the queue is full"""
+        self.start()
+        if self._pending >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise BatchQueueFullError(f"{self._pending} items already waiting for inference")
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append((item, future, time.monotonic()))
+        self._pending += 1
+        self.stats["submitted"] += 1
+        self._ready.set()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+
+    async def _dispatch(self):
+        while True:
+            await self._ready.wait()
+            await self._slots.acquire()
+            oldest = self._oldest()
+            if oldest is not None and self._pending < self.max_batch:
+                delay = oldest + self.max_wait - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)  # Let the batch fill
+            key, batch = self._take()
+            if not self._pending:
+                self._ready.clear()
+            if not batch:
+                self._slots.release()
+                continue
+            asyncio.get_running_loop().create_task(self._run(key, batch))
+
+    def _oldest(self):
+        heads = [queue[0][2] for queue in self._queues.values() if queue]
+        return min(heads) if heads else None
+
+    def _take(self):
+        """Up to max_batch live items of the key whose head waited longest"""
+        live = [(queue[0][2], key) for key, queue in self._queues.items() if queue]
+        if not live:
+            return None, []
+        _, key = min(live, key=lambda head: head[0])
+        queue = self._queues[key]
+        batch = []
+        while queue and len(batch) < self.max_batch:
+            item, future, _ = queue.popleft()
+            self._pending -= 1
+            if not future.done():
+                batch.append((item, future))
+        if not queue:
+            del self._queues[key]
+        return key, batch
+
+    async def _run(self, key, batch):
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.run_batch, key, [item for item, _ in batch]
+            )
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            self.stats["errors"] += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.stats["batches"] += 1
+            self.stats["batched_items"] += len(batch)
+            self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+            self._slots.release()
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "queued": self._pending,
+            "mean_batch": round(self.stats["batched_items"] / self.stats["batches"], 2) if self.stats["batches"] else 0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "concurrency": self.concurrency
+        }
+
+
+# Test the batcher: 1000 concurrent requests against a batch function with fixed overhead
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run_batch(key, items):
+        time.sleep(0.01 + 0.0005 * len(items))  # Per-batch overhead plus per-item cost
+        return [item * 2 for item in items]
+
+    async def main():
+        batcher = MicroBatcher(run_batch, ThreadPoolExecutor(1), max_batch=64)
+        started = time.monotonic()
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(1000)))
+        assert results == [i * 2 for i in range(1000)]
+        print(f"1000 requests in {time.monotonic() - started:.2f}s "
+              f"(unbatched would take {1000 * 0.0105:.1f}s)")
+
+        slow = asyncio.ensure_future(batcher.submit(1))
+        await asyncio.sleep(0)
+        slow.cancel()
+        await asyncio.sleep(0.01)
+        print("Stats:", batcher.get_stats())
+        await batcher.stop()
+
+    asyncio.run(main())
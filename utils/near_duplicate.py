@@ -0,0 +1,143 @@
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of recently moderated content.
+
+    Text is reduced to character shingles, fingerprinted with num_perm MinHash
+    values and bucketed by LSH bands. A lookup only compares the entries that
+    share a band bucket, so it costs the same regardless of index size. The
+    index holds at most max_entries items and evicts the least recently matched.
+
+    Entries carry a scope (e.g. the model that classified them) and a lookup
+    only matches entries of its own scope.
+    """
+    def __init__(self, threshold=0.9, num_perm=64, bands=16, shingle_size=5,
+                 max_entries=100000, seed=7):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_entries = max_entries
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=(num_perm, 1)).astype(np.uint64)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # Entry ID -> (signature, decision, scope), oldest first
+        self._buckets = [{} for _ in range(bands)]  # Band -> band key -> set of entry IDs
+        self._next_id = 0
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "evictions": 0
+        }
+        # Best candidate similarity per lookup, in 0.1 bins, for threshold tuning
+        self._similarity_histogram = [0] * 10
+
+    def signature(self, text):
+        """MinHash signature of the text's character shingles"""
+        normalized = re.sub(r'\s+', ' ', text.lower()).strip()
+        size = self.shingle_size
+        shingles = {normalized[i:i + size] for i in range(max(1, len(normalized) - size + 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        # (a * h + b) mod p for every permutation at once; a, b < 2^31 and h < 2^32 fit in uint64
+        return ((self._a * hashes + self._b) % _MERSENNE_PRIME).min(axis=1)
+
+    def query(self, signature, scope=None):
+        """
+        Find the most similar indexed decision within a scope
+        Returns {'similarity', 'classification', 'content_hash'} or None below the threshold
+        """
+        with self._lock:
+            self._stats["lookups"] += 1
+            candidates = set()
+            for band, key in enumerate(self._band_keys(signature, scope)):
+                candidates.update(self._buckets[band].get(key, ()))
+
+            best_id, best_similarity = None, 0.0
+            for entry_id in candidates:
+                similarity = float(np.mean(self._entries[entry_id][0] == signature))
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            if candidates:
+                self._similarity_histogram[min(int(best_similarity * 10), 9)] += 1
+            if best_id is None or best_similarity < self.threshold:
+                return None
+
+            self._stats["hits"] += 1
+            self._entries.move_to_end(best_id)
+            return {'similarity': best_similarity, **self._entries[best_id][1]}
+
+    def add(self, signature, classification, content_hash=None, scope=None):
+        """Index a decision, evicting the least recently used entry when full"""
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (
+                signature,
+                {'classification': classification, 'content_hash': content_hash},
+                scope
+            )
+            for band, key in enumerate(self._band_keys(signature, scope)):
+                self._buckets[band].setdefault(key, set()).add(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                old_id, (old_signature, _, old_scope) = self._entries.popitem(last=False)
+                for band, key in enumerate(self._band_keys(old_signature, old_scope)):
+                    bucket = self._buckets[band].get(key)
+                    if bucket is not None:
+                        bucket.discard(old_id)
+                        if not bucket:
+                            del self._buckets[band][key]
+                self._stats["evictions"] += 1
+
+    def _band_keys(self, signature, scope=None):
+        return [(scope, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def get_stats(self):
+        """Hit rate and similarity distribution for tuning the threshold"""
+        with self._lock:
+            lookups = self._stats["lookups"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "best_candidate_similarity": {
+                    f"{i / 10:.1f}-{(i + 1) / 10:.1f}": count
+                    for i, count in enumerate(self._similarity_histogram)
+                }
+            }
+
+
+# Test the near-duplicate index
+if __name__ == "__main__":
+    index = NearDuplicateIndex(threshold=0.7)
+    original = "Click here to claim your free prize, limited offer for today only!!!"
+    index.add(index.signature(original), {"spam": 0.8, "normal content": 0.2})
+
+    for text in [
+        "Click here to claim your FREE prize, limited offer for today only!",
+        "The weather is lovely today, let's go for a walk in the park",
+    ]:
+        print(text, "->", index.query(index.signature(text)))
+    print("Other scope ->", index.query(index.signature(original), scope="spanish-model"))
+    print("Stats:", index.get_stats())
@@ -5,6 +5,7 @@ from sumy.summarizers.lsa import LsaSummarizer
 from sumy.summarizers.text_rank import TextRankSummarizer
 import re
 from collections import Counter
+from utils.language_id import get_language_identifier
 
 class NLPTools:
     def __init__(self):
@@ -74,23 +75,12 @@ class NLPTools:
         return [keyword for keyword, count in keyword_counts.most_common(max_keywords)]
     
     def detect_language(self, text):
-        """Simple language detection based on common words"""
-        # Common words in different languages
-        language_indicators = {
-            'english': ['the', 'and', 'is', 'to', 'of'],
-            'spanish': ['el', 'la', 'de', 'que', 'y'],
-            'french': ['le', 'la', 'de', 'et', 'que'],
-            'german': ['der', 'die', 'das', 'und', 'ist']
-        }
-        
-        text_lower = text.lower()
-        scores = {}
-        
-        for lang, words in language_indicators.items():
-            scores[lang] = sum(1 for word in words if word in text_lower)
-        
-        # Return language with highest score
-        return max(scores.items(), key=lambda x: x[1])[0] if scores else 'unknown'
+        """Language of a text from character n-gram profiles ("unknown" when unsure)"""
+        return get_language_identifier().detect(text)
+    
+    def detect_languages(self, texts):
+        """Languages of a batch of texts in one vectorized pass"""
+        return get_language_identifier().detect_batch(texts)
     
     def calculate_readability(self, text):
         """Calculate simple readability score (Flesch-Kincaid approximation)"""
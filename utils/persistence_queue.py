@@ -0,0 +1,228 @@
+import threading
+import time
+from queue import Queue, Empty, Full
+
+_STOP = object()
+
+
+class PersistenceBackpressureError(Exception):
+    """Raised when the write-behind queue stays full for longer than the put timeout"""
+
+
+class PersistenceQueue:
+    """
+    Write-behind persistence for moderation decisions.
+
+    Request handlers enqueue decision records and return immediately; a single
+    writer thread drains the queue and group-commits every available record to
+    the audit log and the dataset in one pass (the retriever tails the dataset).
+
+    mode="async" is write-behind, mode="sync" commits on the caller's thread
+    for deployments that require the audit write before the response, and
+    raises to the caller when that write fails.
+    """
+    def __init__(self, auditor, dataset_manager, mode="async",
+                 max_size=1000, batch_size=64, put_timeout=2.0,
+                 audit_archive=None, dataset_archive=None, write_plaintext=True):
+        if mode not in ("async", "sync"):
+            raise ValueError(f"Unknown persistence mode: {mode}")
+        if not write_plaintext and (audit_archive is None or dataset_archive is None):
+            raise ValueError("Skipping the plaintext stores needs both encrypted stores")
+
+        self.auditor = auditor
+        self.dataset_manager = dataset_manager
+        # Optional EncryptedSegmentStores that receive every committed batch; with
+        # write_plaintext=False they are the only stores written
+        self.audit_archive = audit_archive
+        self.dataset_archive = dataset_archive
+        self.write_plaintext = write_plaintext
+        self.mode = mode
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self.queue = Queue(maxsize=max_size)
+        self._commit_lock = threading.Lock()
+        self.stats = {
+            "enqueued": 0,
+            "committed": 0,
+            "failed": 0,
+            "unindexed": 0,  # Written, but missing from the fingerprint index
+            "batches": 0,
+            "rejected": 0
+        }
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        """Start the background writer thread (no-op in sync mode)"""
+        if self.mode != "async" or self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="persistence-writer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def submit(self, record):
+        """
+        Persist a decision record
+        A record holds the 'audit_entry' and 'dataset_entry' built by the request handler
+        """
+        if self.mode == "sync" or not self.running:
+            # The caller waits for the write, so a failed write fails the request
+            self._commit([record], raise_errors=True)
+            return
+
+        try:
+            # Block for a bounded time so a slow disk pushes back on producers
+            self.queue.put(record, timeout=self.put_timeout)
+            self.stats["enqueued"] += 1
+        except Full:
+            self.stats["rejected"] += 1
+            raise PersistenceBackpressureError("Persistence queue is full, retry later")
+
+    def _run(self):
+        """Drain the queue, committing everything available as one batch"""
+        archives = [a for a in (self.audit_archive, self.dataset_archive) if a is not None]
+        while True:
+            try:
+                # Wake up while idle so archives can seal chunks that stopped filling
+                record = self.queue.get(timeout=0.5 if archives else None)
+            except Empty:
+                self._flush_archives(archives)
+                continue
+            stop = record is _STOP
+            batch = [] if stop else [record]
+
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except Empty:
+                    break
+                if record is _STOP:
+                    stop = True
+                else:
+                    batch.append(record)
+
+            if batch:
+                self._commit(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self.queue.task_done()
+            if stop:
+                break
+
+    def _commit(self, batch, raise_errors=False):
+        """
+        Write one batch to every store
+        Each store appends a batch all-or-nothing; when that fails the append is retried
+        one record at a time, so only records that cannot be written count as failed
+        (and skip the remaining stores). Fingerprint indexing is a separate step: when it
+        fails only the index write is retried, never the append, so no row is written twice.
+        With raise_errors the first write failure is raised.
+        """
+        stores = []
+        if self.write_plaintext:
+            stores += [(self.auditor.append_entries, self.auditor.index_entries, 'audit_entry'),
+                       (self.dataset_manager.append_entries, self.dataset_manager.index_entries, 'dataset_entry')]
+        if self.audit_archive is not None:
+            stores.append((self.audit_archive.append_records, None, 'audit_entry'))
+        if self.dataset_archive is not None:
+            stores.append((self.dataset_archive.append_records, None, 'dataset_entry'))
+
+        failed = {}  # Position in batch -> error
+        unindexed = 0
+        index_error = None
+        with self._commit_lock:
+            for append, index, field in stores:
+                positions = [i for i in range(len(batch)) if i not in failed]
+                if not positions:
+                    break
+                try:
+                    addresses = append([batch[i][field] for i in positions])
+                except Exception:
+                    written, addresses = [], []
+                    for i in positions:
+                        try:
+                            addresses.extend(append([batch[i][field]]) or [])
+                            written.append(i)
+                        except Exception as e:
+                            failed[i] = e
+                    positions = written
+                if index is None or not positions:
+                    continue
+                entries = [batch[i][field] for i in positions]
+                for _ in range(2):
+                    try:
+                        index(entries, addresses)
+                        break
+                    except Exception as e:
+                        index_error = e
+                else:
+                    unindexed += len(positions)
+            self.stats["committed"] += len(batch) - len(failed)
+            self.stats["failed"] += len(failed)
+            self.stats["unindexed"] += unindexed
+            self.stats["batches"] += 1
+
+        if unindexed:
+            print(f"Error indexing {unindexed} committed persistence records: {index_error}")
+        if failed:
+            error = next(iter(failed.values()))
+            print(f"Error committing {len(failed)} of {len(batch)} persistence records: {error}")
+            if raise_errors:
+                raise error
+
+    def _flush_archives(self, archives):
+        with self._commit_lock:
+            for archive in archives:
+                try:
+                    archive.flush_due()
+                except Exception as e:
+                    print(f"Error flushing encrypted archive: {e}")
+
+    def flush(self):
+        """Block until every enqueued record has been committed"""
+        if self.running:
+            self.queue.join()
+
+    def shutdown(self, timeout=10.0):
+        """Commit outstanding records, stop the writer thread and seal the archives"""
+        if self.running:
+            self.queue.put(_STOP)
+            self.thread.join(timeout)
+            self.running = False
+        with self._commit_lock:
+            for archive in (self.audit_archive, self.dataset_archive):
+                if archive is not None:
+                    archive.close()
+
+    def get_stats(self):
+        """Queue depth and commit counters for monitoring"""
+        return {
+            "mode": self.mode,
+            "queue_depth": self.queue.qsize(),
+            "max_queue_size": self.queue.maxsize,
+            **self.stats
+        }
+
+
+# Test the persistence queue
+if __name__ == "__main__":
+    class _MemoryStore:
+        def __init__(self):
+            self.rows = []
+
+        def append_entries(self, entries):
+            self.rows.extend(entries)
+            return list(range(len(self.rows) - len(entries), len(self.rows)))
+
+        def index_entries(self, entries, addresses):
+            pass
+
+    audit_store, dataset_store = _MemoryStore(), _MemoryStore()
+    persistence = PersistenceQueue(audit_store, dataset_store)
+    persistence.start()
+    start = time.time()
+    for i in range(1000):
+        persistence.submit({'audit_entry': {'id': i}, 'dataset_entry': {'id': i}})
+    persistence.shutdown()
+    print(f"Committed {len(audit_store.rows)} records in {time.time() - start:.3f}s")
+    print("Stats:", persistence.get_stats())
@@ -0,0 +1,300 @@
+import cProfile
+import json
+import os
+import pstats
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+MAX_STACKS = 10000  # Distinct sampled stacks kept before the rest are folded into one bucket
+
+# The profiler's own bookkeeping is left out of allocation reports
+_OWN_FILES = {module.__file__ for module in (tracemalloc, cProfile, pstats)} | {os.path.abspath(__file__)}
+
+
+def _top(statistics, limit):
+    """First limit statistics not allocated by the profiler itself (filtering the
+    statistics is far cheaper than filtering every trace of a snapshot)"""
+    return [s for s in statistics if s.traceback[0].filename not in _OWN_FILES][:limit]
+
+
+class Profiler:
+    """
+    Opt-in memory and CPU profiling of pipeline stages.
+
+    mode="off" costs nothing. "sample" is cheap enough to leave on in a production
+    worker: it times every stage, counts net allocated blocks per stage and per
+    request, and a background thread samples all thread stacks every
+    sample_interval seconds into a collapsed-stack (flame graph) profile.
+    "full" additionally traces allocations with tracemalloc, diffing snapshots
+    taken around each stage of a sample_rate fraction of requests, and runs
+    cProfile over the same requests; each snapshot costs time proportional to
+    the live heap, so keep sample_rate low. Everything is written to disk by dump(),
+    on demand from an admin endpoint or a signal.
+
+    Block counts come from sys.getallocatedblocks(), which is process wide, so
+    concurrent requests blur per-stage numbers; the tracemalloc diffs do not.
+    """
+    def __init__(self, mode="off", output_dir="profiles", sample_rate=0.01, sample_interval=0.01,
+                 tracemalloc_frames=1):
+        if mode not in ("off", "sample", "full"):
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.mode = mode
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.sample_interval = sample_interval
+        self.tracemalloc_frames = tracemalloc_frames
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stages = {}
+        self._requests = {"count": 0, "sampled": 0, "blocks_total": 0, "blocks_max": 0}
+        self._stage_allocations = {}  # stage -> Counter of "file:line" -> [size diff, count diff]
+        self._cpu_profile = None
+        self._cprofile_lock = threading.Lock()
+        self._stacks = Counter()
+        self._gauges = {}
+        self._last_snapshot = None
+        self._sampler = None
+        self._running = False
+        self.started_at = datetime.now().isoformat()
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    def start(self):
+        """Start the stack sampler (and tracemalloc in full mode)"""
+        if not self.enabled or self._running:
+            return
+        if self.mode == "full" and not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+        self._running = True
+        self._sampler = threading.Thread(target=self._sample_stacks, name="profiler-sampler")
+        self._sampler.daemon = True
+        self._sampler.start()
+
+    def stop(self):
+        self._running = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def watch(self, name, func):
+        """Report func() (e.g. the size of a suspect structure) with every dump"""
+        self._gauges[name] = func
+
+    @contextmanager
+    def request(self):
+        """Wrap one request (or batch); yields True when it was sampled for full profiling"""
+        if not self.enabled:
+            yield False
+            return
+
+        sampled = self.mode == "full" and random.random() < self.sample_rate
+        profile = None
+        if sampled and self._cprofile_lock.acquire(blocking=False):
+            # Only one cProfile can be active per process
+            profile = cProfile.Profile()
+            profile.enable()
+        self._local.sampled = sampled
+        blocks_before = sys.getallocatedblocks()
+        try:
+            yield sampled
+        finally:
+            blocks = sys.getallocatedblocks() - blocks_before
+            self._local.sampled = False
+            if profile is not None:
+                profile.disable()
+                self._cprofile_lock.release()
+            with self._lock:
+                self._requests["count"] += 1
+                self._requests["sampled"] += int(sampled)
+                self._requests["blocks_total"] += blocks
+                self._requests["blocks_max"] = max(self._requests["blocks_max"], blocks)
+                if profile is not None:
+                    if self._cpu_profile is None:
+                        self._cpu_profile = pstats.Stats(profile)
+                    else:
+                        self._cpu_profile.add(profile)
+
+    def stage(self, name):
+        """Context manager timing one pipeline stage"""
+        if not self.enabled:
+            return nullcontext()
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name):
+        snapshot = None
+        if getattr(self._local, 'sampled', False) and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+        blocks_before = sys.getallocatedblocks()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            blocks = sys.getallocatedblocks() - blocks_before
+            differences = None
+            if snapshot is not None:
+                differences = _top(tracemalloc.take_snapshot().compare_to(snapshot, 'lineno'), 50)
+            with self._lock:
+                stats = self._stages.setdefault(name, {"calls": 0, "seconds": 0.0, "blocks_total": 0, "blocks_max": 0})
+                stats["calls"] += 1
+                stats["seconds"] += elapsed
+                stats["blocks_total"] += blocks
+                stats["blocks_max"] = max(stats["blocks_max"], blocks)
+                if differences:
+                    allocations = self._stage_allocations.setdefault(name, {})
+                    for difference in differences:
+                        if difference.size_diff == 0:
+                            continue
+                        frame = difference.traceback[0]
+                        totals = allocations.setdefault(f"{frame.filename}:{frame.lineno}", [0, 0])
+                        totals[0] += difference.size_diff
+                        totals[1] += difference.count_diff
+
+    def _sample_stacks(self):
+        own = threading.get_ident()
+        while self._running:
+            time.sleep(self.sample_interval)
+            samples = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                samples.append(";".join(reversed(stack)))
+            with self._lock:
+                for stack in samples:
+                    if stack in self._stacks or len(self._stacks) < MAX_STACKS:
+                        self._stacks[stack] += 1
+                    else:
+                        self._stacks["[other]"] += 1
+
+    def _memory(self):
+        memory = {"max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+        try:
+            with open("/proc/self/statm", 'r') as f:
+                memory["rss_kb"] = int(f.read().split()[1]) * resource.getpagesize() // 1024
+        except (FileNotFoundError, IndexError, ValueError):
+            pass
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            memory.update({"traced_kb": current // 1024, "traced_peak_kb": peak // 1024})
+        return memory
+
+    def _gauge_values(self):
+        values = {}
+        for name, func in self._gauges.items():
+            try:
+                values[name] = func()
+            except Exception as e:
+                values[name] = f"error: {e}"
+        return values
+
+    def get_stats(self):
+        with self._lock:
+            requests = dict(self._requests)
+            stages = {
+                name: {
+                    "calls": s["calls"],
+                    "mean_ms": round(s["seconds"] / s["calls"] * 1000, 3),
+                    "mean_blocks": round(s["blocks_total"] / s["calls"], 1),
+                    "max_blocks": s["blocks_max"]
+                }
+                for name, s in self._stages.items()
+            }
+        return {
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "requests": requests["count"],
+            "sampled_requests": requests["sampled"],
+            "mean_request_blocks": round(requests["blocks_total"] / requests["count"], 1) if requests["count"] else 0,
+            "max_request_blocks": requests["blocks_max"],
+            "stages": stages,
+            "memory": self._memory(),
+            "gauges": self._gauge_values()
+        }
+
+    def dump(self, reason="manual"):
+        """Write stats, CPU profiles and allocation diffs to a new directory; returns its path"""
+        directory = os.path.join(
+            self.output_dir, f"profile-{os.getpid()}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+        )
+        os.makedirs(directory, exist_ok=True)
+
+        with open(os.path.join(directory, "stats.json"), 'w') as f:
+            json.dump({**self.get_stats(), "reason": reason, "dumped_at": datetime.now().isoformat()},
+                      f, indent=2, default=str)
+
+        with self._lock:
+            stacks = self._stacks.most_common()
+            cpu_profile = self._cpu_profile
+            stage_allocations = {name: dict(allocations) for name, allocations in self._stage_allocations.items()}
+        with open(os.path.join(directory, "cpu_stacks.folded"), 'w') as f:
+            for stack, count in stacks:
+                f.write(f"{stack} {count}\n")
+        if cpu_profile is not None:
+            with self._lock:
+                cpu_profile.dump_stats(os.path.join(directory, "cpu.pstats"))
+
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            with open(os.path.join(directory, "allocations.txt"), 'w') as f:
+                f.write("Net allocations per stage (sampled requests)\n")
+                for name, allocations in stage_allocations.items():
+                    f.write(f"\n[{name}]\n")
+                    ranked = sorted(allocations.items(), key=lambda item: -abs(item[1][0]))
+                    for location, (size, count) in ranked[:25]:
+                        f.write(f"  {size / 1024:+10.1f} KiB {count:+8d} blocks  {location}\n")
+
+                f.write("\nLargest live allocations\n")
+                for stat in _top(snapshot.statistics('lineno'), 25):
+                    f.write(f"  {stat}\n")
+
+                if self._last_snapshot is not None:
+                    f.write("\nGrowth since the previous dump\n")
+                    for difference in _top(snapshot.compare_to(self._last_snapshot, 'lineno'), 25):
+                        f.write(f"  {difference}\n")
+            self._last_snapshot = snapshot
+
+        print(f"✅ Profile written to {directory}")
+        return directory
+
+    def install_signal_handler(self, signum=None):
+        """Dump on a signal (SIGUSR2 by default), from a thread so the handler returns at once"""
+        import signal
+        signum = signum or signal.SIGUSR2
+
+        def handler(received, frame):
+            threading.Thread(target=self.dump, args=(f"signal {received}",), daemon=True).start()
+
+        signal.signal(signum, handler)
+
+
+# Test the profiler
+if __name__ == "__main__":
+    import tempfile
+
+    profiler = Profiler("full", tempfile.mkdtemp(), sample_rate=0.1)
+    profiler.start()
+    retained = []
+    profiler.watch("retained_items", lambda: len(retained))
+    for i in range(200):
+        with profiler.request():
+            with profiler.stage("build"):
+                retained.append([str(n) for n in range(100)])
+            with profiler.stage("work"):
+                sum(n * n for n in range(2000))
+    print(json.dumps(profiler.get_stats(), indent=2))
+    print(os.listdir(profiler.dump()))
+    profiler.stop()
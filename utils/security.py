@@ -8,7 +8,12 @@ load_dotenv()
 
 class SecurityUtils:
     def __init__(self):
-        self.key = os.getenv('ENCRYPTION_KEY', Fernet.generate_key())
+        self.key = os.getenv('ENCRYPTION_KEY')
+        if not self.key:
+            # Without a configured key nothing encrypted now can be decrypted after a restart
+            print("⚠️ ENCRYPTION_KEY is not set; using a temporary key. "
+                  "Data encrypted in this process will be unreadable after a restart.")
+            self.key = Fernet.generate_key()
         self.cipher_suite = Fernet(self.key)
     
     def sanitize_input(self, input_text):
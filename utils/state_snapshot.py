@@ -0,0 +1,140 @@
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from utils.file_store import FileLock
+
+
+class SnapshotStore:
+    """
+    Generational snapshots of derived in-memory state, loaded back by mmap.
+
+    A snapshot is a directory of .npy arrays plus JSON metadata that records the
+    log positions it covers. The marker file <name>.marker.json is written last,
+    after the arrays are durable, and names the generation to load; a crash mid-
+    snapshot leaves the previous marker in place. On boot a component maps the
+    arrays read-only and replays only the log entries written after the recorded
+    positions, so startup cost no longer grows with history.
+    """
+    def __init__(self, directory="snapshots", keep_generations=2):
+        self.directory = directory
+        self.keep_generations = keep_generations
+        self.components = []
+        self._thread = None
+        self._running = False
+        os.makedirs(directory, exist_ok=True)
+
+    def _marker_path(self, name):
+        return os.path.join(self.directory, f"{name}.marker.json")
+
+    def _generation_dir(self, name, generation):
+        return os.path.join(self.directory, f"{name}-{generation:08d}")
+
+    def _read_marker(self, name, generation=None):
+        """The current marker, or the copy kept inside a specific generation"""
+        path = self._marker_path(name)
+        if generation is not None:
+            path = os.path.join(self._generation_dir(name, generation), "marker.json")
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save(self, name, arrays, meta):
+        """Write arrays (name -> ndarray) and JSON meta as the next generation of snapshot `name`"""
+        with FileLock(os.path.join(self.directory, name)).exclusive():
+            marker = self._read_marker(name)
+            generation = marker['generation'] + 1 if marker else 1
+            directory = self._generation_dir(name, generation)
+            shutil.rmtree(directory, ignore_errors=True)
+            os.makedirs(directory)
+
+            for array_name, array in arrays.items():
+                path = os.path.join(directory, f"{array_name}.npy")
+                np.save(path, array)
+                with open(path, 'rb+') as f:
+                    os.fsync(f.fileno())
+
+            marker = {
+                'generation': generation,
+                'arrays': sorted(arrays),
+                'meta': meta,
+                'saved_at': datetime.now().isoformat()
+            }
+            with open(os.path.join(directory, "marker.json"), 'w') as f:
+                json.dump(marker, f)
+            tmp_path = self._marker_path(name) + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(marker, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._marker_path(name))
+            self._prune(name, generation)
+        return generation
+
+    def load(self, name, generation=None):
+        """
+        (arrays mapped read-only, meta) of the latest complete snapshot, or (None, None)
+        Pass the generation returned by save() to map exactly what was written
+        """
+        marker = self._read_marker(name, generation)
+        if marker is None:
+            return None, None
+        directory = self._generation_dir(name, marker['generation'])
+        try:
+            arrays = {
+                array_name: np.load(os.path.join(directory, f"{array_name}.npy"), mmap_mode='r')
+                for array_name in marker['arrays']
+            }
+        except (FileNotFoundError, ValueError) as e:
+            print(f"❌ Error loading {name} snapshot: {e}")
+            return None, None
+        return arrays, marker['meta']
+
+    def _prune(self, name, generation):
+        # Older mmaps stay readable after unlink, so workers still on them are unaffected
+        for directory in glob.glob(os.path.join(self.directory, f"{name}-*")):
+            try:
+                old = int(directory.rsplit('-', 1)[1])
+            except ValueError:
+                continue
+            if old <= generation - self.keep_generations:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def register(self, component):
+        """Add a component with a snapshot() method to the periodic snapshots"""
+        self.components.append(component)
+
+    def snapshot_all(self):
+        for component in self.components:
+            try:
+                component.snapshot()
+            except Exception as e:
+                print(f"❌ Error snapshotting {type(component).__name__}: {e}")
+
+    def start(self, interval=300.0):
+        """Snapshot every registered component every interval seconds"""
+        if self._running:
+            return
+        self._running = True
+
+        def snapshot_loop():
+            while self._running:
+                time.sleep(interval)
+                self.snapshot_all()
+
+        self._thread = threading.Thread(target=snapshot_loop, name="state-snapshots")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the periodic thread and take a final snapshot"""
+        self._running = False
+        self.snapshot_all()
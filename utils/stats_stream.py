@@ -0,0 +1,222 @@
+import asyncio
+import copy
+import json
+import threading
+import time
+from collections import deque
+
+
+def _diff(old, new):
+    """Values of new that differ from old (recursing into dicts, None for removed keys), or None"""
+    delta = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            changed = _diff(previous, value)
+            if changed is not None:
+                delta[key] = changed
+        elif value != previous or key not in old:
+            delta[key] = value
+    for key in old:
+        if key not in new:
+            delta[key] = None
+    return delta or None
+
+
+def _merge(target, delta):
+    for key, value in delta.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+def _event(kind, version, payload):
+    return f"id: {version}\nevent: {kind}\ndata: {json.dumps(payload)}\n\n"
+
+
+class StatsStream:
+    """
+    Live transparency stats for dashboards as server-sent events.
+
+    A background thread reads every source (a callable returning a dict) once
+    per tick, and only while someone is subscribed, so the cost is the same
+    however many dashboards are open. A tick that changed anything becomes a
+    numbered delta holding just the changed values. Subscribers get a full
+    "snapshot" event, then "delta" events to merge into it; a subscriber that
+    falls more than `history` deltas behind is sent a fresh snapshot.
+
+    A blocking (WSGI) subscriber holds a server thread for as long as it is
+    connected, so at most max_blocking are admitted at a time, and each is
+    ended after blocking_seconds with a retry hint so the browser reconnects.
+    """
+    def __init__(self, sources, tick=2.0, keepalive=15.0, history=64,
+                 max_blocking=None, blocking_seconds=None, retry_ms=3000):
+        self.sources = sources
+        self.tick = tick
+        self.keepalive = keepalive
+        self.max_blocking = max_blocking
+        self.blocking_seconds = blocking_seconds
+        self.retry_ms = retry_ms
+        self._blocking = 0
+        self._cond = threading.Condition()
+        self._state = {}
+        self._version = 0
+        self._refreshed_at = 0.0
+        self._deltas = deque(maxlen=history)  # (version, delta), oldest first
+        self._subscribers = 0
+        self._thread = None
+        self._running = False
+        self.stats = {"ticks": 0, "deltas": 0, "subscriptions": 0, "refused": 0}
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="stats-stream")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+
+    def _run(self):
+        while self._running:
+            time.sleep(self.tick)
+            if self._subscribers:
+                self.refresh()
+
+    def refresh(self):
+        """Read the sources and publish what changed"""
+        state = {}
+        for name, source in self.sources.items():
+            try:
+                state[name] = source()
+            except Exception as e:
+                print(f"❌ Error reading {name} stats: {e}")
+                state[name] = self._state.get(name, {})
+        with self._cond:
+            self.stats["ticks"] += 1
+            self._refreshed_at = time.monotonic()
+            delta = _diff(self._state, state)
+            if delta is None:
+                return
+            self._state = state  # Replaced, never mutated, so readers can hold on to it
+            self._version += 1
+            self._deltas.append((self._version, delta))
+            self.stats["deltas"] += 1
+            self._cond.notify_all()
+
+    def _stale(self):
+        return time.monotonic() - self._refreshed_at >= self.tick
+
+    def _changes_since(self, version):
+        """(kind, version, payload) of what was published after version, or None; caller holds the lock"""
+        if self._version == version:
+            return None
+        if not self._deltas or self._deltas[0][0] > version + 1:
+            return "snapshot", self._version, self._state
+        merged = {}
+        for delta_version, delta in self._deltas:
+            if delta_version > version:
+                _merge(merged, copy.deepcopy(delta))
+        return "delta", self._version, merged
+
+    def _subscribe(self, count):
+        with self._cond:
+            self._subscribers += count
+            if count > 0:
+                self.stats["subscriptions"] += 1
+
+    def events(self):
+        """
+        Blocking SSE event stream for one subscriber (WSGI)
+        The first item is whether the subscriber was admitted (False when max_blocking
+        streams are already open); advance past it before responding, so that closing
+        the stream always frees its slot.
+        """
+        with self._cond:
+            if self.max_blocking is not None and self._blocking >= self.max_blocking:
+                self.stats["refused"] += 1
+                yield False
+                return
+            self._blocking += 1
+        self._subscribe(1)
+        try:
+            yield True
+            if self._stale():
+                self.refresh()
+            with self._cond:
+                version, state = self._version, self._state
+            yield f"retry: {self.retry_ms}\n" + _event("snapshot", version, state)
+            deadline = time.monotonic() + self.blocking_seconds if self.blocking_seconds else None
+            while deadline is None or time.monotonic() < deadline:
+                with self._cond:
+                    if self._version == version:
+                        wait = self.keepalive
+                        if deadline is not None:
+                            wait = max(0.0, min(wait, deadline - time.monotonic()))
+                        self._cond.wait(wait)
+                    change = self._changes_since(version)
+                if change is None:
+                    yield ": keepalive\n\n"
+                    continue
+                kind, version, payload = change
+                yield _event(kind, version, payload)
+        finally:
+            with self._cond:
+                self._blocking -= 1
+            self._subscribe(-1)
+
+    async def async_events(self):
+        """SSE event stream for one subscriber that holds no thread while idle (ASGI)"""
+        loop = asyncio.get_running_loop()
+        self._subscribe(1)
+        try:
+            if self._stale():
+                await loop.run_in_executor(None, self.refresh)
+            with self._cond:
+                version, state = self._version, self._state
+            yield f"retry: {self.retry_ms}\n" + _event("snapshot", version, state)
+            idle = 0.0
+            while True:
+                await asyncio.sleep(self.tick)
+                with self._cond:
+                    change = self._changes_since(version)
+                if change is None:
+                    idle += self.tick
+                    if idle >= self.keepalive:
+                        idle = 0.0
+                        yield ": keepalive\n\n"
+                    continue
+                idle = 0.0
+                kind, version, payload = change
+                yield _event(kind, version, payload)
+        finally:
+            self._subscribe(-1)
+
+    def get_stats(self):
+        with self._cond:
+            return {**self.stats, "subscribers": self._subscribers, "blocking_subscribers": self._blocking,
+                    "max_blocking": self.max_blocking, "version": self._version, "tick_seconds": self.tick}
+
+
+# Test the stream with a counter source
+if __name__ == "__main__":
+    counts = {"total": 0, "levels": {"High": 0, "Low": 0}}
+
+    stream = StatsStream({"audit": lambda: json.loads(json.dumps(counts))}, tick=0.2, keepalive=0.5,
+                         max_blocking=1, blocking_seconds=2)
+    stream.start()
+    events = stream.events()
+    print("Admitted:", next(events))
+    print("Second subscriber admitted:", next(stream.events()))
+    print(next(events), end="")
+    for i in range(3):
+        counts["total"] += 1
+        counts["levels"]["High" if i % 2 else "Low"] += 1
+        print(next(events), end="")
+    print(next(events), end="")  # Nothing changed: keepalive
+    print("Stream ends after blocking_seconds:", list(events)[-1:] or "(ended)")
+    print("Stats:", stream.get_stats())
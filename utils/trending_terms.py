@@ -0,0 +1,261 @@
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from queue import Queue, Empty, Full
+
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+_TOKEN = re.compile(r"[a-z][a-z0-9']{2,}")
+_STOP = object()
+
+
+class TrendingTerms:
+    """
+    Bounded-memory streaming top-k of terms in flagged content, windowed by time.
+
+    The window is split into `buckets` slices, each a Space-Saving summary of at
+    most `capacity` terms (words and bigrams). When a slice outgrows 2 x capacity
+    it keeps the top `capacity` and remembers the largest count it dropped; a term
+    seen again afterwards starts from that floor, so each count carries a known
+    error bound, as in Space-Saving. Expired slices are dropped whole.
+
+    The moderation path only does a non-blocking put onto a bounded queue (items
+    are dropped, and counted, when it is full); a background thread tokenizes and
+    counts. A sample of unflagged texts is counted the same way as a baseline.
+    Terms can be promoted into the classifier's rule-based keyword lists under
+    the category they are most flagged with when they are frequent, have grown
+    promote_growth-fold against older slices (a term with no history is never
+    promoted) and are promote_min_lift times more common in flagged texts than
+    in unflagged ones. Each worker process keeps its own view.
+    """
+    def __init__(self, capacity=2000, window_seconds=3600, buckets=12, flagged_levels=("Medium", "High"),
+                 max_queue=10000, classifier=None, promote_min_count=50, promote_growth=3.0,
+                 promote_interval=60.0, baseline_sample=0.1, promote_min_lift=5.0):
+        self.capacity = capacity
+        self.bucket_seconds = window_seconds / buckets
+        self.buckets = buckets
+        self.flagged_levels = set(flagged_levels)
+        # Optional ClassifierAgent whose rule keywords receive promoted terms
+        self.classifier = classifier
+        self.promote_min_count = promote_min_count
+        self.promote_growth = promote_growth
+        self.promote_interval = promote_interval
+        self.baseline_sample = baseline_sample
+        self.promote_min_lift = promote_min_lift
+        self.queue = Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        # [slice ID, {term: [count, error, {category: count}]}, floor, texts], oldest first
+        self._slices = []
+        self._baseline_slices = []  # Same, for the sampled unflagged texts
+        self.promoted = {}  # Term -> {'category', 'count', 'promoted_at'}
+        self.stats = {"observed": 0, "counted": 0, "dropped": 0, "terms_counted": 0, "baseline_counted": 0}
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="trending-terms")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        if self.running:
+            self.running = False
+            try:
+                self.queue.put_nowait(_STOP)
+            except Full:
+                pass
+
+    def observe(self, text, level, classification=None):
+        """Queue a flagged text (or a baseline sample of unflagged ones) for counting; never blocks"""
+        if level not in self.flagged_levels:
+            if random.random() < self.baseline_sample:
+                try:
+                    self.queue.put_nowait((time.time(), text, None, False))
+                except Full:
+                    self.stats["dropped"] += 1
+            return
+        self.stats["observed"] += 1
+        category = None
+        if classification:
+            scores = {c: s for c, s in classification.items() if c != "normal content"}
+            if scores:
+                category = max(scores, key=scores.get)
+        try:
+            self.queue.put_nowait((time.time(), text, category))
+        except Full:
+            self.stats["dropped"] += 1
+
+    def _run(self):
+        last_promotion = time.monotonic()
+        while self.running:
+            if self.classifier is not None and time.monotonic() - last_promotion >= self.promote_interval:
+                self.promote()
+                last_promotion = time.monotonic()
+            try:
+                item = self.queue.get(timeout=1.0)
+            except Empty:
+                continue
+            if item is _STOP:
+                break
+            self.count(*item)
+
+    @staticmethod
+    def terms(text):
+        """Words (minus stop words) and adjacent-word bigrams of a text"""
+        words = [w for w in _TOKEN.findall(text.lower()) if w not in ENGLISH_STOP_WORDS]
+        return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+    def count(self, timestamp, text, category=None, flagged=True):
+        """Count the terms of one flagged (or baseline unflagged) text at the given time"""
+        terms = self.terms(text)
+        with self._lock:
+            slices = self._slices if flagged else self._baseline_slices
+            current = self._slice(slices, timestamp)
+            summary, floor = current[1], current[2]
+            current[3] += 1
+            for term in terms:
+                entry = summary.get(term)
+                if entry is None:
+                    entry = summary[term] = [floor, floor, {}]
+                entry[0] += 1
+                if category is not None:
+                    entry[2][category] = entry[2].get(category, 0) + 1
+            if len(summary) > 2 * self.capacity:
+                self._prune(current)
+            if flagged:
+                self.stats["counted"] += 1
+                self.stats["terms_counted"] += len(terms)
+            else:
+                self.stats["baseline_counted"] += 1
+
+    def _slice(self, slices, timestamp):
+        """The slice of slices for timestamp, rotating out expired slices in place; caller holds the lock"""
+        slice_id = int(timestamp // self.bucket_seconds)
+        if not slices or slices[-1][0] < slice_id:
+            slices.append([slice_id, {}, 0, 0])
+            slices[:] = [s for s in slices if s[0] > slice_id - self.buckets]
+        return slices[-1]
+
+    def _prune(self, current):
+        summary = current[1]
+        ranked = sorted(summary.items(), key=lambda item: item[1][0], reverse=True)
+        current[1] = dict(ranked[:self.capacity])
+        current[2] = max(current[2], ranked[self.capacity][1][0])
+
+    def top(self, limit=50, now=None):
+        """
+        Most frequent flagged terms in the window
+        count is the Space-Saving estimate summed over slices and guaranteed its
+        lower bound; growth is the latest slice's count over the average of the
+        slice periods before it (at least one occurrence, so a term new since then
+        still gets a finite growth), or None when no older slice is live.
+        flagged_rate / unflagged_rate are the share of flagged / sampled unflagged
+        texts containing the term (unflagged_rate is None without a baseline)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            oldest_live = int(now // self.bucket_seconds) - self.buckets
+            self._slices[:] = [s for s in self._slices if s[0] > oldest_live]
+            self._baseline_slices[:] = [s for s in self._baseline_slices if s[0] > oldest_live]
+            slices = [(slice_id, summary.copy()) for slice_id, summary, _, _ in self._slices]
+            flagged_texts = sum(s[3] for s in self._slices)
+            baseline_texts = sum(s[3] for s in self._baseline_slices)
+            baseline = {}
+            for _, summary, _, _ in self._baseline_slices:
+                for term, entry in summary.items():
+                    baseline[term] = baseline.get(term, 0) + entry[0]
+        if not slices:
+            return []
+
+        merged = {}
+        for _, summary in slices:
+            for term, (count, error, categories) in summary.items():
+                totals = merged.setdefault(term, [0, 0, {}])
+                totals[0] += count
+                totals[1] += error
+                for category, n in categories.items():
+                    totals[2][category] = totals[2].get(category, 0) + n
+
+        latest_id, latest = slices[-1]
+        older_periods = latest_id - slices[0][0]
+        ranked = sorted(merged.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        results = []
+        for term, (count, error, categories) in ranked:
+            recent = latest[term][0] if term in latest else 0
+            older_rate = max(count - recent, 1) / older_periods if len(slices) > 1 else None
+            results.append({
+                "term": term,
+                "count": count,
+                "guaranteed": count - error,
+                "recent": recent,
+                "growth": round(recent / older_rate, 2) if older_rate else None,
+                "category": max(categories, key=categories.get) if categories else None,
+                "flagged_rate": round(count / max(flagged_texts, 1), 4),
+                "unflagged_rate": round(baseline.get(term, 0) / baseline_texts, 4) if baseline_texts else None
+            })
+        return results
+
+    def promote(self, now=None):
+        """Add fast-growing frequent terms to the classifier's rule keywords; returns the new ones"""
+        if self.classifier is None:
+            return []
+        promoted = []
+        for item in self.top(limit=self.capacity, now=now):
+            if (item["guaranteed"] < self.promote_min_count or item["category"] is None
+                    or item["term"] in self.promoted):
+                continue
+            # Only an actual rise against older slices counts, never a cold start
+            if item["growth"] is None or item["growth"] < self.promote_growth:
+                continue
+            # Terms common in ordinary traffic ("people", "like") are not abuse markers
+            if (item["unflagged_rate"] is not None
+                    and item["flagged_rate"] < self.promote_min_lift * item["unflagged_rate"]):
+                continue
+            self.classifier.add_rule_keywords(item["category"], [item["term"]])
+            self.promoted[item["term"]] = {
+                "category": item["category"],
+                "count": item["count"],
+                "promoted_at": datetime.now().isoformat()
+            }
+            promoted.append(item["term"])
+        if promoted:
+            print(f"✅ Promoted trending terms to rule keywords: {', '.join(promoted)}")
+        return promoted
+
+    def get_stats(self):
+        with self._lock:
+            tracked = sum(len(summary) for _, summary, _, _ in self._slices)
+        return {
+            **self.stats,
+            "queue_depth": self.queue.qsize(),
+            "tracked_terms": tracked,
+            "slices": len(self._slices),
+            "capacity_per_slice": self.capacity,
+            "window_seconds": self.bucket_seconds * self.buckets,
+            "promoted": len(self.promoted)
+        }
+
+
+# Test the trending terms tracker
+if __name__ == "__main__":
+    import random
+
+    trending = TrendingTerms(capacity=200, window_seconds=600, buckets=6)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    start = 1_700_000_000
+    started = time.time()
+    for i in range(100000):
+        timestamp = start + i * 0.006
+        words = random.choices(vocabulary, k=8)
+        if i > 80000 and i % 3 == 0:
+            words += ["scamcoin", "giveaway"]  # A campaign starting in the last slices
+        trending.count(timestamp, " ".join(words), "spam")
+    print(f"Counted 100000 texts in {time.time() - started:.2f}s")
+    for item in trending.top(5, now=start + 100000 * 0.006):
+        print(item)
+    print("Stats:", trending.get_stats())
@@ -0,0 +1,275 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.file_store import FileLock
+
+POSTS = 0
+HIGH_RISK = 1
+
+
+class UserVelocityStore:
+    """
+    Sliding-window posting counters per user with a fixed memory footprint.
+
+    The window is num_buckets time buckets of bucket_seconds each. Every request
+    updates a ring of count-min sketches, which gives an estimate for any user.
+    Users whose estimate reaches promote_after get exact ring counters in a
+    preallocated table of max_hot_users rows, recycled least recently used
+    first. All arrays are allocated up front, so memory does not depend on the
+    number of users.
+
+    Workers share one snapshot file. Each keeps the counts recorded since its
+    last snapshot apart and adds them to the file under a lock, so every post
+    is counted once however many workers write.
+    """
+    def __init__(self, bucket_seconds=300, num_buckets=12, max_hot_users=50000,
+                 sketch_width=1 << 15, sketch_depth=4, promote_after=3,
+                 snapshot_path=None, snapshot_interval=300):
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = num_buckets
+        self.max_hot_users = max_hot_users
+        self.sketch_width = sketch_width
+        self.sketch_depth = sketch_depth
+        self.promote_after = promote_after
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+
+        self._lock = threading.Lock()
+        self._hot_counts = np.zeros((max_hot_users, num_buckets, 2), dtype=np.uint32)
+        self._hot_epochs = np.full((max_hot_users, num_buckets), -1, dtype=np.int64)
+        self._hot_rows = OrderedDict()  # User ID -> row, least recently seen first
+        self._free_rows = list(range(max_hot_users - 1, -1, -1))
+        self._sketch = np.zeros((num_buckets, sketch_depth, sketch_width, 2), dtype=np.uint32)
+        self._sketch_epochs = np.full(num_buckets, -1, dtype=np.int64)
+        self._depth_index = np.arange(sketch_depth)
+        # Counts recorded since the last snapshot, added to the shared file by snapshot()
+        self._pending_sketch = np.zeros_like(self._sketch) if snapshot_path else None
+        self._pending_sketch_epochs = np.full(num_buckets, -1, dtype=np.int64)
+        self._pending_hot = {}  # User ID -> {epoch: [posts, high-risk posts]}
+        self._last_snapshot = time.time()
+        self._snapshot_thread = None
+
+        if snapshot_path and os.path.exists(snapshot_path):
+            self._load_snapshot()
+
+    def record(self, user_id, high_risk, now=None):
+        """Count one post for the user; O(1) per call"""
+        now = time.time() if now is None else now
+        epoch = int(now // self.bucket_seconds)
+        slot = epoch % self.num_buckets
+        columns = self._sketch_columns(user_id)
+
+        with self._lock:
+            if self._sketch_epochs[slot] != epoch:
+                self._sketch[slot] = 0
+                self._sketch_epochs[slot] = epoch
+            self._sketch[slot, self._depth_index, columns, POSTS] += 1
+            if high_risk:
+                self._sketch[slot, self._depth_index, columns, HIGH_RISK] += 1
+            if self.snapshot_path:
+                if self._pending_sketch_epochs[slot] != epoch:
+                    self._pending_sketch[slot] = 0
+                    self._pending_sketch_epochs[slot] = epoch
+                self._pending_sketch[slot, self._depth_index, columns, POSTS] += 1
+                if high_risk:
+                    self._pending_sketch[slot, self._depth_index, columns, HIGH_RISK] += 1
+
+            row = self._hot_rows.get(user_id)
+            promoted = False
+            if row is None:
+                estimate = self._sketch_estimate(columns, epoch)
+                if estimate[POSTS] >= self.promote_after:
+                    # Seed the exact counter with the sketch's history (this post included)
+                    row = self._promote(user_id)
+                    self._hot_counts[row, slot] = estimate
+                    self._hot_epochs[row, slot] = epoch
+                    promoted = True
+            else:
+                self._hot_rows.move_to_end(user_id)
+                if self._hot_epochs[row, slot] != epoch:
+                    self._hot_counts[row, slot] = 0
+                    self._hot_epochs[row, slot] = epoch
+                self._hot_counts[row, slot, POSTS] += 1
+                if high_risk:
+                    self._hot_counts[row, slot, HIGH_RISK] += 1
+            if row is not None and self.snapshot_path:
+                if promoted:
+                    # This worker's own posts so far (this one included) come from its pending sketch
+                    cells = self._pending_sketch[:, self._depth_index, columns].min(axis=1)
+                    self._pending_hot[user_id] = {
+                        int(e): cells[s].tolist() for s, e in enumerate(self._pending_sketch_epochs) if e >= 0
+                    }
+                else:
+                    counts = self._pending_hot.setdefault(user_id, {}).setdefault(epoch, [0, 0])
+                    counts[POSTS] += 1
+                    counts[HIGH_RISK] += int(bool(high_risk))
+
+        self._maybe_snapshot(now)
+
+    def get_features(self, user_id, now=None):
+        """Posts and high-risk posts by the user within the window"""
+        now = time.time() if now is None else now
+        epoch = int(now // self.bucket_seconds)
+        columns = self._sketch_columns(user_id)
+
+        with self._lock:
+            row = self._hot_rows.get(user_id)
+            if row is not None:
+                live = self._hot_epochs[row] > epoch - self.num_buckets
+                posts, high_risk = self._hot_counts[row][live].sum(axis=0)
+                exact = True
+            else:
+                posts, high_risk = self._sketch_estimate(columns, epoch)
+                exact = False
+
+        posts, high_risk = int(posts), int(high_risk)
+        return {
+            "posts": posts,
+            "high_risk": high_risk,
+            "high_risk_rate": high_risk / posts if posts else 0.0,
+            "window_seconds": self.bucket_seconds * self.num_buckets,
+            "exact": exact
+        }
+
+    def _sketch_columns(self, user_id):
+        digest = hashlib.blake2b(str(user_id).encode(), digest_size=4 * self.sketch_depth).digest()
+        return np.frombuffer(digest, dtype=np.uint32) % self.sketch_width
+
+    def _sketch_estimate(self, columns, epoch):
+        """Count-min estimate over live buckets: min across rows of the per-row sums"""
+        live = self._sketch_epochs > epoch - self.num_buckets
+        cells = self._sketch[:, self._depth_index, columns]  # (buckets, depth, 2)
+        return cells[live].sum(axis=0, dtype=np.uint64).min(axis=0)
+
+    def _promote(self, user_id):
+        """Give the user an exact counter row, recycling the least recently seen one"""
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            _, row = self._hot_rows.popitem(last=False)
+        self._hot_counts[row] = 0
+        self._hot_epochs[row] = -1
+        self._hot_rows[user_id] = row
+        return row
+
+    def _maybe_snapshot(self, now):
+        if not self.snapshot_path or now - self._last_snapshot < self.snapshot_interval:
+            return
+        if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+            return
+        self._last_snapshot = now
+        self._snapshot_thread = threading.Thread(target=self.snapshot, daemon=True)
+        self._snapshot_thread.start()
+
+    def snapshot(self):
+        """Add the counts recorded since the last snapshot to the shared snapshot file"""
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            sketch, sketch_epochs = self._pending_sketch.copy(), self._pending_sketch_epochs.copy()
+            hot = self._pending_hot
+            self._pending_sketch[:] = 0
+            self._pending_sketch_epochs[:] = -1
+            self._pending_hot = {}
+
+        try:
+            with FileLock(self.snapshot_path).exclusive():
+                merged = UserVelocityStore(
+                    self.bucket_seconds, self.num_buckets, self.max_hot_users,
+                    self.sketch_width, self.sketch_depth, self.promote_after
+                )
+                if os.path.exists(self.snapshot_path):
+                    merged._load_snapshot(self.snapshot_path)
+                merged._add_counts(sketch, sketch_epochs, hot)
+                tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.savez(f, **merged._state())
+                os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            print(f"Error saving velocity snapshot: {e}")
+
+    def _state(self):
+        return {
+            "hot_counts": self._hot_counts,
+            "hot_epochs": self._hot_epochs,
+            "hot_users": np.array(list(self._hot_rows.keys()), dtype=str),
+            "hot_user_rows": np.array(list(self._hot_rows.values()), dtype=np.int64),
+            "sketch": self._sketch,
+            "sketch_epochs": self._sketch_epochs
+        }
+
+    def _add_counts(self, sketch, sketch_epochs, hot):
+        """Merge another worker's pending counts into this (snapshot-only) store"""
+        for slot, epoch in enumerate(sketch_epochs):
+            if epoch < 0 or epoch < self._sketch_epochs[slot]:
+                continue  # Nothing recorded, or that bucket has already expired here
+            if epoch > self._sketch_epochs[slot]:
+                self._sketch[slot] = 0
+                self._sketch_epochs[slot] = epoch
+            self._sketch[slot] += sketch[slot]
+
+        for user_id, epochs in hot.items():
+            row = self._hot_rows.get(user_id)
+            if row is None:
+                # Newly hot: seed every bucket from the merged sketch, which holds these posts
+                row = self._promote(user_id)
+                columns = self._sketch_columns(user_id)
+                self._hot_counts[row] = self._sketch[:, self._depth_index, columns].min(axis=1)
+                self._hot_epochs[row] = self._sketch_epochs
+                continue
+            self._hot_rows.move_to_end(user_id)
+            for epoch, counts in epochs.items():
+                slot = epoch % self.num_buckets
+                if epoch < self._hot_epochs[row, slot]:
+                    continue
+                if epoch > self._hot_epochs[row, slot]:
+                    self._hot_counts[row, slot] = 0
+                    self._hot_epochs[row, slot] = epoch
+                self._hot_counts[row, slot] += np.array(counts, dtype=np.uint32)
+
+    def _load_snapshot(self, path=None):
+        try:
+            with np.load(path or self.snapshot_path, allow_pickle=False) as state:
+                if state["hot_counts"].shape != self._hot_counts.shape or state["sketch"].shape != self._sketch.shape:
+                    print("Velocity snapshot shape does not match the configuration; starting empty")
+                    return
+                self._hot_counts[:] = state["hot_counts"]
+                self._hot_epochs[:] = state["hot_epochs"]
+                self._sketch[:] = state["sketch"]
+                self._sketch_epochs[:] = state["sketch_epochs"]
+                self._hot_rows = OrderedDict(
+                    zip(state["hot_users"].tolist(), state["hot_user_rows"].tolist())
+                )
+            used = set(self._hot_rows.values())
+            self._free_rows = [row for row in range(self.max_hot_users - 1, -1, -1) if row not in used]
+        except Exception as e:
+            print(f"Error loading velocity snapshot: {e}")
+
+    def get_stats(self):
+        return {
+            "hot_users": len(self._hot_rows),
+            "max_hot_users": self.max_hot_users,
+            "memory_bytes": int(
+                self._hot_counts.nbytes + self._hot_epochs.nbytes + self._sketch.nbytes
+                + (self._pending_sketch.nbytes if self._pending_sketch is not None else 0)
+            )
+        }
+
+
+# Test the velocity store
+if __name__ == "__main__":
+    store = UserVelocityStore(max_hot_users=2)
+    start = time.time()
+    for i in range(10000):
+        store.record(f"user{i % 500}", high_risk=(i % 7 == 0))
+    for _ in range(12):
+        store.record("spammer", high_risk=True)
+    print(f"10k updates in {time.time() - start:.3f}s")
+    print("spammer:", store.get_features("spammer"))
+    print("user3:", store.get_features("user3"))
+    print("Stats:", store.get_stats())
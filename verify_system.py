@@ -5,6 +5,7 @@ Quick verification that all system components are working
 
 import sys
 import os
+import shutil
 
 # Add the current directory to Python path so we can import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -69,7 +70,7 @@ def test_audit_agent():
     """Test the AuditAgent"""
     print("🧪 Testing AuditAgent...")
     try:
-        audit_agent = AuditAgent("test_audit_log.json")
+        audit_agent = AuditAgent("test_audit_log")
         test_classification = {"violence": 0.8}
         test_risk = {"score": 0.8, "level": "High"}
         explanation = audit_agent.generate_explanation(test_classification, test_risk)
@@ -83,8 +84,7 @@ def test_audit_agent():
         print(f"   Audit stats: {stats}")
         
         # Clean up test file
-        if os.path.exists("test_audit_log.json"):
-            os.remove("test_audit_log.json")
+        shutil.rmtree("test_audit_log", ignore_errors=True)
             
         print("   ✅ AuditAgent working")
         return True